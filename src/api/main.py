@@ -15,6 +15,13 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from api.services.neo4j_service import Neo4jService
+from api.services.audio_session_service import AudioSessionService
+from api.services.parse_job_runner import get_parse_job_runner
+from api.services.parse_job_queue import get_parse_job_queue
+from api.services.daily_input_enrichment import get_daily_input_enrichment
+from shared.services.llm_client import get_llm_client, get_llm_metrics, LANE_BATCH
+from shared.services.problem_pool_service import get_problem_pool
+from shared.services.roster_store import get_roster_store
 
 # 환경 변수 로드
 load_dotenv()
@@ -34,10 +41,41 @@ async def lifespan(app: FastAPI):
     else:
         print("❌ Neo4j connection failed")
 
+    # 문제 풀 보충 워커 (미리 생성된 문제 + 듣기 오디오)
+    problem_pool = get_problem_pool()
+    if problem_pool.enabled:
+        from functools import partial
+        from student.services import get_student_agent_service
+        problem_pool.start_worker(partial(
+            get_student_agent_service().generate_problem_content,
+            client=get_llm_client(lane=LANE_BATCH)
+        ))
+
+    # 오래된 세션 오디오 정리 (TTL 스위퍼)
+    audio_sessions = AudioSessionService.get_instance()
+    audio_sessions.start_sweeper()
+
+    # 시험지 파싱 워커 풀 (모델/클라이언트 미리 로드)
+    parse_runner = get_parse_job_runner()
+    if os.getenv("PARSE_WORKERS_PREWARM", "true").lower() == "true":
+        parse_runner.start()
+    # 파싱 작업 큐 디스패처 (중단된 작업 재개 포함)
+    parse_queue = get_parse_job_queue()
+    parse_queue.start()
+    # Daily Input 요약/임베딩 보강 워커 (남은 pending 기록 포함)
+    daily_inputs = get_daily_input_enrichment()
+    daily_inputs.start()
+
     yield
 
     # Shutdown
     print("🛑 ClassMate API Server Shutting down...")
+    problem_pool.stop_worker()
+    audio_sessions.stop_sweeper()
+    parse_queue.stop()
+    daily_inputs.stop()
+    parse_runner.shutdown()
+    get_roster_store().flush()  # 대기 중인 학생/반 JSON 스냅샷 기록
     neo4j_service.close()
 
 
@@ -103,6 +141,12 @@ async def health_check():
     }
 
 
+@app.get("/health/llm")
+async def llm_health():
+    """LLM 호출 계층 메트릭 (모델별 대기 시간, 처리 중 호출, 오류율, 서킷 상태)"""
+    return get_llm_metrics()
+
+
 # 라우터 등록
 from api.routers import students, problems, teachers, parents, dashboard, classes, auth, chat, audio
 
@@ -4,13 +4,24 @@ Audio Router
 오디오 파일 관리 API
 """
 from __future__ import annotations
+import re
+import time
+from pathlib import Path
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from api.services.audio_session_service import AudioSessionService
+from shared.services.tts_service import get_tts_service
 
 router = APIRouter()
 
 
+_STREAM_FILENAME = re.compile(r"^listening_[0-9a-f]{12}\.mp3$")
+_STREAM_CHUNK = 16 * 1024
+_STREAM_POLL_S = 0.1
+_STREAM_IDLE_TIMEOUT_S = 30.0
+
+
 class CleanupRequest(BaseModel):
     """오디오 정리 요청"""
     session_id: str
@@ -97,3 +108,66 @@ async def get_session_audio(session_id: str):
             status_code=500,
             detail=f"Failed to get session audio: {str(e)}"
         )
+
+
+def _tail_partial_audio(part_path: Path):
+    """
+    렌더링 중인 .part 파일을 따라가며 MP3 프레임 전송
+
+    렌더링이 끝나 .part가 정적 파일로 rename되어도 열린 파일 핸들은 같은 내용을 가리키므로
+    남은 바이트까지 읽고 종료한다.
+    """
+    try:
+        f = open(part_path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        last_data = time.monotonic()
+        while True:
+            chunk = f.read(_STREAM_CHUNK)
+            if chunk:
+                last_data = time.monotonic()
+                yield chunk
+                continue
+            if not part_path.exists():
+                # 완료(또는 실패) - 남은 프레임 전송 후 종료
+                rest = f.read()
+                if rest:
+                    yield rest
+                return
+            if time.monotonic() - last_data > _STREAM_IDLE_TIMEOUT_S:
+                print(f"⚠️  Audio stream idle timeout: {part_path.name}")
+                return
+            time.sleep(_STREAM_POLL_S)
+
+
+@router.get("/audio/stream/{filename}")
+async def stream_audio(filename: str):
+    """
+    듣기 오디오 점진적 재생
+
+    - 렌더링이 끝났으면 정적 파일 그대로 반환
+    - 렌더링 중이면 준비된 MP3 프레임부터 전송하고 이후 발화가 추가될 때마다 이어서 전송
+
+    - **filename**: listening_<hash>.mp3
+    """
+    if not _STREAM_FILENAME.match(filename):
+        raise HTTPException(status_code=400, detail="Invalid audio filename")
+
+    tts_service = get_tts_service()
+    file_path = tts_service.audio_dir / filename
+    if file_path.exists():
+        return FileResponse(str(file_path), media_type="audio/mpeg")
+
+    part_path = tts_service.partial_path(filename)
+    if not part_path.exists():
+        # rename 직후일 수 있으므로 한 번 더 확인
+        if file_path.exists():
+            return FileResponse(str(file_path), media_type="audio/mpeg")
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    return StreamingResponse(
+        _tail_partial_audio(part_path),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-store"}
+    )
@@ -4,11 +4,10 @@ Classes Router
 반 관련 API 엔드포인트
 """
 from __future__ import annotations
-import json
-from pathlib import Path
 from typing import List, Optional
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from shared.services.roster_store import get_roster_store
 
 
 router = APIRouter()
@@ -38,16 +37,8 @@ async def get_classes():
         반 목록
     """
     try:
-        # Load class.json from data/json/
-        class_file = Path("/home/sh/projects/ClassMate/data/json/class.json")
-
-        if not class_file.exists():
-            return []
-
-        with open(class_file, "r", encoding="utf-8") as f:
-            classes_data = json.load(f)
-
-        return [ClassModel(**cls) for cls in classes_data]
+        # class.json (인덱스 캐시, 파일 변경 시 자동 재로딩)
+        return [ClassModel(**cls) for cls in get_roster_store().classes()]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch classes: {str(e)}")
@@ -65,20 +56,10 @@ async def get_class(class_id: str):
         반 상세 정보
     """
     try:
-        class_file = Path("/home/sh/projects/ClassMate/data/json/class.json")
-
-        if not class_file.exists():
-            raise HTTPException(status_code=404, detail="Class data not found")
-
-        with open(class_file, "r", encoding="utf-8") as f:
-            classes_data = json.load(f)
-
-        # Find class by ID
-        for cls in classes_data:
-            if cls["class_id"] == class_id:
-                return ClassModel(**cls)
-
-        raise HTTPException(status_code=404, detail=f"Class not found: {class_id}")
+        cls = get_roster_store().get_class(class_id)
+        if cls is None:
+            raise HTTPException(status_code=404, detail=f"Class not found: {class_id}")
+        return ClassModel(**cls)
 
     except HTTPException:
         raise
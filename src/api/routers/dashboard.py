@@ -4,10 +4,11 @@ Dashboard Router
 대시보드 및 통계 API 엔드포인트
 """
 from __future__ import annotations
-from typing import Dict, Any, List
-from fastapi import APIRouter, HTTPException
+from typing import Dict, Any, List, Optional
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from api.services.neo4j_service import Neo4jService
+from shared.services.score_history_store import get_score_history_store
 
 
 router = APIRouter()
@@ -128,6 +129,65 @@ async def get_dashboard_overview():
         )
 
 
+@router.get("/score-trends/student/{student_id}")
+async def get_student_score_trend(
+    student_id: str,
+    area: Optional[str] = None,
+    days: int = Query(30, ge=1, le=730),
+    window: int = Query(3, ge=1, le=30)
+):
+    """
+    학생 영역별 점수 추이 (score_history 저장소, 명단 전체를 읽지 않음)
+
+    - 최근 N일 기록, 이동 평균, 처음 대비 변화량, 주당 기울기
+    - 반 내 현재 백분위
+
+    Args:
+        student_id: 학생 ID
+        area: 영역 (grammar/vocabulary/reading/listening/writing 또는 '독해', 'RD' 등, 생략 시 전체)
+        days: 조회 기간 (일)
+        window: 이동 평균 창 크기 (기록 수)
+    """
+    store = get_score_history_store()
+    try:
+        trend = store.student_trend(student_id, area=area, days=days, window=window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if trend is None:
+        raise HTTPException(status_code=404, detail=f"Score history not found: {student_id}")
+    trend["percentile"] = store.student_percentile(student_id)
+    return trend
+
+
+@router.get("/score-trends/class/{class_id}")
+async def get_class_score_trend(
+    class_id: str,
+    area: Optional[str] = None,
+    days: int = Query(90, ge=1, le=730),
+    step_days: int = Query(7, ge=1, le=90),
+    weeks: int = Query(4, ge=1, le=52)
+):
+    """
+    반 점수 추이: 날짜별 백분위 밴드(p10/p25/p50/p75/p90, 평균) + 학생별 N주 변화량
+
+    Args:
+        class_id: 반 ID
+        area: 영역 (생략 시 전체)
+        days: 밴드 조회 기간 (일)
+        step_days: 밴드 날짜 간격 (일)
+        weeks: 변화량 비교 기간 (주)
+    """
+    store = get_score_history_store()
+    try:
+        bands = store.class_bands(class_id, area=area, days=days, step_days=step_days)
+        deltas = store.deltas(weeks=weeks, area=area, class_id=class_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not bands["students"]:
+        raise HTTPException(status_code=404, detail=f"Score history not found for class: {class_id}")
+    return {"class_id": class_id, "weeks": weeks, "bands": bands, "deltas": deltas}
+
+
 @router.get("/health")
 async def health_check():
     """
@@ -16,6 +16,7 @@ from api.models.student import (
     StudentStatsModel
 )
 from api.services.neo4j_service import Neo4jService
+from shared.services.roster_store import get_roster_store
 
 
 router = APIRouter()
@@ -69,22 +70,9 @@ async def get_student(student_id: str):
 
     - **student_id**: 학생 ID
     """
-    import json
-    from pathlib import Path
-
-    students_file = Path("/home/sh/projects/ClassMate/data/json/students_rag.json")
-
     try:
-        with open(students_file, "r", encoding="utf-8") as f:
-            students_data = json.load(f)
-
-        # student_id로 학생 찾기 (원본데이터 안에 있음)
-        student_raw = None
-        for s in students_data:
-            original = s.get("원본데이터", {})
-            if original.get("student_id") == student_id:
-                student_raw = original
-                break
+        # student_id 인덱스로 조회 (원본데이터)
+        student_raw = get_roster_store().get_student(student_id)
 
         if not student_raw:
             raise HTTPException(status_code=404, detail=f"Student not found: {student_id}")
@@ -147,22 +135,9 @@ async def get_student_stats(student_id: str):
 
     - **student_id**: 학생 ID
     """
-    import json
-    from pathlib import Path
-
-    students_file = Path("/home/sh/projects/ClassMate/data/json/students_rag.json")
-
     try:
-        with open(students_file, "r", encoding="utf-8") as f:
-            students_data = json.load(f)
-
-        # student_id로 학생 찾기 (원본데이터 안에 있음)
-        student_raw = None
-        for s in students_data:
-            original = s.get("원본데이터", {})
-            if original.get("student_id") == student_id:
-                student_raw = original
-                break
+        # student_id 인덱스로 조회 (원본데이터)
+        student_raw = get_roster_store().get_student(student_id)
 
         if not student_raw:
             raise HTTPException(status_code=404, detail=f"Student not found: {student_id}")
@@ -5,17 +5,18 @@ Teacher Router
 """
 from __future__ import annotations
 from typing import Optional, List
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from pydantic import BaseModel
-import os
 import shutil
-import json
-import subprocess
 from pathlib import Path
 from datetime import datetime, date
-import openai
-import os
 from api.services.neo4j_service import Neo4jService
+from api.services.parse_job_queue import get_parse_job_queue
+from api.services.daily_input_enrichment import get_daily_input_enrichment
+from shared.services.roster_store import get_roster_store, student_record
+from shared.services.score_history_store import get_score_history_store
+from teacher.daily.student_processor import prepare_for_neo4j
+from shared.services.llm_client import get_llm_client
 
 router = APIRouter()
 
@@ -30,7 +31,7 @@ def generate_student_summary(student_data: dict) -> str:
         자연어 요약 문자열
     """
     try:
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        client = get_llm_client()
 
         # 학생 데이터를 간결한 텍스트로 변환
         att = student_data.get("attendance", {})
@@ -89,7 +90,7 @@ class ParseJobResponse(BaseModel):
     """파싱 작업 응답"""
     job_id: str
     exam_id: str
-    status: str  # "queued", "processing", "completed", "failed"
+    status: str  # "queued", "processing", "completed", "failed", "cancelled"
     message: str
     files: dict
 
@@ -100,165 +101,15 @@ class ParseStatusResponse(BaseModel):
     status: str
     message: str
     progress: int  # 0-100
+    stage: Optional[str] = None
+    stages: Optional[List[dict]] = None  # 단계별 시작/종료 시각
+    queue_position: Optional[int] = None
     results: Optional[dict] = None
     error: Optional[str] = None
 
 
-# 작업 상태 저장 (실제 환경에서는 DB 또는 Redis 사용)
-_parse_jobs = {}
-
-
-def run_parsing_pipeline(
-    job_id: str,
-    exam_id: str,
-    question_pdf: str,
-    answer_pdf: Optional[str],
-    solution_pdf: Optional[str]
-):
-    """파싱 파이프라인 실행 (백그라운드)"""
-    try:
-        _parse_jobs[job_id]["status"] = "processing"
-        _parse_jobs[job_id]["progress"] = 10
-
-        # 파이프라인 실행
-        cmd = [
-            "timeout", "1200",  # 20분 타임아웃
-            "python3", "src/teacher/parser/pipeline.py",
-            f"input/{exam_id}",
-            exam_id,
-            "--taxonomy", "src/teacher/taxonomy.yaml",
-            "--parser-mode", "vlm",
-            "--out", f"output/problems_{exam_id}.json",
-            "--fig-out", f"output/figures_{exam_id}.json",
-            "--tbl-out", f"output/tables_{exam_id}.json",
-            "--bbox-padding", "0.02"
-        ]
-
-        # annotated PDF가 있으면 추가
-        annotated_pdf = Path(f"output/bbox/question_{exam_id}_annotated.pdf")
-        if annotated_pdf.exists():
-            cmd.extend(["--annotated-pdf", annotated_pdf.as_posix()])
-
-        _parse_jobs[job_id]["progress"] = 30
-
-        # 실행
-        result = subprocess.run(
-            cmd,
-            cwd="/home/sh/projects/ClassMate",
-            capture_output=True,
-            text=True,
-            timeout=1200
-        )
-
-        _parse_jobs[job_id]["progress"] = 90
-
-        if result.returncode == 0:
-            # 파싱 성공 - 결과 파일 읽기
-            try:
-                problems_file = Path(f"/home/sh/projects/ClassMate/output/problems_{exam_id}.json")
-                figures_file = Path(f"/home/sh/projects/ClassMate/output/figures_{exam_id}.json")
-                tables_file = Path(f"/home/sh/projects/ClassMate/output/tables_{exam_id}.json")
-
-                results = {}
-                if problems_file.exists():
-                    with open(problems_file, "r", encoding="utf-8") as f:
-                        problems = json.load(f)
-                        results["problems"] = {
-                            "count": len(problems),
-                            "file": problems_file.as_posix()
-                        }
-
-                if figures_file.exists():
-                    with open(figures_file, "r", encoding="utf-8") as f:
-                        figures = json.load(f)
-                        results["figures"] = {
-                            "count": len(figures),
-                            "file": figures_file.as_posix()
-                        }
-
-                if tables_file.exists():
-                    with open(tables_file, "r", encoding="utf-8") as f:
-                        tables = json.load(f)
-                        results["tables"] = {
-                            "count": len(tables),
-                            "file": tables_file.as_posix()
-                        }
-
-                _parse_jobs[job_id]["results"] = results
-                _parse_jobs[job_id]["progress"] = 95
-                _parse_jobs[job_id]["message"] = "파싱 완료, DB 업로드 중..."
-
-            except Exception as e:
-                print(f"결과 파일 읽기 실패: {e}")
-                _parse_jobs[job_id]["status"] = "completed"
-                _parse_jobs[job_id]["progress"] = 100
-                _parse_jobs[job_id]["message"] = "파싱 완료 (결과 파일 읽기 실패)"
-                return
-
-            # 자동 DB 업로드 (Qwen3 임베딩 + Neo4j 저장)
-            try:
-                print(f"🔄 Starting automatic DB upload for {exam_id}...")
-
-                upload_cmd = [
-                    "python3", "src/teacher/parser/upload_problems.py",
-                    f"output/problems_{exam_id}.json",
-                    "--batch-size", "16"
-                ]
-
-                # 임베딩 + DB 업로드 실행 (타임아웃 30분)
-                upload_result = subprocess.run(
-                    upload_cmd,
-                    cwd="/home/sh/projects/ClassMate",
-                    capture_output=True,
-                    text=True,
-                    timeout=1800
-                )
-
-                if upload_result.returncode == 0:
-                    _parse_jobs[job_id]["status"] = "completed"
-                    _parse_jobs[job_id]["progress"] = 100
-                    _parse_jobs[job_id]["message"] = "파싱 및 DB 업로드 완료"
-                    print(f"✅ DB upload successful for {exam_id}")
-                else:
-                    _parse_jobs[job_id]["status"] = "completed"
-                    _parse_jobs[job_id]["progress"] = 100
-                    _parse_jobs[job_id]["message"] = "파싱 완료, DB 업로드 실패"
-                    _parse_jobs[job_id]["upload_error"] = upload_result.stderr
-                    print(f"⚠️ DB upload failed: {upload_result.stderr}")
-
-            except subprocess.TimeoutExpired:
-                _parse_jobs[job_id]["status"] = "completed"
-                _parse_jobs[job_id]["progress"] = 100
-                _parse_jobs[job_id]["message"] = "파싱 완료, DB 업로드 타임아웃"
-                print(f"⚠️ DB upload timeout for {exam_id}")
-
-            except Exception as e:
-                _parse_jobs[job_id]["status"] = "completed"
-                _parse_jobs[job_id]["progress"] = 100
-                _parse_jobs[job_id]["message"] = f"파싱 완료, DB 업로드 오류: {str(e)}"
-                print(f"⚠️ DB upload error: {e}")
-
-        else:
-            # 실패
-            _parse_jobs[job_id]["status"] = "failed"
-            _parse_jobs[job_id]["progress"] = 0
-            _parse_jobs[job_id]["message"] = "파싱 실패"
-            _parse_jobs[job_id]["error"] = result.stderr
-
-    except subprocess.TimeoutExpired:
-        _parse_jobs[job_id]["status"] = "failed"
-        _parse_jobs[job_id]["message"] = "파싱 타임아웃 (20분 초과)"
-        _parse_jobs[job_id]["error"] = "Timeout after 20 minutes"
-
-    except Exception as e:
-        _parse_jobs[job_id]["status"] = "failed"
-        _parse_jobs[job_id]["message"] = f"파싱 오류: {str(e)}"
-        _parse_jobs[job_id]["error"] = str(e)
-
-
 @router.post("/upload", response_model=ParseJobResponse)
 async def upload_exam_files(
-    background_tasks: BackgroundTasks,
     exam_id: str = Form(...),
     question_file: UploadFile = File(...),
     answer_file: Optional[UploadFile] = File(None),
@@ -308,32 +159,19 @@ async def upload_exam_files(
                 shutil.copyfileobj(solution_file.file, f)
             uploaded_files["solution"] = solution_path.as_posix()
 
-        # 작업 정보 저장
-        _parse_jobs[job_id] = {
-            "job_id": job_id,
-            "exam_id": exam_id,
-            "status": "queued",
-            "progress": 0,
-            "message": "파싱 대기 중",
-            "files": uploaded_files,
-            "created_at": datetime.now().isoformat()
-        }
-
-        # 백그라운드에서 파싱 시작
-        background_tasks.add_task(
-            run_parsing_pipeline,
+        # 작업 큐에 등록 (디스패처가 동시 실행 수 안에서 워커 풀에 제출)
+        get_parse_job_queue().enqueue(
             job_id,
             exam_id,
-            question_path.as_posix(),
-            answer_path.as_posix() if answer_path else None,
-            solution_path.as_posix() if solution_path else None
+            files=uploaded_files,
+            options={"bbox_padding": 0.02}
         )
 
         return ParseJobResponse(
             job_id=job_id,
             exam_id=exam_id,
             status="queued",
-            message="파싱 작업이 시작되었습니다.",
+            message="파싱 작업이 등록되었습니다.",
             files=uploaded_files
         )
 
@@ -352,25 +190,27 @@ async def get_parse_status(job_id: str):
     Returns:
         작업 상태 정보
     """
-    if job_id not in _parse_jobs:
+    job = get_parse_job_queue().get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
 
-    job = _parse_jobs[job_id]
-
     return ParseStatusResponse(
         job_id=job_id,
         status=job["status"],
-        message=job.get("message", ""),
+        message=job.get("message") or "",
         progress=job.get("progress", 0),
+        stage=job.get("stage"),
+        stages=job.get("stages"),
+        queue_position=job.get("queue_position"),
         results=job.get("results"),
         error=job.get("error")
     )
 
 
 @router.get("/parse-jobs")
-async def list_parse_jobs():
+async def list_parse_jobs(limit: int = 100):
     """
-    모든 파싱 작업 목록 조회
+    파싱 작업 목록 조회 (최근 순)
 
     Returns:
         작업 목록
@@ -381,14 +221,30 @@ async def list_parse_jobs():
                 "job_id": job["job_id"],
                 "exam_id": job["exam_id"],
                 "status": job["status"],
+                "stage": job.get("stage"),
                 "progress": job.get("progress", 0),
-                "created_at": job.get("created_at")
+                "created_at": datetime.fromtimestamp(job["created_at"]).isoformat(),
+                "started_at": datetime.fromtimestamp(job["started_at"]).isoformat() if job.get("started_at") else None,
+                "finished_at": datetime.fromtimestamp(job["finished_at"]).isoformat() if job.get("finished_at") else None
             }
-            for job in _parse_jobs.values()
+            for job in get_parse_job_queue().list_jobs(limit)
         ]
     }
 
 
+@router.post("/parse-jobs/{job_id}/cancel")
+async def cancel_parse_job(job_id: str):
+    """
+    파싱 작업 취소
+
+    대기 중인 작업은 즉시 취소되고, 실행 중인 작업은 다음 진행 단계에서 중단됩니다.
+    """
+    status = get_parse_job_queue().cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    return {"job_id": job_id, "status": status}
+
+
 # ==================== Daily Input 관련 ====================
 
 class DailyInputModel(BaseModel):
@@ -407,7 +263,8 @@ class DailyInputResponse(BaseModel):
     content: str
     teacher_id: str
     created_at: str
-    summary: Optional[str] = None  # GPT 생성 요약
+    summary: Optional[str] = None  # GPT 생성 요약 (보강 전에는 None)
+    enrichment_status: Optional[str] = None  # pending / processing / done / failed
 
 
 @router.post("/daily-input")
@@ -431,7 +288,7 @@ async def create_daily_input(
         # Input ID 생성
         input_id = f"{input_data.student_id}_{input_data.date}_{datetime.now().strftime('%H%M%S')}"
 
-        # Neo4j에 저장 (카테고리 제거, GPT가 자동으로 주제 추론)
+        # 원본만 Neo4j에 저장 (요약/임베딩은 보강 워커가 모아서 처리)
         result = neo4j.create_daily_input(
             input_id=input_id,
             student_id=input_data.student_id,
@@ -443,9 +300,12 @@ async def create_daily_input(
         if not result:
             raise HTTPException(status_code=500, detail="Failed to create daily input")
 
+        get_daily_input_enrichment().notify()
+
         return {
             "success": True,
             "input_id": input_id,
+            "enrichment_status": "pending",
             "message": "Daily input created successfully"
         }
 
@@ -453,6 +313,100 @@ async def create_daily_input(
         raise HTTPException(status_code=500, detail=f"Failed to create daily input: {str(e)}")
 
 
+class BulkDailyInputEntry(BaseModel):
+    """일괄 입력 한 줄 (학생 한 명)"""
+    student_id: str
+    content: str
+    date: Optional[str] = None  # 생략 시 요청의 date
+
+
+class BulkDailyInputModel(BaseModel):
+    """반 전체 Daily Input 일괄 입력"""
+    date: str  # YYYY-MM-DD
+    class_id: Optional[str] = None  # 지정 시 반 소속 학생만 허용
+    entries: List[BulkDailyInputEntry]
+
+
+@router.post("/daily-input/bulk")
+async def create_daily_inputs_bulk(
+    input_data: BulkDailyInputModel,
+    teacher_id: str
+):
+    """
+    Daily Input 일괄 생성 (수업 종료 후 반 전체 입력을 한 요청으로)
+
+    원본은 UNWIND 한 트랜잭션으로 저장하고, 요약/임베딩은 이 기록들만 묶은 보강 작업 하나로 처리한다.
+
+    Args:
+        input_data: 날짜, 반 ID, 학생별 기록 목록
+        teacher_id: 선생님 ID
+
+    Returns:
+        행별 결과 (status: pending / empty_content / duplicate / not_in_class / student_not_found)
+    """
+    roster = get_roster_store()
+    if input_data.class_id and input_data.class_id not in roster.assigned_classes(teacher_id):
+        raise HTTPException(
+            status_code=403,
+            detail=f"권한 없음: 선생님 {teacher_id}는 반 {input_data.class_id}의 기록을 작성할 수 없습니다."
+        )
+
+    stamp = datetime.now().strftime('%H%M%S')
+    results: List[dict] = []
+    rows: List[dict] = []
+    seen = set()
+    for entry in input_data.entries:
+        date_value = entry.date or input_data.date
+        result = {"student_id": entry.student_id, "date": date_value, "input_id": None}
+        results.append(result)
+
+        content = entry.content.strip()
+        if not content:
+            result["status"] = "empty_content"
+            continue
+        if (entry.student_id, date_value) in seen:
+            result["status"] = "duplicate"
+            continue
+        seen.add((entry.student_id, date_value))
+        if input_data.class_id:
+            student = roster.get_student(entry.student_id)
+            if student is not None and student.get("class_id") != input_data.class_id:
+                result["status"] = "not_in_class"
+                continue
+
+        result["input_id"] = f"{entry.student_id}_{date_value}_{stamp}"
+        rows.append({
+            "input_id": result["input_id"],
+            "student_id": entry.student_id,
+            "date": date_value,
+            "content": content,
+        })
+
+    try:
+        created = Neo4jService.get_instance().create_daily_inputs_bulk(rows, teacher_id) if rows else {}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create daily inputs: {str(e)}")
+
+    for result in results:
+        if result["input_id"] is None:
+            continue
+        if created.get(result["input_id"]):
+            result["status"] = "pending"
+        else:
+            result["status"] = "student_not_found"
+            result["input_id"] = None
+
+    pending = [r["input_id"] for r in results if r["status"] == "pending"]
+    get_daily_input_enrichment().submit(pending)
+
+    return {
+        "success": bool(pending),
+        "created": len(pending),
+        "failed": len(results) - len(pending),
+        "results": results,
+    }
+
+
 @router.get("/daily-inputs/{student_id}")
 async def get_student_daily_inputs(
     student_id: str,
@@ -494,17 +448,9 @@ async def get_teacher_students(teacher_id: str):
         학생 목록 (선생님의 담당 반 학생만)
     """
     try:
-        # teachers.json에서 선생님의 담당 반 조회
-        teachers_file = Path("/home/sh/projects/ClassMate/data/json/teachers.json")
-        with open(teachers_file, "r", encoding="utf-8") as f:
-            teachers_data = json.load(f)
-
-        # 선생님의 담당 반 찾기
-        assigned_classes = []
-        for teacher in teachers_data:
-            if teacher["teacher_id"] == teacher_id:
-                assigned_classes = teacher["assigned_classes"]
-                break
+        # teachers.json에서 선생님의 담당 반 조회 (teacher_id 인덱스)
+        roster = get_roster_store()
+        assigned_classes = roster.assigned_classes(teacher_id)
 
         if not assigned_classes:
             print(f"⚠️ Teacher {teacher_id} has no assigned classes")
@@ -515,12 +461,7 @@ async def get_teacher_students(teacher_id: str):
                 "assigned_classes": []
             }
 
-        # students_rag.json에서 학생 목록 읽기
-        students_file = Path("/home/sh/projects/ClassMate/data/json/students_rag.json")
-        with open(students_file, "r", encoding="utf-8") as f:
-            students_data = json.load(f)
-
-        # 선생님의 반 학생들만 필터링
+        # 선생님의 반 학생들만 (반→학생 인덱스)
         students = [
             {
                 "student_id": s["원본데이터"]["student_id"],
@@ -530,8 +471,7 @@ async def get_teacher_students(teacher_id: str):
                 "cefr": s["원본데이터"]["assessment"]["overall"]["cefr"],
                 "class_id": s["원본데이터"]["class_id"]
             }
-            for s in students_data
-            if s["원본데이터"]["class_id"] in assigned_classes
+            for s in roster.students_in_classes(assigned_classes)
         ]
 
         return {
@@ -603,31 +543,14 @@ async def update_student_record(
         업데이트 결과
     """
     try:
-        students_file = Path("/home/sh/projects/ClassMate/data/json/students_rag.json")
-
-        # 파일 읽기
-        with open(students_file, "r", encoding="utf-8") as f:
-            students_data = json.load(f)
+        roster = get_roster_store()
+        cached = roster.get_student_entry(student_id)
 
         # teacher_id가 제공된 경우 권한 체크
         if teacher_id:
-            teachers_file = Path("/home/sh/projects/ClassMate/data/json/teachers.json")
-            with open(teachers_file, "r", encoding="utf-8") as f:
-                teachers_data = json.load(f)
-
-            # 선생님의 담당 반 찾기
-            assigned_classes = []
-            for teacher in teachers_data:
-                if teacher["teacher_id"] == teacher_id:
-                    assigned_classes = teacher["assigned_classes"]
-                    break
-
-            # 학생의 반 확인
-            student_class = None
-            for student in students_data:
-                if student["원본데이터"]["student_id"] == student_id:
-                    student_class = student["원본데이터"]["class_id"]
-                    break
+            # 선생님의 담당 반 / 학생의 반 확인
+            assigned_classes = roster.assigned_classes(teacher_id)
+            student_class = student_record(cached).get("class_id") if cached else None
 
             # 권한 체크
             if student_class and student_class not in assigned_classes:
@@ -636,86 +559,103 @@ async def update_student_record(
                     detail=f"권한 없음: 선생님 {teacher_id}는 반 {student_class}의 학생을 수정할 수 없습니다."
                 )
 
-        # 해당 학생 찾기
-        student_found = False
-        for student in students_data:
-            if student["원본데이터"]["student_id"] == student_id:
-                student_found = True
-                original_data = student["원본데이터"]
-
-                # 출석 정보 업데이트
-                if update_data.attendance:
-                    if update_data.attendance.total_sessions is not None:
-                        original_data["attendance"]["total_sessions"] = update_data.attendance.total_sessions
-                    if update_data.attendance.absent is not None:
-                        original_data["attendance"]["absent"] = update_data.attendance.absent
-                    if update_data.attendance.perception is not None:
-                        original_data["attendance"]["perception"] = update_data.attendance.perception
-
-                # 숙제 정보 업데이트
-                if update_data.homework:
-                    if update_data.homework.assigned is not None:
-                        original_data["homework"]["assigned"] = update_data.homework.assigned
-                    if update_data.homework.missed is not None:
-                        original_data["homework"]["missed"] = update_data.homework.missed
-
-                # 특이사항 업데이트
-                if update_data.notes:
-                    if update_data.notes.attitude is not None:
-                        original_data["notes"]["attitude"] = update_data.notes.attitude
-                    if update_data.notes.school_exam_level is not None:
-                        original_data["notes"]["school_exam_level"] = update_data.notes.school_exam_level
-                    if update_data.notes.csat_level is not None:
-                        original_data["notes"]["csat_level"] = update_data.notes.csat_level
-
-                # 영역별 점수 업데이트 (시계열 이력 저장)
-                if update_data.radar_scores:
-                    # score_history 배열이 없으면 생성
-                    if "score_history" not in original_data["assessment"]:
-                        original_data["assessment"]["score_history"] = []
-
-                    # 현재 radar_scores를 history에 추가 (날짜와 함께)
-                    current_scores = original_data["assessment"]["radar_scores"].copy()
-                    history_entry = {
-                        "date": date.today().isoformat(),
-                        "scores": current_scores,
-                        "teacher_id": teacher_id if teacher_id else "unknown"
-                    }
-                    original_data["assessment"]["score_history"].append(history_entry)
-
-                    # 최대 90개까지만 유지 (초과 시 가장 오래된 것 제거)
-                    if len(original_data["assessment"]["score_history"]) > 90:
-                        original_data["assessment"]["score_history"].pop(0)  # 가장 오래된 것 제거
-
-                    # 현재 radar_scores 업데이트
-                    if update_data.radar_scores.grammar is not None:
-                        original_data["assessment"]["radar_scores"]["grammar"] = update_data.radar_scores.grammar
-                    if update_data.radar_scores.vocabulary is not None:
-                        original_data["assessment"]["radar_scores"]["vocabulary"] = update_data.radar_scores.vocabulary
-                    if update_data.radar_scores.reading is not None:
-                        original_data["assessment"]["radar_scores"]["reading"] = update_data.radar_scores.reading
-                    if update_data.radar_scores.listening is not None:
-                        original_data["assessment"]["radar_scores"]["listening"] = update_data.radar_scores.listening
-                    if update_data.radar_scores.writing is not None:
-                        original_data["assessment"]["radar_scores"]["writing"] = update_data.radar_scores.writing
-
-                # updated_at 갱신
-                original_data["updated_at"] = date.today().isoformat()
-
-                # 자연어 요약 재생성
-                print(f"[INFO] Regenerating summary for student {student_id}")
-                new_summary = generate_student_summary(original_data)
-                student["자연어요약"] = new_summary
-                print(f"[INFO] New summary: {new_summary}")
-
-                break
-
-        if not student_found:
+        if cached is None:
+            raise HTTPException(status_code=404, detail="학생을 찾을 수 없습니다.")
+
+        before = {}
+
+        def _apply(student):
+            # 트랜잭션 안에서 최신 레코드를 읽어 수정 (동시 요청의 변경을 덮어쓰지 않음)
+            before.update(prepare_for_neo4j(student))
+            original_data = student["원본데이터"]
+
+            # 출석 정보 업데이트
+            if update_data.attendance:
+                if update_data.attendance.total_sessions is not None:
+                    original_data["attendance"]["total_sessions"] = update_data.attendance.total_sessions
+                if update_data.attendance.absent is not None:
+                    original_data["attendance"]["absent"] = update_data.attendance.absent
+                if update_data.attendance.perception is not None:
+                    original_data["attendance"]["perception"] = update_data.attendance.perception
+
+            # 숙제 정보 업데이트
+            if update_data.homework:
+                if update_data.homework.assigned is not None:
+                    original_data["homework"]["assigned"] = update_data.homework.assigned
+                if update_data.homework.missed is not None:
+                    original_data["homework"]["missed"] = update_data.homework.missed
+
+            # 특이사항 업데이트
+            if update_data.notes:
+                if update_data.notes.attitude is not None:
+                    original_data["notes"]["attitude"] = update_data.notes.attitude
+                if update_data.notes.school_exam_level is not None:
+                    original_data["notes"]["school_exam_level"] = update_data.notes.school_exam_level
+                if update_data.notes.csat_level is not None:
+                    original_data["notes"]["csat_level"] = update_data.notes.csat_level
+
+            # 영역별 점수 업데이트 (이력은 score_history 저장소에 별도 기록)
+            if update_data.radar_scores:
+                # 현재 radar_scores 업데이트
+                if update_data.radar_scores.grammar is not None:
+                    original_data["assessment"]["radar_scores"]["grammar"] = update_data.radar_scores.grammar
+                if update_data.radar_scores.vocabulary is not None:
+                    original_data["assessment"]["radar_scores"]["vocabulary"] = update_data.radar_scores.vocabulary
+                if update_data.radar_scores.reading is not None:
+                    original_data["assessment"]["radar_scores"]["reading"] = update_data.radar_scores.reading
+                if update_data.radar_scores.listening is not None:
+                    original_data["assessment"]["radar_scores"]["listening"] = update_data.radar_scores.listening
+                if update_data.radar_scores.writing is not None:
+                    original_data["assessment"]["radar_scores"]["writing"] = update_data.radar_scores.writing
+
+            # updated_at 갱신
+            original_data["updated_at"] = date.today().isoformat()
+
+        try:
+            student, version = roster.update_student(student_id, _apply)
+        except KeyError:
             raise HTTPException(status_code=404, detail="학생을 찾을 수 없습니다.")
 
-        # 파일 저장
-        with open(students_file, "w", encoding="utf-8") as f:
-            json.dump(students_data, f, ensure_ascii=False, indent=2)
+        # 점수 시계열 기록 (오늘 날짜, 같은 날 재저장 시 대체)
+        if update_data.radar_scores:
+            record = student["원본데이터"]
+            try:
+                get_score_history_store().append(
+                    student_id, record["assessment"]["radar_scores"], class_id=record.get("class_id")
+                )
+            except Exception as e:
+                print(f"⚠️ Score history append failed for {student_id}: {e}")
+
+        # 자연어 요약 재생성 (LLM 호출은 트랜잭션 밖에서)
+        print(f"[INFO] Regenerating summary for student {student_id}")
+        new_summary = generate_student_summary(student["원본데이터"])
+        print(f"[INFO] New summary: {new_summary}")
+
+        # 그 사이 다른 수정이 있었다면 그쪽 요약이 더 최신이므로 덮어쓰지 않음
+        updated = roster.update_student(
+            student_id, lambda e: e.__setitem__("자연어요약", new_summary), if_version=version
+        )
+        if updated is not None:
+            student = updated[0]
+        else:
+            print(f"[INFO] Student {student_id} changed during summary generation; keeping newer summary")
+            student = roster.get_student_entry(student_id) or student
+
+        # Neo4j Student 노드에 바뀐 필드만 반영 (실패해도 파일 저장은 유지)
+        try:
+            after = prepare_for_neo4j(student)
+            changed = {k: v for k, v in after.items() if before.get(k) != v}
+            # 요약이 바뀌면 student_embedding도 다시 계산 (upload_students와 같은 입력)
+            embedding = None
+            if (changed.get("summary") or "").strip():
+                try:
+                    from teacher.shared.embeddings import embed_text
+                    embedding = embed_text(changed["summary"])
+                except Exception as e:
+                    print(f"⚠️ Student embedding failed for {student_id}: {e}")
+            Neo4jService.get_instance().sync_student_fields(student_id, changed, embedding)
+        except Exception as e:
+            print(f"⚠️ Neo4j student sync failed for {student_id}: {e}")
 
         return {
             "success": True,
@@ -741,19 +681,14 @@ async def get_student_detail(student_id: str):
         학생 상세 정보
     """
     try:
-        students_file = Path("/home/sh/projects/ClassMate/data/json/students_rag.json")
-
-        with open(students_file, "r", encoding="utf-8") as f:
-            students_data = json.load(f)
-
-        for student in students_data:
-            if student["원본데이터"]["student_id"] == student_id:
-                return {
-                    "success": True,
-                    "student": student["원본데이터"]
-                }
+        student = get_roster_store().get_student(student_id)
+        if student is None:
+            raise HTTPException(status_code=404, detail="학생을 찾을 수 없습니다.")
 
-        raise HTTPException(status_code=404, detail="학생을 찾을 수 없습니다.")
+        return {
+            "success": True,
+            "student": student
+        }
 
     except HTTPException:
         raise
@@ -790,16 +725,9 @@ async def update_class_schedule(
     """
     try:
         # 1. 권한 체크 (선생님이 해당 반 담당인지 확인)
+        roster = get_roster_store()
         if teacher_id:
-            teachers_file = Path("/home/sh/projects/ClassMate/data/json/teachers.json")
-            with open(teachers_file, "r", encoding="utf-8") as f:
-                teachers_data = json.load(f)
-
-            assigned_classes = []
-            for teacher in teachers_data:
-                if teacher["teacher_id"] == teacher_id:
-                    assigned_classes = teacher["assigned_classes"]
-                    break
+            assigned_classes = roster.assigned_classes(teacher_id)
 
             if class_id not in assigned_classes:
                 raise HTTPException(
@@ -807,64 +735,39 @@ async def update_class_schedule(
                     detail=f"권한 없음: 선생님 {teacher_id}는 반 {class_id}의 스케줄을 수정할 수 없습니다."
                 )
 
-        # 2. class.json 파일 업데이트
-        class_file = Path("/home/sh/projects/ClassMate/data/json/class.json")
-        with open(class_file, "r", encoding="utf-8") as f:
-            class_data = json.load(f)
-
-        class_found = False
-        for cls in class_data:
-            if cls["class_id"] == class_id:
-                class_found = True
-
-                # 필드 업데이트
-                if update_data.progress is not None:
-                    cls["progress"] = update_data.progress
-                if update_data.homework is not None:
-                    cls["homework"] = update_data.homework
-                if update_data.monthly_test is not None:
-                    cls["monthly_test"] = update_data.monthly_test
-
-                # updated_at 갱신
-                from datetime import datetime
-                cls["updated_at"] = datetime.now().isoformat()
-
-                break
-
-        if not class_found:
+        # 2. 반 정보 업데이트 (한 트랜잭션에서 읽기-수정-쓰기)
+        def _apply(cls):
+            if update_data.progress is not None:
+                cls["progress"] = update_data.progress
+            if update_data.homework is not None:
+                cls["homework"] = update_data.homework
+            if update_data.monthly_test is not None:
+                cls["monthly_test"] = update_data.monthly_test
+            # updated_at 갱신
+            cls["updated_at"] = datetime.now().isoformat()
+
+        try:
+            current_class = roster.update_class(class_id, _apply)
+        except KeyError:
             raise HTTPException(status_code=404, detail=f"반 {class_id}를 찾을 수 없습니다.")
 
-        # class.json 저장
-        with open(class_file, "w", encoding="utf-8") as f:
-            json.dump(class_data, f, ensure_ascii=False, indent=2)
-
         # 3. 임베딩 생성 (progress + homework + monthly_test 조합)
-        current_class = next(c for c in class_data if c["class_id"] == class_id)
         embedding_text = f"반 {class_id} {current_class.get('class_name', '')}: 진도 {current_class.get('progress', '')} | 숙제 {current_class.get('homework', '')} | 월간테스트 {current_class.get('monthly_test', '')}"
 
         from teacher.shared.embeddings import embed_text
         embedding = embed_text(embedding_text)
 
         # 4. Neo4j 업데이트
-        neo4j = Neo4jService.get_instance()
-        with neo4j.get_session() as session:
-            session.run("""
-                MATCH (c:Class {class_id: $class_id})
-                SET c.progress = $progress,
-                    c.homework = $homework,
-                    c.monthly_test = $monthly_test,
-                    c.updated_at = $updated_at,
-                    c.embedding = $embedding,
-                    c.embedding_ts = datetime()
-                RETURN c
-            """,
-                class_id=class_id,
-                progress=current_class.get("progress"),
-                homework=current_class.get("homework"),
-                monthly_test=current_class.get("monthly_test"),
-                updated_at=current_class.get("updated_at"),
-                embedding=embedding
-            )
+        Neo4jService.get_instance().sync_class_fields(
+            class_id,
+            {
+                "progress": current_class.get("progress"),
+                "homework": current_class.get("homework"),
+                "monthly_test": current_class.get("monthly_test"),
+                "updated_at": current_class.get("updated_at"),
+            },
+            embedding,
+        )
 
         print(f"[INFO] Class {class_id} schedule updated successfully")
 
@@ -895,18 +798,14 @@ async def get_class_schedule(class_id: str):
         반 스케줄 정보
     """
     try:
-        class_file = Path("/home/sh/projects/ClassMate/data/json/class.json")
-        with open(class_file, "r", encoding="utf-8") as f:
-            class_data = json.load(f)
-
-        for cls in class_data:
-            if cls["class_id"] == class_id:
-                return {
-                    "success": True,
-                    "class": cls
-                }
-
-        raise HTTPException(status_code=404, detail=f"반 {class_id}를 찾을 수 없습니다.")
+        cls = get_roster_store().get_class(class_id)
+        if cls is None:
+            raise HTTPException(status_code=404, detail=f"반 {class_id}를 찾을 수 없습니다.")
+
+        return {
+            "success": True,
+            "class": cls
+        }
 
     except HTTPException:
         raise
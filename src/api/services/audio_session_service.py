@@ -2,22 +2,55 @@
 """
 Audio Session Service
 세션별 오디오 파일 추적 및 정리
+
+- 추적 정보는 SQLite(data/audio_sessions.db, WAL)에 저장되어 여러 uvicorn 워커가 공유한다.
+- track_audio는 메모리 큐에 추가만 하고(O(1)), 백그라운드 스레드가 모아서 한 트랜잭션으로 기록한다.
+- 같은 캐시 MP3를 여러 세션이 공유하므로 파일별 참조 수(refcount)를 관리하고,
+  마지막 참조가 사라진 파일만 삭제한다.
+- TTL 스위퍼가 오래된 세션 참조를 만료시키고 참조 없는 파일을 조금씩(배치 단위) 삭제한다.
 """
 from __future__ import annotations
-from typing import Dict, List, Set
+from typing import List, Optional, Tuple
 from pathlib import Path
+from contextlib import contextmanager
+import atexit
 import json
 import os
+import sqlite3
+import threading
+import time
+import uuid
+
 
 class AudioSessionService:
-    """세션별 오디오 파일 관리"""
+    """세션별 오디오 파일 관리 (Singleton)"""
 
     _instance = None
 
     def __init__(self):
-        self.session_audio_map: Dict[str, Set[str]] = {}
-        self.tracking_file = Path("data/audio_sessions.json")
-        self._load_tracking_data()
+        self.db_path = Path(os.getenv("AUDIO_SESSIONS_DB", "data/audio_sessions.db"))
+        self.legacy_file = Path("data/audio_sessions.json")
+        self.session_ttl_s = float(os.getenv("AUDIO_SESSION_TTL_HOURS", "24")) * 3600
+        # 만료시키지 않는 세션 (미리 생성한 문제 풀 오디오)
+        self.pinned_sessions = {
+            s.strip() for s in os.getenv("AUDIO_SESSION_PINNED", "problem_pool").split(",") if s.strip()
+        }
+        self.flush_interval_s = 1.0
+        self.flush_batch_size = 200
+        self.sweep_interval_s = 300.0
+        self.sweep_batch_size = 100
+
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._queue: List[Tuple[str, str, float]] = []
+        self._queue_lock = threading.Lock()
+        self._flush_wake = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self._init_db()
+        self._migrate_legacy_json()
+        atexit.register(self.flush)
 
     @classmethod
     def get_instance(cls):
@@ -26,90 +59,322 @@ class AudioSessionService:
             cls._instance = AudioSessionService()
         return cls._instance
 
-    def _load_tracking_data(self):
-        """저장된 추적 데이터 로드"""
-        if self.tracking_file.exists():
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextmanager
+    def _db(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """쓰기 트랜잭션 (워커 간 직렬화)"""
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
             try:
-                with open(self.tracking_file, 'r') as f:
-                    data = json.load(f)
-                    # JSON에서 list를 set으로 변환
-                    self.session_audio_map = {
-                        k: set(v) for k, v in data.items()
-                    }
-            except Exception as e:
-                print(f"Warning: Failed to load audio tracking data: {e}")
-                self.session_audio_map = {}
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _init_db(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS session_audio (
+                    session_id TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    tracked_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, path)
+                );
+                CREATE INDEX IF NOT EXISTS idx_session_audio_tracked
+                    ON session_audio (tracked_at);
+                CREATE TABLE IF NOT EXISTS audio_files (
+                    path TEXT PRIMARY KEY,
+                    refcount INTEGER NOT NULL DEFAULT 0,
+                    unreferenced_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_audio_files_unreferenced
+                    ON audio_files (unreferenced_at) WHERE refcount = 0;
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+            """)
 
-    def _save_tracking_data(self):
-        """추적 데이터 저장"""
+    def _migrate_legacy_json(self):
+        """기존 data/audio_sessions.json 추적 데이터를 한 번만 가져옴"""
+        if not self.legacy_file.exists():
+            return
         try:
-            self.tracking_file.parent.mkdir(parents=True, exist_ok=True)
-            # set을 list로 변환하여 JSON 저장
-            data = {k: list(v) for k, v in self.session_audio_map.items()}
-            with open(self.tracking_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with open(self.legacy_file, 'r') as f:
+                data = json.load(f)
+            now = time.time()
+            with self._transaction() as conn:
+                for session_id, paths in data.items():
+                    for path in paths:
+                        self._insert_ref(conn, session_id, path, now)
+            self.legacy_file.rename(self.legacy_file.with_suffix(".json.migrated"))
+            print(f"✅ Migrated {len(data)} audio sessions from {self.legacy_file}")
+        except FileNotFoundError:
+            pass  # 다른 워커가 먼저 옮김
         except Exception as e:
-            print(f"Warning: Failed to save audio tracking data: {e}")
+            print(f"Warning: Failed to migrate audio tracking data: {e}")
 
-    def track_audio(self, session_id: str, audio_path: str):
-        """세션에 오디오 파일 연결"""
-        if session_id not in self.session_audio_map:
-            self.session_audio_map[session_id] = set()
+    @staticmethod
+    def _insert_ref(conn: sqlite3.Connection, session_id: str, path: str, tracked_at: float):
+        """세션-파일 참조 추가 (새 참조일 때만 refcount 증가, 기존 참조는 시각만 갱신)"""
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO session_audio (session_id, path, tracked_at) VALUES (?, ?, ?)",
+            (session_id, path, tracked_at)
+        )
+        if cur.rowcount:
+            conn.execute(
+                "INSERT INTO audio_files (path, refcount, unreferenced_at) VALUES (?, 1, NULL) "
+                "ON CONFLICT (path) DO UPDATE SET refcount = refcount + 1, unreferenced_at = NULL",
+                (path,)
+            )
+        else:
+            conn.execute(
+                "UPDATE session_audio SET tracked_at = ? WHERE session_id = ? AND path = ?",
+                (tracked_at, session_id, path)
+            )
 
-        self.session_audio_map[session_id].add(audio_path)
-        self._save_tracking_data()
+    @staticmethod
+    def _release_refs(conn: sqlite3.Connection, rows: List[Tuple[str, str]]):
+        """세션-파일 참조 제거 후 refcount 감소 (0이 되면 삭제 대상으로 표시)"""
+        now = time.time()
+        for session_id, path in rows:
+            cur = conn.execute(
+                "DELETE FROM session_audio WHERE session_id = ? AND path = ?", (session_id, path)
+            )
+            if cur.rowcount:
+                conn.execute(
+                    "UPDATE audio_files SET refcount = MAX(refcount - 1, 0), "
+                    "unreferenced_at = CASE WHEN refcount <= 1 THEN ? ELSE NULL END WHERE path = ?",
+                    (now, path)
+                )
+
+    # ------------------------------------------------------------------
+    # Tracking (batched)
+    # ------------------------------------------------------------------
+    def track_audio(self, session_id: str, audio_path: str):
+        """세션에 오디오 파일 연결 (큐에 추가만 하고 백그라운드에서 일괄 기록)"""
+        with self._queue_lock:
+            self._queue.append((session_id, audio_path, time.time()))
+            pending = len(self._queue)
+        self._ensure_flusher()
+        if pending >= self.flush_batch_size:
+            self._flush_wake.set()
         print(f"📎 Tracked: {audio_path} → session {session_id}")
 
+    def flush(self) -> int:
+        """대기 중인 추적 이벤트를 한 트랜잭션으로 기록"""
+        with self._queue_lock:
+            batch, self._queue = self._queue, []
+        if not batch:
+            return 0
+        try:
+            with self._transaction() as conn:
+                for session_id, path, tracked_at in batch:
+                    self._insert_ref(conn, session_id, path, tracked_at)
+        except Exception as e:
+            print(f"Warning: Failed to save audio tracking data: {e}")
+            with self._queue_lock:
+                self._queue = batch + self._queue
+            return 0
+        return len(batch)
+
+    def _ensure_flusher(self):
+        if self._flusher and self._flusher.is_alive():
+            return
+        with self._queue_lock:
+            if self._flusher and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="audio-session-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._flush_wake.wait(self.flush_interval_s)
+            self._flush_wake.clear()
+            self.flush()
+
+    # ------------------------------------------------------------------
+    # Queries / cleanup
+    # ------------------------------------------------------------------
     def get_session_audio(self, session_id: str) -> List[str]:
         """세션의 모든 오디오 파일 반환"""
-        return list(self.session_audio_map.get(session_id, set()))
+        self.flush()
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT path FROM session_audio WHERE session_id = ?", (session_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
 
-    def cleanup_session(self, session_id: str) -> int:
-        """세션의 모든 오디오 파일 삭제"""
-        if session_id not in self.session_audio_map:
-            return 0
+    def _delete_unreferenced(self, limit: Optional[int] = None) -> int:
+        """참조 없는 파일 삭제 (오래전에 참조가 끊긴 것부터 limit개씩)"""
+        query = "SELECT path FROM audio_files WHERE refcount = 0 ORDER BY unreferenced_at"
+        params: list = []
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
 
-        audio_files = self.session_audio_map[session_id]
-        deleted_count = 0
+        with self._db() as conn:
+            paths = [row[0] for row in conn.execute(query, params).fetchall()]
 
-        for audio_path in audio_files:
+        deleted_count = 0
+        removed = []
+        for audio_path in paths:
             file_path = Path(audio_path)
-            if file_path.exists():
-                try:
-                    file_path.unlink()
-                    deleted_count += 1
-                    print(f"🗑️  Deleted: {audio_path}")
-                except Exception as e:
-                    print(f"Warning: Failed to delete {audio_path}: {e}")
-
-        # 세션 정보 제거
-        del self.session_audio_map[session_id]
-        self._save_tracking_data()
-
-        print(f"✅ Cleaned up {deleted_count} audio files for session {session_id}")
+            try:
+                file_path.unlink()
+                deleted_count += 1
+                print(f"🗑️  Deleted: {audio_path}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Warning: Failed to delete {audio_path}: {e}")
+                continue
+            removed.append(audio_path)
+
+        if removed:
+            with self._transaction() as conn:
+                # 삭제하는 사이 다시 참조된 파일은 남김 (다음 생성 시 재렌더링)
+                conn.executemany(
+                    "DELETE FROM audio_files WHERE path = ? AND refcount = 0", [(p,) for p in removed]
+                )
         return deleted_count
 
-    def cleanup_all_orphaned(self) -> int:
-        """추적되지 않는 오디오 파일 모두 삭제"""
-        audio_dir = Path("static/audio")
-        if not audio_dir.exists():
+    def cleanup_session(self, session_id: str) -> int:
+        """세션의 오디오 참조 해제 후 다른 세션이 쓰지 않는 파일 삭제"""
+        self.flush()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT session_id, path FROM session_audio WHERE session_id = ?", (session_id,)
+            ).fetchall()
+            if not rows:
+                return 0
+            orphaned = self._release_and_collect(conn, rows)
+
+        deleted_count = self._delete_orphaned(orphaned)
+        print(f"✅ Cleaned up {deleted_count} audio files for session {session_id} "
+              f"({len(rows) - len(orphaned)} still shared)")
+        return deleted_count
+
+    def release_audio(self, session_id: str, paths: List[str]) -> int:
+        """세션의 특정 오디오 참조만 해제 후 다른 세션이 쓰지 않는 파일 삭제 (고정 세션도 해제)"""
+        if not paths:
             return 0
+        self.flush()
+        with self._transaction() as conn:
+            orphaned = self._release_and_collect(conn, [(session_id, p) for p in paths])
+        return self._delete_orphaned(orphaned)
 
-        # 모든 추적 중인 파일 목록
-        tracked_files = set()
-        for files in self.session_audio_map.values():
-            tracked_files.update(files)
+    def _release_and_collect(self, conn: sqlite3.Connection, rows: List[Tuple[str, str]]) -> List[str]:
+        """참조 해제 후 참조가 0이 된 파일 목록"""
+        self._release_refs(conn, rows)
+        placeholders = ",".join("?" * len(rows))
+        return [
+            row[0] for row in conn.execute(
+                f"SELECT path FROM audio_files WHERE refcount = 0 AND path IN ({placeholders})",
+                [path for _, path in rows]
+            ).fetchall()
+        ]
 
+    def _delete_orphaned(self, orphaned: List[str]) -> int:
         deleted_count = 0
-        for mp3_file in audio_dir.glob("*.mp3"):
-            file_str = str(mp3_file)
-            if file_str not in tracked_files:
-                try:
-                    mp3_file.unlink()
-                    deleted_count += 1
-                    print(f"🗑️  Deleted orphaned: {mp3_file.name}")
-                except Exception as e:
-                    print(f"Warning: Failed to delete {mp3_file}: {e}")
+        for audio_path in orphaned:
+            try:
+                Path(audio_path).unlink()
+                deleted_count += 1
+                print(f"🗑️  Deleted: {audio_path}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Warning: Failed to delete {audio_path}: {e}")
+        if orphaned:
+            with self._transaction() as conn:
+                conn.executemany(
+                    "DELETE FROM audio_files WHERE path = ? AND refcount = 0", [(p,) for p in orphaned]
+                )
+        return deleted_count
 
+    def cleanup_all_orphaned(self) -> int:
+        """참조가 남지 않은 오디오 파일 모두 삭제 (디렉터리 전체 탐색 없이 추적 정보 기준)"""
+        self.flush()
+        deleted_count = self._delete_unreferenced()
         print(f"✅ Cleaned up {deleted_count} orphaned audio files")
         return deleted_count
+
+    # ------------------------------------------------------------------
+    # TTL sweeper
+    # ------------------------------------------------------------------
+    def _acquire_lease(self, ttl_s: float) -> bool:
+        """여러 uvicorn 워커 중 하나만 정리하도록 임대(lease) 획득"""
+        now = time.time()
+        with self._db() as conn:
+            cur = conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES ('sweeper', ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                (self._owner, now + ttl_s, now)
+            )
+            return cur.rowcount > 0
+
+    def sweep_once(self) -> int:
+        """만료된 세션 참조를 배치 단위로 해제하고 참조 없는 파일 삭제 (삭제한 파일 수 반환)"""
+        self.flush()
+        cutoff = time.time() - self.session_ttl_s
+        pinned = sorted(self.pinned_sessions)
+        placeholders = ",".join("?" * len(pinned)) or "''"
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT session_id, path FROM session_audio "
+                f"WHERE tracked_at < ? AND session_id NOT IN ({placeholders}) LIMIT ?",
+                (cutoff, *pinned, self.sweep_batch_size)
+            ).fetchall()
+            self._release_refs(conn, rows)
+        if rows:
+            print(f"⌛ Expired {len(rows)} audio session references")
+        return self._delete_unreferenced(limit=self.sweep_batch_size)
+
+    def start_sweeper(self):
+        """TTL 스위퍼 시작"""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="audio-session-sweep", daemon=True)
+        self._sweeper.start()
+        print(f"✅ Audio session sweeper started (ttl={self.session_ttl_s / 3600:.0f}h)")
+
+    def stop_sweeper(self):
+        """TTL 스위퍼 종료 (대기 중인 추적 이벤트 기록)"""
+        self._stop.set()
+        self._flush_wake.set()
+        if self._sweeper:
+            self._sweeper.join(timeout=5)
+            self._sweeper = None
+        self.flush()
+
+    def _sweep_loop(self):
+        while not self._stop.is_set():
+            try:
+                if self._acquire_lease(self.sweep_interval_s * 2):
+                    # 한 번에 batch만큼만 처리하고, 남았으면 바로 이어서
+                    while not self._stop.is_set() and self.sweep_once() >= self.sweep_batch_size:
+                        pass
+            except Exception as e:
+                print(f"⚠️  Audio session sweep failed: {e}")
+            self._stop.wait(self.sweep_interval_s)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Daily Input Enrichment
+Daily Input 요약/임베딩 비동기 보강 워커
+
+- POST /api/teachers/daily-input은 원본 기록만 Neo4j에 저장(enrichment_status='pending')하고 바로 응답한다.
+- 워커 스레드가 pending 기록을 모아서(DAILY_INPUT_BATCH_SIZE, 저장 신호 후 DAILY_INPUT_LINGER_S만큼 더 모음)
+  gpt-4o-mini 한 번 호출에 여러 건(DAILY_INPUT_SUMMARY_BATCH)을 structured output으로 요약하고,
+  요약 전체를 embed_batch 한 번으로 임베딩한 뒤 UNWIND 한 트랜잭션으로 노드에 반영한다.
+- 대기열은 Neo4j 노드 상태 자체라 재시작 후에도 남는다. 가져간 채 끝나지 않은 기록(프로세스 종료)은
+  DAILY_INPUT_CLAIM_TTL_S 후 다시 가져가고, DAILY_INPUT_MAX_ATTEMPTS번 실패하면 failed로 남긴다.
+- LLM 요약이 실패한 기록은 기존과 같은 간단 요약(날짜 + 앞부분)으로 대신한다.
+- 반 전체 일괄 입력(POST /api/teachers/daily-input/bulk)은 submit()으로 그 기록들만 한 작업으로 넘겨
+  다른 pending 기록보다 먼저 처리하고, 요약 호출들은 DAILY_INPUT_SUMMARY_CONCURRENCY개씩 동시에 보낸다.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from api.services.neo4j_service import Neo4jService
+from shared.services.llm_client import get_llm_client, LANE_BATCH
+
+DAILY_INPUT_SUMMARY_MODEL = os.getenv("DAILY_INPUT_SUMMARY_MODEL", "gpt-4o-mini")
+DAILY_INPUT_BATCH_SIZE = int(os.getenv("DAILY_INPUT_BATCH_SIZE", "40"))      # 한 번에 가져오는 기록 수
+DAILY_INPUT_SUMMARY_BATCH = int(os.getenv("DAILY_INPUT_SUMMARY_BATCH", "10"))  # LLM 호출 1회당 요약 수
+DAILY_INPUT_SUMMARY_CONCURRENCY = int(os.getenv("DAILY_INPUT_SUMMARY_CONCURRENCY", "4"))
+DAILY_INPUT_LINGER_S = float(os.getenv("DAILY_INPUT_LINGER_S", "1.0"))
+DAILY_INPUT_POLL_S = float(os.getenv("DAILY_INPUT_POLL_S", "30"))
+DAILY_INPUT_CLAIM_TTL_S = float(os.getenv("DAILY_INPUT_CLAIM_TTL_S", "300"))
+DAILY_INPUT_MAX_ATTEMPTS = int(os.getenv("DAILY_INPUT_MAX_ATTEMPTS", "3"))
+
+_SUMMARY_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "daily_input_summaries",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "summaries": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "summary": {"type": "string"},
+                        },
+                        "required": ["id", "summary"],
+                        "additionalProperties": False,
+                    },
+                }
+            },
+            "required": ["summaries"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+_SUMMARY_PROMPT = """다음 학생 일일 기록들을 각각 한 줄로 간결하게 요약하세요.
+주제(문법/어휘/독해/듣기/쓰기/숙제/태도 등)를 내용에서 자동으로 파악하여 포함하세요.
+
+각 요약 형식: "[날짜]: [주제] - [핵심 내용]"
+모든 기록에 대해 같은 id로 하나씩 요약을 반환하세요.
+
+기록 (JSON):
+{records}"""
+
+
+def fallback_summary(date: str, content: str) -> str:
+    """LLM 요약 실패 시 간단 요약"""
+    return f"{date}: {content[:60]}..."
+
+
+class DailyInputEnrichment:
+    """Daily Input 요약/임베딩 보강 워커 (Singleton)"""
+
+    _instance = None
+
+    def __init__(self):
+        self.client = get_llm_client(lane=LANE_BATCH)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._jobs_lock = threading.Lock()
+        self._jobs: List[List[str]] = []
+
+    @classmethod
+    def get_instance(cls) -> DailyInputEnrichment:
+        """싱글톤 인스턴스 반환"""
+        if cls._instance is None:
+            cls._instance = DailyInputEnrichment()
+        return cls._instance
+
+    # ==================== 워커 ====================
+
+    def start(self):
+        """보강 워커 시작 (남아 있는 pending 기록부터 처리)"""
+        if self._thread and self._thread.is_alive():
+            return
+        try:
+            Neo4jService.get_instance().ensure_daily_input_indexes()
+        except Exception as e:
+            print(f"⚠️  Daily input index setup failed: {e}")
+        self._stop.clear()
+        self._wake.set()
+        self._thread = threading.Thread(target=self._worker_loop, name="daily-input-enrichment", daemon=True)
+        self._thread.start()
+        print(f"✅ Daily input enrichment worker started (batch={DAILY_INPUT_BATCH_SIZE}, "
+              f"per_call={DAILY_INPUT_SUMMARY_BATCH})")
+
+    def stop(self):
+        """보강 워커 종료 (처리 중인 기록은 다음 실행 때 다시 가져감)"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def notify(self):
+        """새 기록 저장 알림 → 워커가 곧 깨어나 모아서 처리"""
+        self._wake.set()
+
+    def submit(self, input_ids: List[str]):
+        """일괄 저장한 기록들을 한 작업으로 처리 (다른 pending 기록보다 먼저)"""
+        if not input_ids:
+            return
+        with self._jobs_lock:
+            self._jobs.append(list(input_ids))
+        self._wake.set()
+
+    def _next_job(self) -> Optional[List[str]]:
+        with self._jobs_lock:
+            return self._jobs.pop(0) if self._jobs else None
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(DAILY_INPUT_POLL_S)
+            if self._stop.is_set():
+                break
+            self._wake.clear()
+            # 일괄 입력 작업은 바로, 개별 저장은 잠시 더 모아서 한 배치로
+            job = self._next_job()
+            while job is not None and not self._stop.is_set():
+                try:
+                    self.process_once(limit=len(job), input_ids=job)
+                except Exception as e:
+                    print(f"⚠️  Daily input enrichment failed (bulk, {len(job)} notes): {e}")
+                job = self._next_job()
+            self._stop.wait(DAILY_INPUT_LINGER_S)
+            try:
+                while not self._stop.is_set() and self.process_once() >= DAILY_INPUT_BATCH_SIZE:
+                    if self._jobs:
+                        self._wake.set()  # 새 일괄 작업 우선
+                        break
+            except Exception as e:
+                print(f"⚠️  Daily input enrichment failed: {e}")
+
+    # ==================== 배치 처리 ====================
+
+    def process_once(self, limit: int = DAILY_INPUT_BATCH_SIZE, input_ids: Optional[List[str]] = None) -> int:
+        """
+        pending 기록 한 배치 처리
+
+        Args:
+            limit: 최대 기록 수
+            input_ids: 지정하면 이 기록들만
+
+        Returns:
+            가져간 기록 수 (limit과 같으면 더 남아 있을 수 있음)
+        """
+        neo4j = Neo4jService.get_instance()
+        claim = uuid.uuid4().hex
+        stale_before = (datetime.now() - timedelta(seconds=DAILY_INPUT_CLAIM_TTL_S)).isoformat()
+        notes = neo4j.claim_pending_daily_inputs(claim, limit, stale_before, DAILY_INPUT_MAX_ATTEMPTS, input_ids)
+        if not notes:
+            return 0
+
+        try:
+            summaries = self.summarize(notes)
+            from teacher.shared.embeddings import embed_batch
+            embeddings = embed_batch([summaries[n["input_id"]] for n in notes], max_length=256)
+            rows = [
+                {"input_id": n["input_id"], "summary": summaries[n["input_id"]], "embedding": emb}
+                for n, emb in zip(notes, embeddings)
+            ]
+            patched = neo4j.patch_daily_input_enrichment(claim, rows)
+            print(f"📝 Daily inputs enriched: {patched}/{len(notes)}")
+        except Exception as e:
+            neo4j.release_daily_input_claims(
+                claim, [n["input_id"] for n in notes], f"{e.__class__.__name__}: {e}", DAILY_INPUT_MAX_ATTEMPTS
+            )
+            raise
+        return len(notes)
+
+    def summarize(self, notes: List[Dict[str, Any]]) -> Dict[str, str]:
+        """input_id → 한 줄 요약 (LLM 호출 1회당 DAILY_INPUT_SUMMARY_BATCH건)"""
+        summaries: Dict[str, str] = {}
+        chunks = [notes[i:i + DAILY_INPUT_SUMMARY_BATCH] for i in range(0, len(notes), DAILY_INPUT_SUMMARY_BATCH)]
+
+        def _run(chunk: List[Dict[str, Any]]) -> Dict[str, str]:
+            try:
+                return self._summarize_chunk(chunk)
+            except Exception as e:
+                print(f"⚠️  Daily input summary failed ({len(chunk)} notes): {e}")
+                return {}
+
+        if len(chunks) == 1:
+            summaries.update(_run(chunks[0]))
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, min(DAILY_INPUT_SUMMARY_CONCURRENCY, len(chunks)))) as pool:
+                for result in pool.map(_run, chunks):
+                    summaries.update(result)
+        for n in notes:
+            if not summaries.get(n["input_id"]):
+                summaries[n["input_id"]] = fallback_summary(n["date"], n["content"])
+        return summaries
+
+    def _summarize_chunk(self, chunk: List[Dict[str, Any]]) -> Dict[str, str]:
+        records = [{"id": str(k), "date": n["date"], "content": n["content"]} for k, n in enumerate(chunk)]
+        response = self.client.chat.completions.create(
+            model=DAILY_INPUT_SUMMARY_MODEL,
+            messages=[{"role": "user", "content": _SUMMARY_PROMPT.format(
+                records=json.dumps(records, ensure_ascii=False)
+            )}],
+            response_format=_SUMMARY_SCHEMA,
+            temperature=0.3,
+            max_tokens=100 * len(chunk) + 50
+        )
+        result = json.loads(response.choices[0].message.content or "{}")
+        by_id = {str(k): n["input_id"] for k, n in enumerate(chunk)}
+        return {
+            by_id[item["id"]]: item["summary"].strip()
+            for item in result.get("summaries", [])
+            if item.get("id") in by_id and (item.get("summary") or "").strip()
+        }
+
+
+def get_daily_input_enrichment() -> DailyInputEnrichment:
+    """Daily Input 보강 워커 싱글톤 반환"""
+    return DailyInputEnrichment.get_instance()
@@ -7,7 +7,6 @@ from __future__ import annotations
 import os
 from typing import List, Dict, Any, Optional, Tuple
 from neo4j import GraphDatabase, Driver, Session
-from openai import OpenAI
 
 
 class Neo4jService:
@@ -38,9 +37,6 @@ class Neo4jService:
             max_connection_lifetime=3600
         )
 
-        # OpenAI client for summary generation
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
         self._initialized = True
 
     @classmethod
@@ -481,43 +477,6 @@ class Neo4jService:
 
     # ==================== Daily Input 메서드 ====================
 
-    def _generate_daily_input_summary(self, content: str, date: str) -> str:
-        """
-        Daily Input 내용을 GPT-4o-mini로 간결하게 요약 (카테고리 자동 추론)
-
-        Args:
-            content: 원본 내용
-            date: 날짜
-
-        Returns:
-            요약된 내용 (RAG 검색용)
-        """
-        try:
-            prompt = f"""다음 학생 일일 기록을 한 줄로 간결하게 요약하세요.
-주제(문법/어휘/독해/듣기/쓰기/숙제/태도 등)를 내용에서 자동으로 파악하여 포함하세요.
-
-형식: "{date}: [주제] - [핵심 내용]"
-
-원본:
-{content}
-
-요약 (한 줄):"""
-
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=100
-            )
-
-            summary = response.choices[0].message.content.strip()
-            return summary
-
-        except Exception as e:
-            print(f"[Neo4j] Error generating summary: {e}")
-            # Fallback: 간단한 자동 요약
-            return f"{date}: {content[:60]}..."
-
     def create_daily_input(
         self,
         input_id: str,
@@ -527,7 +486,7 @@ class Neo4jService:
         teacher_id: str
     ) -> bool:
         """
-        Daily Input 생성 (자동 요약 + 임베딩 생성, 카테고리 자동 추론)
+        Daily Input 원본 저장 (요약/임베딩은 daily_input_enrichment 워커가 나중에 채움)
 
         Args:
             input_id: Input ID
@@ -537,18 +496,9 @@ class Neo4jService:
             teacher_id: 선생님 ID
 
         Returns:
-            성공 여부
+            성공 여부 (학생이 없으면 False)
         """
         from datetime import datetime
-        from teacher.shared.embeddings import embed_text
-
-        # 1. GPT-4o-mini로 자동 요약 생성 (카테고리도 GPT가 자동 추론)
-        summary = self._generate_daily_input_summary(content, date)
-        print(f"[Neo4j] Generated summary: {summary}")
-
-        # 2. Qwen3로 임베딩 생성
-        embedding = embed_text(summary, max_length=256)
-        print(f"[Neo4j] Generated embedding: {len(embedding)}-dim")
 
         query = """
             MATCH (s:Student {student_id: $student_id})
@@ -556,10 +506,10 @@ class Neo4jService:
                 input_id: $input_id,
                 date: $date,
                 content: $content,
-                summary: $summary,
-                embedding: $embedding,
                 teacher_id: $teacher_id,
-                created_at: $created_at
+                created_at: $created_at,
+                enrichment_status: 'pending',
+                enrichment_attempts: 0
             })
             CREATE (s)-[:HAS_INPUT]->(i)
             RETURN i
@@ -571,13 +521,135 @@ class Neo4jService:
                 "input_id": input_id,
                 "date": date,
                 "content": content,
-                "summary": summary,
-                "embedding": embedding,
                 "teacher_id": teacher_id,
                 "created_at": datetime.now().isoformat()
             })
             return result.single() is not None
 
+    def create_daily_inputs_bulk(self, rows: List[Dict[str, Any]], teacher_id: str) -> Dict[str, bool]:
+        """
+        Daily Input 여러 건 원본 저장 (UNWIND 한 트랜잭션, 요약/임베딩은 보강 워커가 처리)
+
+        Args:
+            rows: [{"input_id", "student_id", "date", "content"}]
+            teacher_id: 선생님 ID
+
+        Returns:
+            input_id → 저장 여부 (학생 노드가 없으면 False)
+        """
+        from datetime import datetime
+
+        with self.get_session() as session:
+            result = session.run("""
+                UNWIND $rows AS row
+                OPTIONAL MATCH (s:Student {student_id: row.student_id})
+                FOREACH (_ IN CASE WHEN s IS NULL THEN [] ELSE [1] END |
+                    CREATE (i:DailyInput {
+                        input_id: row.input_id,
+                        date: row.date,
+                        content: row.content,
+                        teacher_id: $teacher_id,
+                        created_at: $created_at,
+                        enrichment_status: 'pending',
+                        enrichment_attempts: 0
+                    })
+                    CREATE (s)-[:HAS_INPUT]->(i)
+                )
+                RETURN row.input_id AS input_id, s IS NOT NULL AS created
+            """, rows=rows, teacher_id=teacher_id, created_at=datetime.now().isoformat())
+            return {record["input_id"]: record["created"] for record in result}
+
+    # ---------- Daily Input 요약/임베딩 보강 (daily_input_enrichment 워커용) ----------
+
+    def ensure_daily_input_indexes(self):
+        """보강 대기열 조회용 인덱스"""
+        with self.get_session() as session:
+            session.run("CREATE INDEX daily_input_id IF NOT EXISTS FOR (i:DailyInput) ON (i.input_id)")
+            session.run("CREATE INDEX daily_input_enrichment IF NOT EXISTS FOR (i:DailyInput) ON (i.enrichment_status)")
+
+    def claim_pending_daily_inputs(
+        self,
+        claim: str,
+        limit: int,
+        stale_before: str,
+        max_attempts: int,
+        input_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        요약/임베딩이 없는 Daily Input을 오래된 순으로 가져와 처리 중으로 표시
+
+        Args:
+            claim: 이번 처리의 토큰 (patch/release 시 같은 토큰인 노드만 수정)
+            limit: 최대 개수
+            stale_before: 이 시각 이전에 가져간 채 끝나지 않은 작업은 다시 가져감 (프로세스 종료 대비)
+            max_attempts: 시도 횟수 상한
+            input_ids: 지정하면 이 기록들만 (일괄 입력 한 건을 한 배치로)
+
+        Returns:
+            [{"input_id", "date", "content"}]
+        """
+        from datetime import datetime
+
+        with self.get_session() as session:
+            result = session.run("""
+                MATCH (i:DailyInput)
+                WHERE (i.enrichment_status = 'pending'
+                       OR (i.enrichment_status = 'processing' AND i.enrichment_claimed_at < $stale_before))
+                  AND coalesce(i.enrichment_attempts, 0) < $max_attempts
+                  AND ($input_ids IS NULL OR i.input_id IN $input_ids)
+                WITH i ORDER BY i.created_at LIMIT $limit
+                SET i.enrichment_status = 'processing',
+                    i.enrichment_claim = $claim,
+                    i.enrichment_claimed_at = $now,
+                    i.enrichment_attempts = coalesce(i.enrichment_attempts, 0) + 1
+                RETURN i.input_id AS input_id, i.date AS date, i.content AS content
+            """, claim=claim, limit=limit, stale_before=stale_before, max_attempts=max_attempts,
+                input_ids=input_ids, now=datetime.now().isoformat())
+            return [record.data() for record in result]
+
+    def patch_daily_input_enrichment(self, claim: str, rows: List[Dict[str, Any]]) -> int:
+        """
+        요약/임베딩 일괄 반영 (한 트랜잭션)
+
+        Args:
+            claim: claim_pending_daily_inputs에서 쓴 토큰
+            rows: [{"input_id", "summary", "embedding"}]
+
+        Returns:
+            반영된 노드 수
+        """
+        with self.get_session() as session:
+            result = session.run("""
+                UNWIND $rows AS row
+                MATCH (i:DailyInput {input_id: row.input_id})
+                WHERE i.enrichment_claim = $claim
+                SET i.summary = row.summary,
+                    i.embedding = row.embedding,
+                    i.enrichment_status = 'done',
+                    i.enriched_at = datetime()
+                REMOVE i.enrichment_claim, i.enrichment_claimed_at, i.enrichment_error
+                RETURN count(i) AS patched
+            """, claim=claim, rows=rows)
+            return result.single()["patched"]
+
+    def release_daily_input_claims(
+        self,
+        claim: str,
+        input_ids: List[str],
+        error: str,
+        max_attempts: int
+    ):
+        """보강 실패한 Daily Input을 다시 대기 상태로 (시도 횟수를 넘으면 failed)"""
+        with self.get_session() as session:
+            session.run("""
+                MATCH (i:DailyInput)
+                WHERE i.input_id IN $input_ids AND i.enrichment_claim = $claim
+                SET i.enrichment_status = CASE WHEN i.enrichment_attempts >= $max_attempts
+                                               THEN 'failed' ELSE 'pending' END,
+                    i.enrichment_error = $error
+                REMOVE i.enrichment_claim, i.enrichment_claimed_at
+            """, claim=claim, input_ids=input_ids, error=error[:500], max_attempts=max_attempts)
+
     def get_student_daily_inputs(
         self,
         student_id: str,
@@ -649,6 +721,64 @@ class Neo4jService:
 
             return students
 
+    # ==================== 학생/반 기록 동기화 (write-through) ====================
+
+    def sync_student_fields(
+        self,
+        student_id: str,
+        fields: Dict[str, Any],
+        embedding: Optional[List[float]] = None
+    ) -> bool:
+        """
+        학생 기록 저장 후 바뀐 필드만 Student 노드에 반영 (요약 임베딩이 있으면 함께 갱신)
+
+        Args:
+            student_id: 학생 ID
+            fields: Student 노드 속성 (prepare_for_neo4j 형식, 바뀐 것만)
+            embedding: 바뀐 요약(summary)의 임베딩 (student_embedding)
+
+        Returns:
+            노드 존재 여부
+        """
+        if not fields and embedding is None:
+            return True
+        with self.get_session() as session:
+            result = session.run("""
+                MATCH (s:Student {student_id: $student_id})
+                SET s += $fields
+                FOREACH (_ IN CASE WHEN $embedding IS NULL THEN [] ELSE [1] END |
+                    SET s.student_embedding = $embedding)
+                RETURN s.student_id AS student_id
+            """, student_id=student_id, fields=fields, embedding=embedding)
+            return result.single() is not None
+
+    def sync_class_fields(
+        self,
+        class_id: str,
+        fields: Dict[str, Any],
+        embedding: Optional[List[float]] = None
+    ) -> bool:
+        """
+        반 스케줄 저장 후 Class 노드에 반영 (임베딩이 있으면 함께 갱신)
+
+        Args:
+            class_id: 반 ID
+            fields: Class 노드 속성 (progress, homework, monthly_test, updated_at 등)
+            embedding: 스케줄 임베딩
+
+        Returns:
+            노드 존재 여부
+        """
+        with self.get_session() as session:
+            result = session.run("""
+                MATCH (c:Class {class_id: $class_id})
+                SET c += $fields
+                FOREACH (_ IN CASE WHEN $embedding IS NULL THEN [] ELSE [1] END |
+                    SET c.embedding = $embedding, c.embedding_ts = datetime())
+                RETURN c.class_id AS class_id
+            """, class_id=class_id, fields=fields, embedding=embedding)
+            return result.single() is not None
+
 # Singleton getter function
 def get_neo4j_service() -> Neo4jService:
     """Neo4j 서비스 싱글톤 인스턴스 가져오기"""
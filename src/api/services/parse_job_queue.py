@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+"""
+Parse Job Queue
+시험지 파싱 작업 큐 (SQLite 영속화)
+
+- 작업 상태는 SQLite(data/parse_jobs.db, WAL)에 저장되어 재시작 후에도 남고 여러 uvicorn 워커가 공유한다.
+- 상태: queued → processing → completed / failed / cancelled
+- 단계별(VLM 페이지, 정답 병합, ROI 저장, 업로드, 임베딩, Neo4j) 시작/종료 시각을 parse_job_stages에 기록한다.
+- 디스패처 스레드가 전체 동시 실행 수(PARSE_MAX_CONCURRENT)를 넘지 않게 queued 작업을 가져가
+  상주 워커 풀(parse_job_runner)에 제출한다. 실행 중인 작업은 리스(lease)를 주기적으로 갱신한다.
+- 리스가 만료된 작업(서버 재시작/프로세스 종료)은 다시 queued로 돌리고,
+  파싱 단계가 이미 끝났으면 DB 업로드 단계부터 재개한다.
+- 취소: queued 작업은 즉시 cancelled, processing 작업은 cancel_requested 플래그를 세우고
+  워커가 다음 진행 보고 시점에 중단한다.
+- 작업당 제한 시간(PARSE_JOB_TIMEOUT_S, 기본 파싱 1200초 + 업로드 1800초)을 넘기면 리스를 더 갱신하지 않고
+  failed로 끝낸 뒤 cancel_requested로 워커를 멈추고, 유예 시간 뒤에도 멈추지 않으면 워커 프로세스를 종료한다.
+- 워커 프로세스가 죽어 BrokenProcessPool로 끝난 작업은 다시 queued로 돌린다 (재시도 한도 내).
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from api.services.parse_job_runner import get_parse_job_runner, STAGE_MESSAGES
+from teacher.parser.job_worker import JobCancelled
+
+
+class ParseJobQueue:
+    """영속 파싱 작업 큐 (Singleton)"""
+
+    _instance = None
+
+    def __init__(self):
+        self.db_path = Path(os.getenv("PARSE_JOBS_DB", "data/parse_jobs.db"))
+        self.max_concurrent = int(os.getenv("PARSE_MAX_CONCURRENT", "2"))
+        self.max_attempts = int(os.getenv("PARSE_MAX_ATTEMPTS", "3"))
+        self.lease_s = 60.0
+        self.job_timeout_s = float(os.getenv("PARSE_JOB_TIMEOUT_S", "3000"))
+        self.dispatch_interval_s = 1.0
+
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._running: Dict[str, Future] = {}  # 이 프로세스가 실행 중인 작업
+        self._deadlines: Dict[str, float] = {}  # job_id → 제한 시각
+        self._last_progress: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+
+        self._init_db()
+
+    @classmethod
+    def get_instance(cls):
+        """싱글톤 인스턴스 반환"""
+        if cls._instance is None:
+            cls._instance = ParseJobQueue()
+        return cls._instance
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _db(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """쓰기 트랜잭션 (워커 간 직렬화)"""
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _init_db(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS parse_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    exam_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    completed_stage TEXT,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    message TEXT,
+                    files TEXT,
+                    options TEXT,
+                    results TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    owner TEXT,
+                    lease_expires_at REAL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_parse_jobs_status
+                    ON parse_jobs (status, created_at);
+                CREATE TABLE IF NOT EXISTS parse_job_stages (
+                    job_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    started_at REAL NOT NULL,
+                    finished_at REAL,
+                    PRIMARY KEY (job_id, stage)
+                );
+            """)
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        for key in ("files", "options", "results"):
+            job[key] = json.loads(job[key]) if job.get(key) else None
+        return job
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def enqueue(self, job_id: str, exam_id: str, files: Dict[str, str],
+                options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """파싱 작업 등록 (queued)"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                """INSERT INTO parse_jobs (job_id, exam_id, status, progress, message, files, options,
+                                           created_at, updated_at)
+                   VALUES (?, ?, 'queued', 0, '파싱 대기 중', ?, ?, ?, ?)""",
+                (job_id, exam_id, json.dumps(files, ensure_ascii=False),
+                 json.dumps(options or {}, ensure_ascii=False), now, now)
+            )
+        self._wake.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """작업 조회 (단계별 타임스탬프 포함)"""
+        with self._db() as conn:
+            row = conn.execute("SELECT * FROM parse_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = self._row_to_job(row)
+            job["stages"] = [
+                dict(r) for r in conn.execute(
+                    "SELECT stage, done, total, started_at, finished_at FROM parse_job_stages "
+                    "WHERE job_id = ? ORDER BY started_at", (job_id,)
+                )
+            ]
+        if job["status"] == "queued":
+            job["queue_position"] = self._queue_position(job)
+        return job
+
+    def list_jobs(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """최근 작업 목록"""
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT * FROM parse_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        작업 취소
+
+        Returns:
+            취소 후 상태 (cancelled / cancelling), 이미 끝난 작업이면 현재 상태, 없으면 None
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT status FROM parse_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row["status"] == "queued":
+                conn.execute(
+                    """UPDATE parse_jobs SET status = 'cancelled', message = '취소됨',
+                              finished_at = ?, updated_at = ? WHERE job_id = ?""",
+                    (now, now, job_id)
+                )
+                return "cancelled"
+            if row["status"] == "processing":
+                conn.execute(
+                    """UPDATE parse_jobs SET cancel_requested = 1, message = '취소 중...',
+                              updated_at = ? WHERE job_id = ?""",
+                    (now, job_id)
+                )
+                return "cancelling"
+            return row["status"]
+
+    def _queue_position(self, job: Dict[str, Any]) -> int:
+        with self._db() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM parse_jobs WHERE status = 'queued' AND created_at < ?",
+                (job["created_at"],)
+            ).fetchone()[0] + 1
+
+    # ------------------------------------------------------------------
+    # Dispatcher
+    # ------------------------------------------------------------------
+    def start(self):
+        """디스패처 스레드 시작"""
+        if self._dispatcher and self._dispatcher.is_alive():
+            return
+        self._stop.clear()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="parse-job-dispatcher", daemon=True)
+        self._dispatcher.start()
+        print(f"✅ Parse job queue started (max {self.max_concurrent} concurrent, db={self.db_path})")
+
+    def stop(self):
+        """디스패처 스레드 종료 (실행 중 작업은 리스 만료 후 다른 워커/재시작 시 재개)"""
+        self._stop.set()
+        self._wake.set()
+        if self._dispatcher:
+            self._dispatcher.join(timeout=5)
+            self._dispatcher = None
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._renew_leases()
+                self._reclaim_expired()
+                self._claim_and_submit()
+            except Exception as e:
+                print(f"⚠️  Parse job dispatch failed: {e}")
+            self._wake.wait(self.dispatch_interval_s)
+            self._wake.clear()
+
+    def _renew_leases(self):
+        now = time.time()
+        with self._lock:
+            overdue = [j for j in self._running if self._deadlines.get(j, now) < now]
+            job_ids = [j for j in self._running if j not in overdue]
+        for job_id in overdue:
+            self._expire_overdue(job_id)
+        if not job_ids:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE parse_jobs SET lease_expires_at = ? WHERE job_id = ? AND owner = ? AND status = 'processing'",
+                [(now + self.lease_s, job_id, self._owner) for job_id in job_ids]
+            )
+
+    def _expire_overdue(self, job_id: str):
+        """제한 시간을 넘긴 작업 → failed, 워커 취소 (유예 시간 뒤에도 실행 중이면 프로세스 종료)"""
+        with self._lock:
+            self._running.pop(job_id, None)
+            self._deadlines.pop(job_id, None)
+        self._last_progress.pop(job_id, None)
+        with self._transaction() as conn:
+            # 워커의 진행 보고(_reporter)가 확인하는 플래그 - 강제 종료 전에 스스로 멈출 기회
+            conn.execute("UPDATE parse_jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+        message = f"파싱 시간 초과 ({int(self.job_timeout_s)}초)"
+        self._finish(job_id, "failed", message=message, error="timeout")
+        print(f"⏰ Parse job {job_id} timed out after {int(self.job_timeout_s)}s")
+        if not get_parse_job_runner().kill_job(job_id):
+            print(f"⚠️  Worker for {job_id} not found; it keeps its pool slot until it returns")
+
+    def _requeue(self, job_id: str, reason: str):
+        """워커 프로세스가 죽은 작업 → queued (재시도 한도 초과 시 failed)"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, cancel_requested FROM parse_jobs "
+                "WHERE job_id = ? AND owner = ? AND status = 'processing'", (job_id, self._owner)
+            ).fetchone()
+            if row is None:
+                return  # 이미 끝남 (시간 초과/취소)
+            if row["cancel_requested"]:
+                status, message = "cancelled", "취소됨"
+            elif row["attempts"] >= self.max_attempts:
+                status, message = "failed", "파싱 중단 (재시도 한도 초과)"
+            else:
+                status, message = "queued", "워커 재시작 후 재개 대기 중"
+            conn.execute(
+                """UPDATE parse_jobs SET status = ?, message = ?, error = ?, owner = NULL, lease_expires_at = NULL,
+                          finished_at = CASE WHEN ? = 'queued' THEN NULL ELSE ? END, updated_at = ?
+                   WHERE job_id = ?""",
+                (status, message, reason, status, now, now, job_id)
+            )
+        print(f"♻️  Parse job {job_id} worker died → {status}")
+
+    def _reclaim_expired(self):
+        """리스가 만료된 processing 작업 → queued (재시도 한도 초과 시 failed)"""
+        now = time.time()
+        with self._transaction() as conn:
+            expired = conn.execute(
+                "SELECT job_id, attempts, cancel_requested FROM parse_jobs "
+                "WHERE status = 'processing' AND lease_expires_at < ?", (now,)
+            ).fetchall()
+            for row in expired:
+                if row["cancel_requested"]:
+                    status, message = "cancelled", "취소됨"
+                elif row["attempts"] >= self.max_attempts:
+                    status, message = "failed", "파싱 중단 (재시도 한도 초과)"
+                else:
+                    status, message = "queued", "중단된 작업 재개 대기 중"
+                conn.execute(
+                    """UPDATE parse_jobs SET status = ?, message = ?, owner = NULL, lease_expires_at = NULL,
+                              finished_at = CASE WHEN ? = 'queued' THEN NULL ELSE ? END, updated_at = ?
+                       WHERE job_id = ?""",
+                    (status, message, status, now, now, row["job_id"])
+                )
+                print(f"♻️  Parse job {row['job_id']} lease expired → {status}")
+
+    def _claim_and_submit(self):
+        runner = get_parse_job_runner()
+        with self._lock:
+            local_free = runner.max_workers - len(self._running)
+        if local_free <= 0:
+            return
+
+        now = time.time()
+        with self._transaction() as conn:
+            running = conn.execute("SELECT COUNT(*) FROM parse_jobs WHERE status = 'processing'").fetchone()[0]
+            slots = min(local_free, self.max_concurrent - running)
+            if slots <= 0:
+                return
+            rows = conn.execute(
+                "SELECT * FROM parse_jobs WHERE status = 'queued' ORDER BY created_at LIMIT ?", (slots,)
+            ).fetchall()
+            for row in rows:
+                conn.execute(
+                    """UPDATE parse_jobs SET status = 'processing', owner = ?, lease_expires_at = ?,
+                              attempts = attempts + 1, started_at = COALESCE(started_at, ?),
+                              message = '파싱 시작', updated_at = ?
+                       WHERE job_id = ?""",
+                    (self._owner, now + self.lease_s, now, now, row["job_id"])
+                )
+        for row in rows:
+            self._submit(self._row_to_job(row))
+
+    def _submit(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        options = dict(job.get("options") or {})
+        options["cancel_db"] = str(self.db_path.resolve())
+        # 파싱 단계가 이미 끝난 작업은 DB 업로드부터 재개
+        if job.get("completed_stage") == "parse":
+            options["skip_parse"] = True
+            print(f"♻️  Resuming {job_id} from ingest stage")
+
+        try:
+            future = get_parse_job_runner().submit(
+                job_id, job["exam_id"], options=options,
+                on_event=lambda event: self._on_event(job_id, event),
+            )
+        except Exception as e:
+            self._finish(job_id, "failed", message=f"파싱 오류: {str(e)}", error=str(e))
+            return
+        with self._lock:
+            self._running[job_id] = future
+            self._deadlines[job_id] = time.time() + self.job_timeout_s
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+
+    # ------------------------------------------------------------------
+    # Worker events
+    # ------------------------------------------------------------------
+    def _on_event(self, job_id: str, event: Dict[str, Any]):
+        """워커 단계 이벤트 → 단계 타임스탬프/진행률 기록"""
+        stage, done, total = event["stage"], event["done"], event["total"]
+        progress = event.get("progress")
+        # 임베딩/Neo4j처럼 레코드마다 오는 이벤트는 진행률이 바뀔 때만 기록
+        key = (stage, progress)
+        if self._last_progress.get(job_id) == key and done < total:
+            return
+        self._last_progress[job_id] = key
+
+        message = STAGE_MESSAGES.get(stage, stage)
+        if total > 1:
+            message = f"{message} ({done}/{total})"
+        at = event.get("at", time.time())
+        with self._transaction() as conn:
+            conn.execute(
+                """INSERT INTO parse_job_stages (job_id, stage, done, total, started_at, finished_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (job_id, stage) DO UPDATE SET
+                       done = excluded.done, total = excluded.total,
+                       finished_at = excluded.finished_at""",
+                (job_id, stage, done, total, at, at if done >= total else None)
+            )
+            conn.execute(
+                """UPDATE parse_jobs SET stage = ?, message = ?,
+                          progress = MAX(progress, COALESCE(?, progress)),
+                          completed_stage = CASE WHEN ? = 'saved' THEN 'parse' ELSE completed_stage END,
+                          updated_at = ?
+                   WHERE job_id = ? AND status = 'processing'""",
+                (stage, message, progress, stage, at, job_id)
+            )
+
+    def _on_done(self, job_id: str, future: Future):
+        """파싱 + DB 업로드 작업 종료 처리"""
+        with self._lock:
+            self._running.pop(job_id, None)
+            self._deadlines.pop(job_id, None)
+        self._last_progress.pop(job_id, None)
+        self._wake.set()
+
+        try:
+            results = future.result()
+        except JobCancelled:
+            self._finish(job_id, "cancelled", message="취소됨")
+            return
+        except BrokenProcessPool as e:
+            # 풀은 러너가 새로 띄움 → 재시도 (파싱이 끝났으면 업로드부터)
+            self._requeue(job_id, str(e) or "worker process died")
+            return
+        except Exception as e:
+            print(f"❌ Parse job failed ({job_id}): {e}")
+            self._finish(job_id, "failed", message=f"파싱 오류: {str(e)}", error=str(e))
+            return
+
+        ingest = results.get("ingest") or {}
+        if ingest.get("errors"):
+            message = "파싱 완료, DB 업로드 일부 실패"
+            error = f"{ingest['errors']} records failed"
+        else:
+            message, error = "파싱 및 DB 업로드 완료", None
+        self._finish(job_id, "completed", message=message, error=error, results=results)
+        print(f"✅ Parse job done ({job_id}): {results}")
+
+    def _finish(self, job_id: str, status: str, message: str,
+                error: Optional[str] = None, results: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                """UPDATE parse_jobs SET status = ?, message = ?, error = ?,
+                          results = COALESCE(?, results),
+                          progress = CASE WHEN ? = 'completed' THEN 100 ELSE progress END,
+                          completed_stage = CASE WHEN ? = 'completed' THEN 'ingest' ELSE completed_stage END,
+                          owner = NULL, lease_expires_at = NULL, finished_at = ?, updated_at = ?
+                   WHERE job_id = ? AND owner = ?""",
+                (status, message, error,
+                 json.dumps(results, ensure_ascii=False) if results is not None else None,
+                 status, status, now, now, job_id, self._owner)
+            )
+
+
+def get_parse_job_queue() -> ParseJobQueue:
+    """파싱 작업 큐 싱글톤 getter"""
+    return ParseJobQueue.get_instance()
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Parse Job Runner
+시험지 파싱/DB 업로드 작업을 상주 프로세스 풀에서 실행
+
+- 작업마다 pipeline.py / upload_problems.py를 subprocess로 띄우지 않고,
+  미리 띄워 둔 워커 프로세스(teacher.parser.job_worker)에서 바로 실행한다.
+- 워커는 파이프라인 모듈, Neo4j 드라이버, 임베딩 모델을 한 번만 로드해 재사용한다.
+- 워커가 보내는 단계별 진행 이벤트(VLM 페이지, 정답 병합, ROI 저장, 업로드, 임베딩, Neo4j 기록)를
+  리스너 스레드가 받아 작업 상태 콜백으로 전달한다.
+- 워커 프로세스가 죽으면(OOM, fitz/PIL segfault, 시간 초과로 kill_job) 풀 전체가 BrokenProcessPool이 되므로
+  풀을 버리고 (이벤트 큐도 새로 만들어) 다시 띄운다. 그때 실행 중이던 작업의 Future는 BrokenProcessPool로 끝나고
+  큐가 다시 대기열에 넣는다.
+- 시간 초과 작업은 먼저 취소 플래그로 협조적으로 멈추게 하고, 유예 시간(PARSE_KILL_GRACE_S) 뒤에도
+  끝나지 않았을 때만 워커를 강제 종료한다.
+"""
+from __future__ import annotations
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from teacher.parser import job_worker
+
+
+# 단계별 진행률 구간 (start, end) - done/total 비율로 구간 안에서 보간
+STAGE_PROGRESS = {
+    "answer_hints": (5, 5),
+    "render": (5, 5),  # VLM 요청과 겹쳐 진행되므로 진행률은 vlm_pages가 맡음
+    "vlm_pages": (5, 70),
+    "answers_merged": (72, 72),
+    "rois_saved": (78, 78),
+    "assets_uploaded": (82, 82),
+    "saved": (85, 85),
+    "embeddings": (85, 92),
+    "neo4j": (92, 99),
+}
+
+STAGE_MESSAGES = {
+    "answer_hints": "정답/해설 힌트 로드",
+    "render": "페이지 이미지 변환 중",
+    "vlm_pages": "문제 페이지 분석 중",
+    "answers_merged": "정답 병합 완료",
+    "rois_saved": "그림/표 추출 완료",
+    "assets_uploaded": "이미지 업로드 완료",
+    "saved": "파싱 완료, DB 업로드 중...",
+    "embeddings": "임베딩 생성 중",
+    "neo4j": "DB 저장 중",
+}
+
+
+def stage_progress(stage: str, done: int, total: int) -> Optional[int]:
+    """단계 이벤트 → 전체 진행률(0-100)"""
+    if stage not in STAGE_PROGRESS:
+        return None
+    start, end = STAGE_PROGRESS[stage]
+    ratio = min(1.0, done / total) if total else 1.0
+    return int(start + (end - start) * ratio)
+
+
+EventCallback = Callable[[Dict[str, Any]], None]
+
+
+class ParseJobRunner:
+    """상주 파싱 워커 풀 (Singleton)"""
+
+    _instance = None
+
+    def __init__(self):
+        self.max_workers = int(os.getenv("PARSE_WORKERS", "2"))
+        self.workdir = os.getenv("PARSE_WORKDIR", "/home/sh/projects/ClassMate")
+        self.preload_embeddings = os.getenv("PARSE_PRELOAD_EMBEDDINGS", "true").lower() == "true"
+        self.kill_grace_s = float(os.getenv("PARSE_KILL_GRACE_S", "30"))
+
+        # fork는 uvicorn 스레드/소켓 상태를 복제하므로 spawn 사용
+        self._ctx = mp.get_context("spawn")
+        self._events = self._ctx.Queue()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._callbacks: Dict[str, EventCallback] = {}
+        self._pids: Dict[str, int] = {}  # job_id → 실행 중인 워커 PID
+        self._job_pools: Dict[str, ProcessPoolExecutor] = {}  # job_id → 작업을 제출한 풀
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def get_instance(cls) -> ParseJobRunner:
+        """싱글톤 인스턴스 반환"""
+        if cls._instance is None:
+            cls._instance = ParseJobRunner()
+        return cls._instance
+
+    def start(self):
+        """워커 풀 시작 (프로세스를 미리 띄워 모델 로드)"""
+        with self._lock:
+            if self._pool is not None:
+                return
+            self._stop.clear()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self._ctx,
+                initializer=job_worker.init_worker,
+                initargs=(self.workdir, self.preload_embeddings, self._events),
+            )
+            if not (self._listener and self._listener.is_alive()):
+                self._listener = threading.Thread(target=self._listen, name="parse-job-events", daemon=True)
+                self._listener.start()
+            for _ in range(self.max_workers):
+                self._pool.submit(job_worker.warm_up)
+        print(f"✅ Parse job runner started ({self.max_workers} workers, workdir={self.workdir})")
+
+    def shutdown(self):
+        """워커 풀 종료"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        self._stop.set()
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+        if self._listener:
+            self._listener.join(timeout=2)
+            self._listener = None
+
+    def _reset_pool(self, broken: ProcessPoolExecutor):
+        """깨진 풀 교체 (여러 Future가 동시에 알려도 한 번만)"""
+        with self._lock:
+            if self._pool is not broken:
+                return
+            self._pool = None
+            # 죽은 워커가 이벤트 큐 락을 쥐고 있었을 수 있으므로 새 풀은 새 큐를 사용 (리스너는 매번 self._events를 읽음)
+            self._events = self._ctx.Queue()
+        print("♻️  Parse worker pool broken (worker died) → restarting")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def _current_pool(self) -> ProcessPoolExecutor:
+        """현재 풀 (_reset_pool이 교체하는 중이라 비어 있으면 새로 띄움)"""
+        while True:
+            with self._lock:
+                if self._pool is not None:
+                    return self._pool
+            self.start()
+
+    def kill_job(self, job_id: str) -> bool:
+        """
+        시간 초과 작업 회수 - 유예 시간 뒤에도 실행 중이면 워커 프로세스 강제 종료
+
+        호출 전에 작업의 cancel_requested 플래그를 세워 두면 워커는 다음 진행 보고 시점에 스스로 멈추고,
+        그 경우 프로세스는 건드리지 않는다. 강제 종료하면 풀을 새로 띄우고,
+        같은 풀에서 실행 중이던 다른 작업은 BrokenProcessPool로 끝나 재시도된다.
+
+        Returns:
+            회수를 예약했는지 여부 (이 러너가 실행 중인 작업이 아니면 False)
+        """
+        if job_id not in self._job_pools:
+            return False
+        timer = threading.Timer(self.kill_grace_s, self._kill_if_running, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+        return True
+
+    def _kill_if_running(self, job_id: str):
+        pid, pool = self._pids.get(job_id), self._job_pools.get(job_id)
+        if pid is None or pool is None:
+            return  # 유예 시간 안에 협조적으로 끝남 (또는 아직 시작 전 → 시작하면 취소 플래그로 멈춤)
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            return
+        print(f"🔪 Killed parse worker {pid} (job {job_id}) after {self.kill_grace_s:.0f}s grace")
+        self._reset_pool(pool)
+
+    def submit(
+        self,
+        job_id: str,
+        exam_id: str,
+        options: Optional[Dict[str, Any]] = None,
+        on_event: Optional[EventCallback] = None,
+    ) -> Future:
+        """
+        파싱 + DB 업로드 작업 제출
+
+        Args:
+            job_id: 작업 ID
+            exam_id: 시험 ID (input/<exam_id>/ 에서 파일을 읽음)
+            options: job_worker.run_parse_job 옵션
+            on_event: 단계 이벤트 콜백 ({"stage", "done", "total", "message", "progress"})
+
+        Returns:
+            결과 dict를 돌려주는 Future
+        """
+        if on_event:
+            with self._lock:
+                self._callbacks[job_id] = on_event
+        pool = self._current_pool()
+        try:
+            future = pool.submit(job_worker.run_parse_job, job_id, exam_id, options or {})
+        except BrokenProcessPool:
+            self._reset_pool(pool)
+            pool = self._current_pool()
+            future = pool.submit(job_worker.run_parse_job, job_id, exam_id, options or {})
+        self._job_pools[job_id] = pool
+
+        def _done(f: Future):
+            self._callbacks.pop(job_id, None)
+            self._pids.pop(job_id, None)
+            self._job_pools.pop(job_id, None)
+            if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool):
+                self._reset_pool(pool)
+
+        future.add_done_callback(_done)
+        return future
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                event = self._events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if event.get("stage") == job_worker.WORKER_STARTED:
+                self._pids[event["job_id"]] = event["pid"]
+                continue
+            callback = self._callbacks.get(event.get("job_id"))
+            if not callback:
+                continue
+            event["progress"] = stage_progress(event["stage"], event["done"], event["total"])
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️  Parse job event handler failed: {e}")
+
+
+def get_parse_job_runner() -> ParseJobRunner:
+    """파싱 작업 러너 싱글톤 getter"""
+    return ParseJobRunner.get_instance()
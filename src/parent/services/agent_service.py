@@ -9,7 +9,6 @@ import json
 import re
 import random
 from typing import List, Dict, Any, Optional
-from openai import OpenAI
 from shared.services import (
     get_graph_rag_service,
     get_dictionary_service,
@@ -19,7 +18,12 @@ from shared.services import (
 )
 from shared.services.youtube_service import get_youtube_service
 from shared.prompts import PromptManager
+from shared.services.llm_client import get_llm_client
+from shared.services.model_escalation import ModelEscalator
 from shared.services.tts_service import get_tts_service
+from shared.services.problem_pool_service import get_problem_pool, DEFAULT_TOPICS, POOL_SESSION_ID
+from shared.services.score_history_store import get_score_history_store
+from shared.services.speaker_voice_service import get_speaker_voice_service
 
 
 # ANSI 색상 코드
@@ -76,7 +80,8 @@ class ParentAgentService:
     def __init__(self):
         """초기화"""
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=self.openai_api_key)
+        self.client = get_llm_client(api_key=self.openai_api_key)
+        self.escalator = ModelEscalator(self.client)
         self.graph_rag_service = get_graph_rag_service()
 
         # Current user message for vector search context
@@ -593,18 +598,20 @@ Respond with ONLY "intelligence" or "reasoning".'''
                 use_vector_search=True
             )
 
+            # 점수 시계열 저장소에서 최근 추이와 반 내 백분위 계산 (최근 90일)
+            try:
+                trend = get_score_history_store().describe_trend(student_id, area=focus_area, days=90)
+            except Exception as e:
+                print(f"⚠️ Score trend lookup failed: {e}")
+                trend = "점수 추이 기록을 불러오지 못했습니다."
+
             # 성적 분석 리포트 생성
             analysis = f"""**성적 분석 리포트**
 
 {context}
 
-**또래 비교 분석:**
-- 같은 반 학생들과 비교하여 상위권/중위권/하위권 파악
-- 영역별 강약점 분석
-
-**개선 추이:**
-- 최근 학습 활동 기록을 바탕으로 성장 가능성 예측
-- 꾸준한 학습이 필요한 영역 식별
+**또래 비교 및 개선 추이:**
+{trend}
 """
             return analysis
 
@@ -767,18 +774,8 @@ Respond with ONLY "intelligence" or "reasoning".'''
             return f"개선 계획 생성 실패: {str(e)}"
 
     def _generate_problem(self, student_id: str, area: str, difficulty: str = None, topic: str = None, num_speakers: int = 2) -> str:
-        """AI 문제 생성 실행 (o4-mini - 빠른 추론 모델)"""
+        """AI 문제 생성 실행 (문제 풀 우선, 없으면 o4-mini 동기 생성)"""
         try:
-            # topic이 없으면 다양한 주제 중 랜덤 선택
-            if not topic:
-                topics = [
-                    "레스토랑 예약", "영화관 방문", "도서관 이용", "쇼핑", "병원 예약",
-                    "여행 계획", "운동", "취미 활동", "학교 생활", "친구 모임",
-                    "가족 행사", "휴가 계획", "봉사활동", "동아리 활동", "파티 준비"
-                ]
-                topic = random.choice(topics)
-                print(f"📌 자동 선택된 주제: {topic}")
-
             # difficulty가 지정되지 않았으면 학생의 CEFR 레벨 조회
             if not difficulty:
                 try:
@@ -802,18 +799,76 @@ Respond with ONLY "intelligence" or "reasoning".'''
                     print(f"⚠️  CEFR 레벨 조회 실패: {e}, 기본값 B1 사용")
                     difficulty = "B1"
 
-            # PromptManager를 사용해 문제 생성 프롬프트 가져오기
-            prompt = PromptManager.get_problem_generation_prompt(
-                area=area,
-                difficulty=difficulty,
-                topic=topic,
-                num_speakers=num_speakers,
-                model="o4-mini"
-            )
+            content = None
+
+            # 미리 생성된 문제 풀에서 먼저 찾기 (듣기는 기본 2인 대화만 풀에 있음)
+            if num_speakers == 2:
+                try:
+                    content = get_problem_pool().take(area, difficulty, topic, student_id, self.current_session_id)
+                except Exception as e:
+                    print(f"⚠️  문제 풀 조회 실패: {e}")
+
+            if not content:
+                content = self.generate_problem_content(
+                    area=area,
+                    difficulty=difficulty,
+                    topic=topic,
+                    num_speakers=num_speakers,
+                    session_id=self.current_session_id
+                )
+
+            # 학부모용 지도 가이드 추가 (듣기)
+            if area.lower() in ['듣기', 'listening', 'ls']:
+                content = self._add_parent_guidance(content, difficulty, topic or "일상생활")
+
+            return content
+
+        except Exception as e:
+            return f"문제 생성 실패: {str(e)}"
+
+    def generate_problem_content(
+        self,
+        area: str,
+        difficulty: str,
+        topic: str = None,
+        num_speakers: int = 2,
+        session_id: Optional[str] = None,
+        client=None
+    ) -> str:
+        """
+        o4-mini로 문제 동기 생성 (문제 풀 보충 워커도 사용)
+
+        Args:
+            area: 문제 영역
+            difficulty: CEFR 레벨
+            topic: 주제 (없으면 랜덤)
+            num_speakers: 듣기 화자 수
+            session_id: 듣기 오디오 추적용 세션 ID
+            client: LLM 클라이언트 (기본 self.client)
+
+        Returns:
+            문제 본문 (실패 시 예외)
+        """
+        client = client or self.client
+
+        # topic이 없으면 다양한 주제 중 랜덤 선택
+        if not topic:
+            topic = random.choice(DEFAULT_TOPICS)
+            print(f"📌 자동 선택된 주제: {topic}")
+
+        # PromptManager를 사용해 문제 생성 프롬프트 가져오기
+        prompt = PromptManager.get_problem_generation_prompt(
+            area=area,
+            difficulty=difficulty,
+            topic=topic,
+            num_speakers=num_speakers,
+            model="o4-mini"
+        )
 
-            is_listening = area.lower() in ['듣기', 'listening', 'ls']
-            print(f"🎯 문제 생성: area={area}, difficulty={difficulty}, topic={topic}, num_speakers={num_speakers}, is_listening={is_listening}")
+        is_listening = area.lower() in ['듣기', 'listening', 'ls']
+        print(f"🎯 문제 생성: area={area}, difficulty={difficulty}, topic={topic}, num_speakers={num_speakers}, is_listening={is_listening}")
 
+        try:
             # 듣기 문제는 최대 2회 재시도
             max_attempts = 2 if is_listening else 1
 
@@ -822,7 +877,7 @@ Respond with ONLY "intelligence" or "reasoning".'''
                     # o4-mini - o3-mini 후속, 빠른 속도 + 우수한 STEM 성능
                     # NOTE: o4-mini uses reasoning tokens + output tokens, so we need more tokens for listening problems
                     max_tokens = 10000 if is_listening else 3000
-                    response = self.client.chat.completions.create(
+                    response = client.chat.completions.create(
                         model="o4-mini",
                         messages=[{"role": "user", "content": prompt}],
                         max_completion_tokens=max_tokens
@@ -835,9 +890,7 @@ Respond with ONLY "intelligence" or "reasoning".'''
 
                     # 듣기 문제 후처리
                     if is_listening:
-                        content = self._postprocess_listening_problem(content, attempt + 1)
-                        # 학부모용 지도 가이드 추가
-                        content = self._add_parent_guidance(content, difficulty, topic)
+                        content = self._postprocess_listening_problem(content, attempt + 1, session_id=session_id)
 
                     return content
 
@@ -850,7 +903,7 @@ Respond with ONLY "intelligence" or "reasoning".'''
         except Exception as e:
             # Fallback to GPT-4o (빠르고 안정적)
             try:
-                response = self.client.chat.completions.create(
+                response = client.chat.completions.create(
                     model="gpt-4o",
                     messages=[
                         {"role": "system", "content": "You are an expert English language teacher creating high-quality assessment questions."},
@@ -864,16 +917,14 @@ Respond with ONLY "intelligence" or "reasoning".'''
 
                 # 듣기 문제 후처리
                 if is_listening:
-                    content = self._postprocess_listening_problem(content, attempt=1)
-                    # 학부모용 지도 가이드 추가
-                    content = self._add_parent_guidance(content, difficulty, topic)
+                    content = self._postprocess_listening_problem(content, attempt=1, session_id=session_id)
 
                 return content
 
             except Exception as fallback_error:
-                return f"문제 생성 실패: {str(e)}, Fallback 실패: {str(fallback_error)}"
+                raise RuntimeError(f"{str(e)}, Fallback 실패: {str(fallback_error)}") from fallback_error
 
-    def _postprocess_listening_problem(self, content: str, attempt: int) -> str:
+    def _postprocess_listening_problem(self, content: str, attempt: int, session_id: Optional[str] = None) -> str:
         """
         듣기 문제 후처리 (강제 검증 및 수정)
 
@@ -929,7 +980,7 @@ Respond with ONLY "intelligence" or "reasoning".'''
                 # Check if ANY speaker is missing voice field
                 if speakers_list and not all('voice' in s for s in speakers_list):
                     needs_voice_enhancement = True
-                    print(f"   ⚠️  [SPEAKERS]: voice 필드 없음 → o4-mini로 추가 예정")
+                    print(f"   ⚠️  [SPEAKERS]: voice 필드 없음 → 추가 예정")
             except:
                 pass
 
@@ -996,73 +1047,11 @@ Respond with ONLY "intelligence" or "reasoning".'''
                 unique_speakers.insert(0, second_name)  # Add as first speaker
                 print(f"   ℹ️  화자 1명만 감지 → 두 번째 화자 추가: {second_name}")
 
-            # Use LLM to determine gender and voice for each speaker
-            # Build a prompt for the LLM
-            speaker_names = ", ".join(unique_speakers)
-            llm_prompt = f"""Given these speaker names: {speaker_names}
-
-For EACH speaker, determine:
-1. Gender (male or female)
-2. US English voice name - IMPORTANT: Assign DIFFERENT voices to DIFFERENT speakers!
-
-Available voices:
-- Female voices: Samantha, Karen, Victoria
-- Male voices: David, Daniel, Mark
-
-CRITICAL RULES:
-- If you have 2 speakers, they MUST use DIFFERENT voice names
-- Never assign the same voice to multiple speakers in one conversation
-- Example (CORRECT): Speaker1 uses Samantha, Speaker2 uses David
-- Example (WRONG): Speaker1 uses Samantha, Speaker2 uses Samantha
-
-Respond with ONLY valid JSON:
-{{
-  "speakers": [
-    {{"name": "Name1", "gender": "female", "voice": "Samantha"}},
-    {{"name": "Name2", "gender": "male", "voice": "David"}}
-  ]
-}}"""
-
-            try:
-                # Call LLM to determine speakers (o4-mini - 추론 모델)
-                llm_response = self.client.chat.completions.create(
-                    model="o4-mini",  # Reasoning model for speaker analysis
-                    messages=[{"role": "user", "content": llm_prompt}],
-                    max_completion_tokens=300
-                )
-
-                # o4-mini doesn't support JSON mode, parse from text
-                content_llm = llm_response.choices[0].message.content
-                # Extract JSON from response (handle markdown code blocks)
-                json_match = re.search(r'\{.*\}', content_llm, re.DOTALL)
-                if json_match:
-                    speakers_json = json.loads(json_match.group(0))
-                else:
-                    speakers_json = json.loads(content_llm)
-
-                print(f"   ✅ o4-mini가 화자 정보 생성: {speakers_json}")
-
-            except Exception as e:
-                print(f"   ⚠️  LLM 호출 실패, fallback to rules: {e}")
-                # Fallback to rule-based
-                female_names = {'sarah', 'emma', 'lisa', 'maria', 'anna', 'kate', 'jane', 'mary', 'lucy', 'emily'}
-                male_names = {'tom', 'john', 'mike', 'david', 'james', 'robert', 'mark', 'peter', 'kevin', 'alex', 'jake'}
-
-                speakers_json = {"speakers": []}
-                for name in unique_speakers:
-                    name_lower = name.lower()
-                    if name_lower in female_names:
-                        gender = "female"
-                        voice = "Samantha"
-                    elif name_lower in male_names:
-                        gender = "male"
-                        voice = "David"
-                    else:
-                        # Default: alternate male/female
-                        gender = "female" if len(speakers_json["speakers"]) % 2 == 0 else "male"
-                        voice = "Samantha" if gender == "female" else "David"
-
-                    speakers_json["speakers"].append({"name": name, "gender": gender, "voice": voice})
+            # 이름별 고정 성별/음성 (처음 보는 이름만 LLM 판단)
+            speakers_json = {
+                "speakers": get_speaker_voice_service().assign(unique_speakers, client=self.client)
+            }
+            print(f"   ✅ 화자 정보 결정: {speakers_json}")
 
             # Insert or Replace [SPEAKERS]: line
             speakers_line = f"[SPEAKERS]: {json.dumps(speakers_json)}"
@@ -1139,7 +1128,12 @@ Respond with ONLY valid JSON:
             try:
                 print(f"   🎙️  OpenAI TTS 음성 생성 중...")
                 tts_service = get_tts_service()
-                audio_url = tts_service.get_or_create_audio(result, session_id=self.current_session_id)
+                # 학생이 기다리는 요청은 스트리밍 URL로 바로 재생, 문제 풀 보충은 완성된 정적 파일로
+                audio_url = tts_service.get_or_create_audio(
+                    result,
+                    session_id=session_id or self.current_session_id,
+                    progressive=(session_id != POOL_SESSION_ID)
+                )
 
                 if audio_url:
                     # Add audio URL to the beginning of the problem (for frontend to use)
@@ -1753,37 +1747,21 @@ Respond with ONLY valid JSON:
                 # Function 결과를 바탕으로 최종 응답 생성
                 # Use the same model as primary for consistency
                 if primary_model == "o4-mini":
-                    final_response = self.client.chat.completions.create(
-                        model="o4-mini",
-                        messages=messages,
-                        max_completion_tokens=10000
+                    # Step 4: o4-mini + 품질 검사, 지연 예산 안에서 o3 hedge / gpt-4.1-mini 강등
+                    response_content, primary_model, escalation_models = self.escalator.complete(
+                        messages,
+                        primary_model="o4-mini",
+                        accept=self._check_response_quality,
+                        deadline=self.escalator.deadline()  # 예산은 라우팅/도구 실행이 끝난 뒤부터
                     )
+                    used_models.extend(escalation_models)
                 else:
                     final_response = self.client.chat.completions.create(
                         model="gpt-4.1-mini",
                         messages=messages,
                         temperature=0.7
                     )
-
-                response_content = final_response.choices[0].message.content
-
-                # Step 4: Quality check for o4-mini responses
-                if primary_model == "o4-mini" and not self._check_response_quality(response_content):
-                    print(f"⚠️  o4-mini response quality low, falling back to o3...")
-                    used_models.append("o3")
-
-                    # Retry with o3 (advanced reasoning)
-                    try:
-                        final_response_o3 = self.client.chat.completions.create(
-                            model="o3",
-                            messages=messages,
-                            max_completion_tokens=10000
-                        )
-                        response_content = final_response_o3.choices[0].message.content
-                        primary_model = "o3"  # Update primary model
-                        print(f"✅ o3 response generated successfully")
-                    except Exception as e:
-                        print(f"⚠️  o3 fallback failed: {e}, using o4-mini response anyway")
+                    response_content = final_response.choices[0].message.content
 
                 return {
                     "message": response_content,
@@ -1798,21 +1776,15 @@ Respond with ONLY valid JSON:
 
                 # Step 4: Quality check for o4-mini responses (no function calls)
                 if primary_model == "o4-mini" and not self._check_response_quality(response_content):
-                    print(f"⚠️  o4-mini response quality low, falling back to o3...")
-                    used_models.append("o3")
-
-                    # Retry with o3 (advanced reasoning)
-                    try:
-                        final_response_o3 = self.client.chat.completions.create(
-                            model="o3",
-                            messages=messages,
-                            max_completion_tokens=10000
-                        )
-                        response_content = final_response_o3.choices[0].message.content
-                        primary_model = "o3"  # Update primary model
-                        print(f"✅ o3 response generated successfully")
-                    except Exception as e:
-                        print(f"⚠️  o3 fallback failed: {e}, using o4-mini response anyway")
+                    print(f"⚠️  o4-mini response quality low, escalating to o3...")
+                    response_content, primary_model, escalation_models = self.escalator.escalate(
+                        messages,
+                        rejected_content=response_content,
+                        rejected_model="o4-mini",
+                        accept=self._check_response_quality,
+                        deadline=self.escalator.deadline()  # 예산은 라우팅/도구 실행이 끝난 뒤부터
+                    )
+                    used_models.extend(escalation_models)
 
                 return {
                     "message": response_content,
@@ -396,6 +396,10 @@ class PromptManager:
                 "4. **Student Details** - '민준이 정보 알려줘', 'S-01 학생 상세'",
                 "   → Use `get_student_details`",
                 "",
+                "5. **Score Trends** - '최근 한 달 독해 추이', 'S-01 문법 점수 변화', 'C-01반 성적 추이'",
+                "   → Use `get_score_trend` with student_id or class_id",
+                "   → Parse area (독해/문법/어휘/듣기/쓰기) and period in weeks (한 달 → 4)",
+                "",
                 "**Response Formatting:**",
                 "1. Use relevant emojis (📊 데이터, 👨‍🎓 학생, 📝 기록, 🎯 목표, 📈 성과, ⚠️ 주의)",
                 "2. Present data in structured format (tables, bullet points)",
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Audio Mixer
+듣기 문제 오디오 믹싱 (PCM + NumPy)
+
+TTS에서 raw PCM(24kHz, 16-bit, mono)을 받아 게인, 무음 삽입, 효과음 반복/오버레이를
+미리 할당한 버퍼 위에서 벡터 연산으로 처리하고, 마지막에 ffmpeg로 한 번만 MP3 인코딩한다.
+효과음은 프로세스당 한 번만 디코딩해 메모리에 보관한다.
+
+StreamingMixer + start_mp3_encoder는 같은 믹싱을 발화 단위로 이어 붙이며
+MP3 프레임을 바로 내보내는 점진적(progressive) 재생용이다.
+"""
+from __future__ import annotations
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# OpenAI TTS response_format="pcm" 규격
+SAMPLE_RATE = 24000
+SAMPLE_DTYPE = np.int16
+
+FFMPEG_BIN = shutil.which("ffmpeg")
+MIXER_AVAILABLE = FFMPEG_BIN is not None
+
+
+def db_to_gain(db: float) -> float:
+    return float(10 ** (db / 20.0))
+
+
+def ms_to_samples(ms: int) -> int:
+    return int(SAMPLE_RATE * ms / 1000)
+
+
+def pcm_to_array(data: bytes) -> np.ndarray:
+    """raw PCM bytes → int16 배열 (복사 없음)"""
+    usable = len(data) - (len(data) % 2)
+    return np.frombuffer(data[:usable], dtype="<i2")
+
+
+_effect_cache: Dict[str, np.ndarray] = {}
+_effect_lock = threading.Lock()
+
+
+def load_effect(path: Path) -> Optional[np.ndarray]:
+    """효과음 파일을 24kHz mono float32로 디코딩 (프로세스당 1회, 이후 메모리 캐시)"""
+    key = str(path)
+    with _effect_lock:
+        if key in _effect_cache:
+            return _effect_cache[key]
+    if not MIXER_AVAILABLE or not path.exists():
+        return None
+    result = subprocess.run(
+        [FFMPEG_BIN, "-v", "error", "-i", key,
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+        capture_output=True, check=True
+    )
+    samples = pcm_to_array(result.stdout).astype(np.float32)
+    with _effect_lock:
+        _effect_cache[key] = samples
+    return samples
+
+
+def layout_dialogue(segment_lengths: List[int], lead_ms: int = 500, gap_ms: int = 300) -> List[int]:
+    """각 발화의 시작 위치(샘플) 계산, 마지막 원소는 전체 길이"""
+    offsets = []
+    pos = ms_to_samples(lead_ms)
+    gap = ms_to_samples(gap_ms)
+    for length in segment_lengths:
+        offsets.append(pos)
+        pos += length + gap
+    offsets.append(pos)
+    return offsets
+
+
+def mix_dialogue(
+    segments: List[np.ndarray],
+    effect: Optional[np.ndarray] = None,
+    lead_ms: int = 500,
+    gap_ms: int = 300,
+    line_gain_db: float = 6.0,
+    effect_gain_db: float = -15.0,
+    master_gain_db: float = 3.0,
+) -> np.ndarray:
+    """
+    발화 세그먼트를 하나의 트랙으로 믹싱
+
+    Args:
+        segments: 발화별 int16 PCM 배열 (대화 순서)
+        effect: 배경 효과음 float32 배열 (대화 길이에 맞춰 반복)
+        lead_ms: 시작 무음
+        gap_ms: 발화 사이 무음
+        line_gain_db: 발화 볼륨 보정
+        effect_gain_db: 효과음 볼륨 보정
+        master_gain_db: 전체 볼륨 보정
+
+    Returns:
+        int16 PCM 배열
+    """
+    offsets = layout_dialogue([len(s) for s in segments], lead_ms, gap_ms)
+    total = offsets[-1]
+    buffer = np.zeros(total, dtype=np.float32)
+
+    line_gain = db_to_gain(line_gain_db)
+    for seg, start in zip(segments, offsets):
+        np.multiply(seg, line_gain, out=buffer[start:start + len(seg)], casting="unsafe")
+
+    if effect is not None and len(effect):
+        # np.resize는 부족한 길이를 원본 반복으로 채움 (효과음 루프)
+        buffer += np.resize(effect, total) * db_to_gain(effect_gain_db)
+
+    buffer *= db_to_gain(master_gain_db)
+    np.clip(buffer, -32768, 32767, out=buffer)
+    return buffer.astype(SAMPLE_DTYPE)
+
+
+def encode_mp3(samples: np.ndarray, output_path: Path, bitrate: str = "192k"):
+    """PCM 배열을 MP3 파일로 한 번에 인코딩"""
+    if not MIXER_AVAILABLE:
+        raise RuntimeError("ffmpeg not available")
+    subprocess.run(
+        [FFMPEG_BIN, "-v", "error", "-y",
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-i", "pipe:0",
+         "-b:a", bitrate, "-f", "mp3", str(output_path)],
+        input=samples.astype("<i2").tobytes(), check=True, capture_output=True
+    )
+
+
+class StreamingMixer:
+    """
+    발화가 준비되는 순서대로 믹싱 (mix_dialogue와 같은 결과를 조각 단위로 생성)
+
+    효과음은 전체 트랙 기준 위치(position)로 반복하므로 조각을 이어 붙여도 끊기지 않는다.
+    """
+
+    def __init__(
+        self,
+        effect: Optional[np.ndarray] = None,
+        gap_ms: int = 300,
+        line_gain_db: float = 6.0,
+        effect_gain_db: float = -15.0,
+        master_gain_db: float = 3.0,
+    ):
+        self.effect = effect if effect is not None and len(effect) else None
+        self.gap = ms_to_samples(gap_ms)
+        self.line_gain = db_to_gain(line_gain_db)
+        self.effect_gain = db_to_gain(effect_gain_db)
+        self.master_gain = db_to_gain(master_gain_db)
+        self.position = 0
+
+    def silence(self, ms: int) -> np.ndarray:
+        """무음 구간 (효과음은 계속 깔림)"""
+        return self._finish(np.zeros(ms_to_samples(ms), dtype=np.float32))
+
+    def add(self, segment: np.ndarray) -> np.ndarray:
+        """발화 하나 + 뒤따르는 간격"""
+        buffer = np.zeros(len(segment) + self.gap, dtype=np.float32)
+        np.multiply(segment, self.line_gain, out=buffer[:len(segment)], casting="unsafe")
+        return self._finish(buffer)
+
+    def _finish(self, buffer: np.ndarray) -> np.ndarray:
+        if self.effect is not None:
+            idx = np.arange(self.position, self.position + len(buffer)) % len(self.effect)
+            buffer += self.effect[idx] * self.effect_gain
+        self.position += len(buffer)
+        buffer *= self.master_gain
+        np.clip(buffer, -32768, 32767, out=buffer)
+        return buffer.astype(SAMPLE_DTYPE)
+
+
+def start_mp3_encoder(output_file, bitrate: str = "192k") -> subprocess.Popen:
+    """
+    PCM을 stdin으로 받아 MP3 프레임을 바로 output_file에 기록하는 ffmpeg 프로세스
+
+    Args:
+        output_file: 쓰기 모드로 연 파일 객체 (프레임 단위로 flush)
+    """
+    if not MIXER_AVAILABLE:
+        raise RuntimeError("ffmpeg not available")
+    return subprocess.Popen(
+        [FFMPEG_BIN, "-v", "error", "-y",
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-i", "pipe:0",
+         "-b:a", bitrate, "-write_xing", "0", "-flush_packets", "1", "-f", "mp3", "pipe:1"],
+        stdin=subprocess.PIPE, stdout=output_file, stderr=subprocess.DEVNULL
+    )
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+"""
+LLM Client Layer
+OpenAI 호출 공용 계층 (모델별 동시성 제한, RPM/TPM 토큰 버킷, 재시도, 타임아웃, 서킷 브레이커)
+
+학생/학부모/선생님 에이전트, 시험지 파서, TTS 모두 이 계층을 통해 호출한다.
+OpenAI 클라이언트와 동일한 인터페이스(chat.completions.create, responses.create,
+audio.speech.create, with_options)를 제공하므로 기존 호출부는 그대로 동작한다.
+
+제한값은 프로세스 단위이며, 조직 한도에 맞춰 LLM_MODEL_LIMITS(JSON)로 재정의한다.
+    LLM_MODEL_LIMITS='{"o3": {"rpm": 500, "tpm": 300000, "concurrency": 4}}'
+"""
+from __future__ import annotations
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import openai
+from openai import OpenAI
+
+
+# 재시도 대상 오류 (429, 타임아웃, 연결 오류, 5xx)
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+LANE_INTERACTIVE = "interactive"  # 채팅, TTS (사용자 대기 중)
+LANE_BATCH = "batch"              # 시험지 파싱, 매핑, 요약 등 백그라운드 작업
+
+
+@dataclass
+class ModelLimits:
+    """모델별 호출 제한"""
+    concurrency: int = 8
+    rpm: Optional[int] = None          # requests per minute
+    tpm: Optional[int] = None          # tokens per minute
+    timeout_s: float = 120.0
+    max_retries: int = 4
+    batch_share: float = 0.5           # batch lane이 쓸 수 있는 동시성 비율
+    fallbacks: List[str] = field(default_factory=list)
+
+
+# 기본 제한 (Tier 3 조직 한도 기준, 프로세스당)
+DEFAULT_LIMITS: Dict[str, ModelLimits] = {
+    "o3": ModelLimits(concurrency=6, rpm=5000, tpm=800_000, timeout_s=600.0, fallbacks=["o4-mini"]),
+    "o4-mini": ModelLimits(concurrency=12, rpm=5000, tpm=4_000_000, timeout_s=300.0, fallbacks=["gpt-4.1-mini"]),
+    "gpt-4.1-mini": ModelLimits(concurrency=16, rpm=5000, tpm=4_000_000, timeout_s=60.0, fallbacks=["gpt-4o-mini"]),
+    "gpt-4o": ModelLimits(concurrency=8, rpm=5000, tpm=800_000, timeout_s=120.0, fallbacks=["gpt-4.1-mini"]),
+    "gpt-4o-mini": ModelLimits(concurrency=16, rpm=5000, tpm=4_000_000, timeout_s=60.0, fallbacks=["gpt-4.1-mini"]),
+    "tts-1": ModelLimits(concurrency=8, rpm=500, timeout_s=60.0),
+}
+
+
+def _load_limits() -> Dict[str, ModelLimits]:
+    """기본 제한 + LLM_MODEL_LIMITS 환경변수 재정의"""
+    limits = dict(DEFAULT_LIMITS)
+    raw = os.getenv("LLM_MODEL_LIMITS")
+    if raw:
+        try:
+            for model, overrides in json.loads(raw).items():
+                limits[model] = replace(limits.get(model, ModelLimits()), **overrides)
+        except Exception as e:
+            print(f"⚠️  Invalid LLM_MODEL_LIMITS ignored: {e}")
+    return limits
+
+
+def _is_reasoning_model(model: str) -> bool:
+    return model.startswith("o")
+
+
+class TokenBucket:
+    """분당 한도를 초당 충전량으로 환산한 토큰 버킷"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float):
+        """amount만큼 토큰이 찰 때까지 대기 (용량보다 큰 요청은 용량으로 제한)"""
+        amount = min(amount, self.capacity)
+        with self._cond:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                self._cond.wait((amount - self.tokens) / self.rate)
+
+    def refund(self, amount: float):
+        """추정치보다 적게 사용한 토큰 반환"""
+        if amount <= 0:
+            return
+        with self._cond:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+            self._cond.notify_all()
+
+
+class CircuitOpenError(Exception):
+    """서킷 브레이커가 열려 호출을 거부함"""
+
+
+class DeadlineExceededError(Exception):
+    """with_options(deadline=...) 시각이 지나 더 이상 시도하지 않음"""
+
+
+class CircuitBreaker:
+    """연속 실패 시 일정 시간 호출 차단 (closed → open → half_open)"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0,
+                 half_open_timeout_s: float = 120.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.half_open_timeout_s = half_open_timeout_s  # 시험 호출 결과가 이 시간 안에 안 오면 다시 open
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "half_open" and now - self.probe_at >= self.half_open_timeout_s:
+                self.state = "open"  # 시험 호출이 결과 없이 끝남 → 다시 대기 후 재시험
+                self.opened_at = now
+            if self.state == "open":
+                if now - self.opened_at < self.reset_timeout_s:
+                    return False
+                self.state = "half_open"  # 시험 호출 1회 허용
+                self.probe_at = now
+                return True
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class ModelGate:
+    """모델 하나의 동시성/속도 제한 및 메트릭"""
+
+    def __init__(self, model: str, limits: ModelLimits):
+        self.model = model
+        self.limits = limits
+        self.semaphore = threading.BoundedSemaphore(limits.concurrency)
+        self.batch_semaphore = threading.BoundedSemaphore(
+            max(1, int(limits.concurrency * limits.batch_share))
+        )
+        self.rpm_bucket = TokenBucket(limits.rpm) if limits.rpm else None
+        self.tpm_bucket = TokenBucket(limits.tpm) if limits.tpm else None
+        self.breaker = CircuitBreaker()
+
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        self.requests = 0
+        self.successes = 0
+        self.retries = 0
+        self.errors: Dict[str, int] = {}
+        self.queue_wait_total_s = 0.0
+        self.queue_wait_max_s = 0.0
+
+    def _count(self, attr: str, delta: int = 1):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + delta)
+
+    def _record_error(self, err: Exception):
+        with self._lock:
+            name = type(err).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def run(self, fn: Callable[[], Any], est_tokens: int, lane: str,
+            deadline: Optional[float] = None) -> Any:
+        """제한을 지키며 fn 실행 (재시도 포함, deadline(time.monotonic 기준)을 넘기는 재시도는 하지 않음)"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"circuit open for {self.model}")
+
+        lane_sem = self.batch_semaphore if lane == LANE_BATCH else None
+        start = time.monotonic()
+        self._count("queued")
+        if lane_sem:
+            lane_sem.acquire()
+        self.semaphore.acquire()
+        try:
+            if self.rpm_bucket:
+                self.rpm_bucket.acquire(1)
+            if self.tpm_bucket:
+                self.tpm_bucket.acquire(est_tokens)
+            waited = time.monotonic() - start
+            with self._lock:
+                self.queued -= 1
+                self.in_flight += 1
+                self.requests += 1
+                self.queue_wait_total_s += waited
+                self.queue_wait_max_s = max(self.queue_wait_max_s, waited)
+
+            try:
+                for attempt in range(self.limits.max_retries + 1):
+                    try:
+                        response = fn()
+                    except RETRYABLE_ERRORS as e:
+                        self._record_error(e)
+                        # 차단기는 run() 1회당 실패 1건만 기록 (재시도를 다 쓰거나, half_open 시험 호출이거나,
+                        # 다른 호출이 이미 열었으면 포기)
+                        delay = self._backoff(attempt, e)
+                        past_deadline = deadline is not None and time.monotonic() + delay >= deadline
+                        if attempt == self.limits.max_retries or self.breaker.state != "closed" or past_deadline:
+                            self.breaker.record_failure()
+                            raise
+                        self._count("retries")
+                        time.sleep(delay)
+                        continue
+                    except Exception as e:
+                        self._record_error(e)
+                        # 재시도 대상이 아닌 오류(400, 검증 오류 등)는 모델이 응답한 것 → 시험 호출이면 닫음
+                        self.breaker.record_success()
+                        raise
+
+                    self.breaker.record_success()
+                    self._count("successes")
+                    self._refund_tokens(response, est_tokens)
+                    return response
+            finally:
+                self._count("in_flight", -1)
+        finally:
+            self.semaphore.release()
+            if lane_sem:
+                lane_sem.release()
+
+    def _backoff(self, attempt: int, err: Exception) -> float:
+        """지수 백오프 + full jitter (Retry-After 헤더가 있으면 우선)"""
+        response = getattr(err, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, 0.5)
+            except ValueError:
+                pass
+        return random.uniform(0, min(30.0, 0.5 * (2 ** attempt)))
+
+    def _refund_tokens(self, response: Any, est_tokens: int):
+        usage = getattr(response, "usage", None)
+        total = getattr(usage, "total_tokens", None) if usage is not None else None
+        if self.tpm_bucket and isinstance(total, int):
+            self.tpm_bucket.refund(est_tokens - total)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            failed = sum(self.errors.values())
+            attempts = self.successes + failed
+            return {
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "requests": self.requests,
+                "successes": self.successes,
+                "retries": self.retries,
+                "errors": dict(self.errors),
+                "error_rate": round(failed / attempts, 4) if attempts else 0.0,
+                "queue_wait_avg_ms": round(1000 * self.queue_wait_total_s / self.requests, 1) if self.requests else 0.0,
+                "queue_wait_max_ms": round(1000 * self.queue_wait_max_s, 1),
+                "circuit": self.breaker.state,
+            }
+
+
+class _Registry:
+    """프로세스 전역 모델 게이트 및 원본 OpenAI 클라이언트 보관"""
+
+    def __init__(self):
+        self.limits = _load_limits()
+        self.gates: Dict[str, ModelGate] = {}
+        self.raw_clients: Dict[Optional[str], OpenAI] = {}
+        self.fallbacks_used = 0
+        self._lock = threading.Lock()
+
+    def gate(self, model: str) -> ModelGate:
+        with self._lock:
+            if model not in self.gates:
+                self.gates[model] = ModelGate(model, self.limits.get(model, ModelLimits()))
+            return self.gates[model]
+
+    def raw_client(self, api_key: Optional[str]) -> OpenAI:
+        key = api_key or os.getenv("OPENAI_API_KEY")
+        with self._lock:
+            if key not in self.raw_clients:
+                # 재시도는 이 계층에서 처리하므로 SDK 자체 재시도는 끔
+                self.raw_clients[key] = OpenAI(api_key=key, max_retries=0)
+            return self.raw_clients[key]
+
+
+_registry: Optional[_Registry] = None
+_registry_lock = threading.Lock()
+
+
+def _get_registry() -> _Registry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = _Registry()
+    return _registry
+
+
+def _estimate_tokens(kind: str, kwargs: Dict[str, Any]) -> int:
+    """TPM 버킷용 토큰 추정 (입력 글자수/4 + 최대 출력 토큰, OpenAI 한도 계산 방식과 동일)"""
+    if kind == "speech":
+        return len(kwargs.get("input", "")) // 4 + 1
+    payload = kwargs.get("messages") if kind == "chat" else kwargs.get("input")
+    text_chars = 0
+    images = 0
+    for part in payload if isinstance(payload, list) else [payload]:
+        content = part.get("content") if isinstance(part, dict) else getattr(part, "content", part)
+        if isinstance(content, list):
+            for c in content:
+                if isinstance(c, dict) and c.get("type") in ("input_image", "image_url"):
+                    images += 1
+                else:
+                    text_chars += len(str(c.get("text", "")) if isinstance(c, dict) else str(c))
+        else:
+            text_chars += len(str(content or ""))
+    max_out = (
+        kwargs.get("max_completion_tokens")
+        or kwargs.get("max_output_tokens")
+        or kwargs.get("max_tokens")
+        or 1000
+    )
+    return text_chars // 4 + images * 1000 + int(max_out)
+
+
+def _adapt_kwargs(kind: str, kwargs: Dict[str, Any], model: str) -> Dict[str, Any]:
+    """fallback 모델에 맞게 파라미터 조정 (reasoning 모델은 temperature/max_tokens 미지원)"""
+    adapted = dict(kwargs, model=model)
+    if _is_reasoning_model(model):
+        adapted.pop("temperature", None)
+        if kind == "chat" and "max_tokens" in adapted:
+            adapted["max_completion_tokens"] = adapted.pop("max_tokens")
+    return adapted
+
+
+class LLMClient:
+    """OpenAI 호환 인터페이스의 제한 적용 클라이언트"""
+
+    def __init__(self, api_key: Optional[str] = None, lane: str = LANE_INTERACTIVE,
+                 timeout: Optional[float] = None, deadline: Optional[float] = None):
+        self.api_key = api_key
+        self.lane = lane
+        self.timeout = timeout
+        self.deadline = deadline  # time.monotonic() 기준 절대 시각 (재시도/fallback 포함 전체 제한)
+        self.last_model: Optional[str] = None  # 마지막 성공 호출에 실제로 응답한 모델 (fallback 여부 확인용)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **kw: self._execute("chat", kw)
+        ))
+        self.responses = SimpleNamespace(create=lambda **kw: self._execute("responses", kw))
+        self.audio = SimpleNamespace(speech=SimpleNamespace(
+            create=lambda **kw: self._execute("speech", kw)
+        ))
+
+    def with_options(self, timeout: Optional[float] = None, deadline: Optional[float] = None) -> "LLMClient":
+        """요청 타임아웃(시도 1회)/마감 시각(전체)을 바꾼 사본 (게이트/메트릭은 공유)"""
+        return LLMClient(
+            self.api_key, self.lane,
+            timeout if timeout is not None else self.timeout,
+            deadline if deadline is not None else self.deadline,
+        )
+
+    def _call_kwargs(self, kwargs: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """시도 1회의 타임아웃을 마감까지 남은 시간으로 제한"""
+        if self.deadline is not None:
+            timeout = max(1.0, min(timeout, self.deadline - time.monotonic()))
+        return dict(kwargs, timeout=timeout)
+
+    def _endpoint(self, kind: str) -> Callable[..., Any]:
+        raw = _get_registry().raw_client(self.api_key)
+        if kind == "chat":
+            return raw.chat.completions.create
+        if kind == "responses":
+            return raw.responses.create
+        return raw.audio.speech.create
+
+    def _execute(self, kind: str, kwargs: Dict[str, Any]) -> Any:
+        registry = _get_registry()
+        requested = kwargs["model"]
+        candidates = [requested] + (
+            registry.gate(requested).limits.fallbacks if kind != "speech" else []
+        )
+        est_tokens = _estimate_tokens(kind, kwargs)
+        endpoint = self._endpoint(kind)
+
+        last_error: Optional[Exception] = None
+        for model in candidates:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise last_error or DeadlineExceededError(f"deadline passed before calling {model}")
+            gate = registry.gate(model)
+            call_kwargs = kwargs if model == requested else _adapt_kwargs(kind, kwargs, model)
+            timeout = self.timeout or gate.limits.timeout_s
+            try:
+                if model != requested:
+                    with registry._lock:
+                        registry.fallbacks_used += 1
+                    print(f"🔀 LLM fallback: {requested} → {model} ({last_error})")
+                response = gate.run(
+                    lambda: endpoint(**self._call_kwargs(call_kwargs, timeout)),
+                    est_tokens, self.lane, deadline=self.deadline,
+                )
+                self.last_model = model
+                return response
+            except (CircuitOpenError,) + RETRYABLE_ERRORS as e:
+                last_error = e
+                continue
+        raise last_error  # type: ignore[misc]
+
+
+def get_llm_client(lane: str = LANE_INTERACTIVE, api_key: Optional[str] = None) -> LLMClient:
+    """공용 LLM 클라이언트 (게이트는 프로세스 전역에서 공유)"""
+    return LLMClient(api_key=api_key, lane=lane)
+
+
+def get_llm_metrics() -> Dict[str, Any]:
+    """모델별 대기 시간, 처리 중 호출 수, 오류율 등"""
+    registry = _get_registry()
+    with registry._lock:
+        gates = dict(registry.gates)
+        fallbacks_used = registry.fallbacks_used
+    return {
+        "models": {model: gate.snapshot() for model, gate in gates.items()},
+        "fallbacks_used": fallbacks_used,
+    }
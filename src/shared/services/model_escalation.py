@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Model Escalation Service
+지연 예산(latency budget) 기반 o4-mini → o3 승급 및 gpt-4.1-mini 강등
+"""
+from __future__ import annotations
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# 추측 실행(hedge)용 공용 스레드 풀
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="model-escalation")
+
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+@dataclass
+class EscalationPolicy:
+    """
+    승급 정책
+
+    - budget_s: 요청당 지연 예산 (None 또는 0이면 기존 직렬 o3 fallback)
+    - hedge_delay_s: 1차 모델이 이 시간 안에 끝나지 않으면 승급 모델을 동시에 시작
+    - degrade_reserve_s: 마감까지 남은 시간이 이보다 적으면 강등 모델로 응답
+    """
+    budget_s: Optional[float] = 40.0
+    hedge_delay_s: float = 12.0
+    degrade_reserve_s: float = 8.0
+    escalation_model: str = "o3"
+    degrade_model: str = "gpt-4.1-mini"
+
+    @classmethod
+    def from_env(cls) -> "EscalationPolicy":
+        """환경변수에서 정책 로드"""
+        budget = _env_float("AGENT_LATENCY_BUDGET_S", cls.budget_s)
+        return cls(
+            budget_s=budget if budget and budget > 0 else None,
+            hedge_delay_s=_env_float("AGENT_HEDGE_DELAY_S", cls.hedge_delay_s),
+            degrade_reserve_s=_env_float("AGENT_DEGRADE_RESERVE_S", cls.degrade_reserve_s),
+            escalation_model=os.getenv("AGENT_ESCALATION_MODEL", cls.escalation_model),
+            degrade_model=os.getenv("AGENT_DEGRADE_MODEL", cls.degrade_model),
+        )
+
+
+class ModelEscalator:
+    """
+    품질 검사에 실패한 응답을 상위 모델로 승급
+
+    예산이 있으면 승급 모델을 hedge_delay 후 추측 실행하고, 먼저 통과한 응답을 채택한다.
+    마감이 임박하면 빠른 강등 모델로 응답을 확보한다. 마감까지 쓸 만한 응답이 없으면
+    오류 대신 먼저 도착하는 응답을 기다린다 (모두 실패하면 마감 없이 강등 모델을 한 번 더 호출).
+    """
+
+    def __init__(self, client, policy: Optional[EscalationPolicy] = None):
+        self.client = client
+        self.policy = policy or EscalationPolicy.from_env()
+
+    def deadline(self) -> Optional[float]:
+        """현재 시점 기준 마감 시각 (time.monotonic 기준, 예산 없으면 None)"""
+        if not self.policy.budget_s:
+            return None
+        return time.monotonic() + self.policy.budget_s
+
+    @staticmethod
+    def completion_kwargs(model: str) -> Dict[str, Any]:
+        """모델별 생성 파라미터 (reasoning 모델은 max_completion_tokens)"""
+        if model.startswith("o"):
+            return {"max_completion_tokens": 10000}
+        return {"temperature": 0.7}
+
+    def _call(self, model: str, messages: List[Dict[str, Any]], deadline: Optional[float]) -> str:
+        """단일 모델 호출 (마감이 있으면 클라이언트의 재시도/fallback까지 마감 안으로 제한)"""
+        client = self.client
+        if deadline is not None:
+            client = client.with_options(deadline=deadline)
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            **self.completion_kwargs(model)
+        )
+        return response.choices[0].message.content or ""
+
+    def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        primary_model: str,
+        accept: Callable[[str], bool],
+        deadline: Optional[float] = None
+    ) -> Tuple[str, str, List[str]]:
+        """
+        1차 모델로 응답 생성, 필요 시 승급/강등
+
+        Returns:
+            (response_content, answered_model, used_models)
+        """
+        return self._race(messages, accept, deadline, primary_model=primary_model)
+
+    def escalate(
+        self,
+        messages: List[Dict[str, Any]],
+        rejected_content: str,
+        rejected_model: str,
+        accept: Callable[[str], bool],
+        deadline: Optional[float] = None
+    ) -> Tuple[str, str, List[str]]:
+        """
+        이미 품질 검사에 실패한 응답을 승급
+
+        Returns:
+            (response_content, answered_model, used_models)
+        """
+        return self._race(
+            messages, accept, deadline,
+            fallback=(rejected_content, rejected_model)
+        )
+
+    def _race(
+        self,
+        messages: List[Dict[str, Any]],
+        accept: Callable[[str], bool],
+        deadline: Optional[float],
+        primary_model: Optional[str] = None,
+        fallback: Optional[Tuple[str, str]] = None
+    ) -> Tuple[str, str, List[str]]:
+        policy = self.policy
+        futures: Dict[Future, str] = {}
+        used_models: List[str] = []
+
+        def launch(model: str, call_deadline: Optional[float] = deadline):
+            used_models.append(model)
+            futures[_executor.submit(self._call, model, messages, call_deadline)] = model
+
+        start = time.monotonic()
+        if primary_model:
+            launch(primary_model)
+            # 예산이 없으면 추측 실행하지 않고 1차 결과를 기다림
+            hedge_at = start + policy.hedge_delay_s if deadline is not None else None
+        else:
+            hedge_at = start
+
+        degrade_at = deadline - policy.degrade_reserve_s if deadline is not None else None
+        escalated = False
+        degraded = False
+        overtime = False     # 마감이 지났지만 응답이 없어 첫 응답을 기다리는 중
+        last_resort = False  # 모두 실패해 마감 없이 강등 모델을 호출함
+        best = fallback
+
+        try:
+            while True:
+                now = time.monotonic()
+
+                if not overtime and not escalated and hedge_at is not None and now >= hedge_at:
+                    escalated = True
+                    if degrade_at is None or now < degrade_at:
+                        print(f"⏱️  Escalation: starting {policy.escalation_model} "
+                              f"({now - start:.1f}s elapsed)")
+                        launch(policy.escalation_model)
+
+                if not overtime and degrade_at is not None and not degraded and now >= degrade_at:
+                    degraded = True
+                    print(f"⏱️  Deadline at risk: degrading to {policy.degrade_model}")
+                    launch(policy.degrade_model)
+
+                if not futures:
+                    if not overtime and not escalated and hedge_at is not None:
+                        # 1차 응답이 실패했고 아직 승급 전이면 즉시 승급
+                        hedge_at = now
+                        continue
+                    if best is None and not last_resort:
+                        last_resort = overtime = True
+                        print(f"⏱️  All models failed: retrying {policy.degrade_model} without deadline")
+                        launch(policy.degrade_model, None)
+                        continue
+                    break
+
+                wake_at = [] if overtime else [t for t in (
+                    hedge_at if not escalated else None,
+                    degrade_at if not degraded else None,
+                    deadline
+                ) if t is not None]
+                timeout = max(min(wake_at) - now, 0.0) if wake_at else None
+
+                done, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    model = futures.pop(future)
+                    try:
+                        content = future.result()
+                    except Exception as e:
+                        print(f"⚠️  {model} call failed: {e}")
+                        if model == primary_model and not escalated:
+                            hedge_at = time.monotonic()
+                        continue
+
+                    if accept(content) or (content and (model == policy.degrade_model or overtime)):
+                        print(f"✅ {model} response accepted ({time.monotonic() - start:.1f}s)")
+                        return content, model, used_models
+
+                    print(f"⚠️  {model} response quality low")
+                    if best is None or model != primary_model:
+                        best = (content, model)
+                    if model == primary_model and not escalated:
+                        hedge_at = time.monotonic()
+
+                if not overtime and deadline is not None and time.monotonic() >= deadline:
+                    print(f"⏱️  Latency budget exhausted ({policy.budget_s:.0f}s)")
+                    if best is not None:
+                        break
+                    overtime = True  # 오류 대신 진행 중인 호출의 첫 응답을 기다림
+        finally:
+            # 남은 호출은 취소 (이미 실행 중인 호출은 클라이언트 마감으로 종료됨)
+            for future in futures:
+                future.cancel()
+
+        if best is None:
+            raise RuntimeError("No model produced a response")
+        return best[0], best[1], used_models
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+Problem Pool Service
+미리 생성한 문제 풀 (영역, CEFR, 주제별) + 백그라운드 보충 워커
+
+- 풀은 SQLite(data/problem_pool.db)에 저장되어 재시작 후에도 유지된다.
+- 같은 문제는 한 학생에게 두 번 제공하지 않으며, 최대 max_serves명에게만 제공한다.
+- 남은 문제가 low_water 미만이면 워커가 high_water까지 보충한다.
+- 보충 대상은 영역×레벨 기본 키와, 최근 요청된 키 중 최근 순 max_topic_targets개뿐이다
+  (자유 입력 주제는 정규화해서 같은 주제가 여러 키로 갈라지지 않게 한다).
+- 듣기 문제는 생성 시 TTS 오디오까지 미리 렌더링된다. 오디오는 만료되지 않는 풀 세션에 묶여 있으므로
+  소진된 문제를 정리할 때 그 문제의 오디오 참조를 직접 해제한다. 제공할 때는 먼저 학생 세션에도
+  참조를 걸어 두어, 마지막 제공 직후 정리되어도 학생이 받은 파일은 세션 TTL까지 남는다.
+- PROBLEM_POOL_ENABLED=true일 때만 동작한다 (기본 꺼짐, take()는 바로 None).
+"""
+from __future__ import annotations
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+
+# 주제 미지정 시 사용하는 기본 주제
+DEFAULT_TOPICS = [
+    "레스토랑 예약", "영화관 방문", "도서관 이용", "쇼핑", "병원 예약",
+    "여행 계획", "운동", "취미 활동", "학교 생활", "친구 모임",
+    "가족 행사", "휴가 계획", "봉사활동", "동아리 활동", "파티 준비"
+]
+
+AREAS = ["듣기", "독해", "문법", "어휘", "쓰기"]
+
+_AREA_ALIASES = {
+    "듣기": "듣기", "listening": "듣기", "ls": "듣기",
+    "독해": "독해", "reading": "독해", "rd": "독해",
+    "문법": "문법", "grammar": "문법", "gr": "문법",
+    "어휘": "어휘", "vocabulary": "어휘", "vo": "어휘",
+    "쓰기": "쓰기", "writing": "쓰기", "wr": "쓰기",
+}
+
+# 풀에서 미리 생성한 듣기 오디오를 추적하는 세션 ID
+POOL_SESSION_ID = "problem_pool"
+
+ANY_TOPIC = ""
+
+_AUDIO_URL_RE = re.compile(r"^\[AUDIO_URL\]:\s*(\S+)", re.MULTILINE)
+
+
+def normalize_area(area: str) -> Optional[str]:
+    """영역 이름을 한글 표준명으로 변환 (알 수 없으면 None)"""
+    return _AREA_ALIASES.get((area or "").strip().lower())
+
+
+def normalize_topic(topic: Optional[str], max_len: int = 40) -> str:
+    """주제 키 정규화 (공백 정리, 소문자, 길이 제한, 없으면 ANY_TOPIC)"""
+    return " ".join((topic or "").split()).lower()[:max_len]
+
+
+class ProblemPoolService:
+    """문제 풀 관리 (Singleton)"""
+
+    _instance = None
+
+    def __init__(self):
+        self.db_path = Path(os.getenv("PROBLEM_POOL_DB", "data/problem_pool.db"))
+        self.low_water = int(os.getenv("PROBLEM_POOL_LOW_WATER", "3"))
+        self.high_water = int(os.getenv("PROBLEM_POOL_HIGH_WATER", "6"))
+        self.max_serves = int(os.getenv("PROBLEM_POOL_MAX_SERVES", "3"))
+        self.levels = [
+            lv.strip().upper()
+            for lv in os.getenv("PROBLEM_POOL_LEVELS", "A2,B1,B2").split(",") if lv.strip()
+        ]
+        self.target_ttl_s = 7 * 24 * 3600  # 요청된 주제 키는 7일간 유지
+        self.max_topic_targets = int(os.getenv("PROBLEM_POOL_MAX_TOPIC_TARGETS", "10"))
+        self.enabled = os.getenv("PROBLEM_POOL_ENABLED", "false").lower() == "true"
+
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._generator: Optional[Callable[..., str]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+        self._init_db()
+
+    @classmethod
+    def get_instance(cls) -> ProblemPoolService:
+        """싱글톤 인스턴스 반환"""
+        if cls._instance is None:
+            cls._instance = ProblemPoolService()
+        return cls._instance
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextmanager
+    def _db(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS problems (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    area TEXT NOT NULL,
+                    cefr TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    serve_count INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_problems_key
+                    ON problems (area, cefr, topic, serve_count);
+                CREATE TABLE IF NOT EXISTS served (
+                    problem_id INTEGER NOT NULL,
+                    student_id TEXT NOT NULL,
+                    served_at REAL NOT NULL,
+                    PRIMARY KEY (problem_id, student_id)
+                );
+                CREATE TABLE IF NOT EXISTS targets (
+                    area TEXT NOT NULL,
+                    cefr TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    requested_at REAL NOT NULL,
+                    PRIMARY KEY (area, cefr, topic)
+                );
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+            """)
+
+    @staticmethod
+    def _topic_clause(topic: str) -> Tuple[str, tuple]:
+        if topic == ANY_TOPIC:
+            return "", ()
+        return " AND topic = ?", (topic,)
+
+    def available(self, area: str, cefr: str, topic: str = ANY_TOPIC) -> int:
+        """제공 가능한 문제 수"""
+        clause, params = self._topic_clause(topic)
+        with self._db() as conn:
+            row = conn.execute(
+                f"SELECT COUNT(*) FROM problems WHERE area = ? AND cefr = ?{clause} AND serve_count < ?",
+                (area, cefr, *params, self.max_serves)
+            ).fetchone()
+        return row[0]
+
+    def put(self, area: str, cefr: str, topic: str, content: str):
+        """풀에 문제 추가"""
+        with self._db() as conn:
+            conn.execute(
+                "INSERT INTO problems (area, cefr, topic, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (area, cefr, topic, content, time.time())
+            )
+
+    def take(self, area: str, cefr: str, topic: Optional[str], student_id: str,
+             session_id: Optional[str] = None) -> Optional[str]:
+        """
+        풀에서 문제 하나 꺼내기 (학생별 중복 제공 방지)
+
+        Args:
+            area: 문제 영역 (듣기, 독해, ...)
+            cefr: CEFR 레벨
+            topic: 주제 (None이면 아무 주제)
+            student_id: 학생 ID
+            session_id: 오디오를 연결할 세션 (없으면 학생별 세션, TTL 후 만료)
+
+        Returns:
+            문제 본문, 없으면 None (호출부에서 동기 생성, 풀이 꺼져 있어도 None)
+        """
+        if not self.enabled:
+            return None
+        area = normalize_area(area)
+        if not area:
+            return None
+        cefr = (cefr or "").upper()
+        topic = normalize_topic(topic)
+        clause, params = self._topic_clause(topic)
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO targets (area, cefr, topic, requested_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (area, cefr, topic) DO UPDATE SET requested_at = excluded.requested_at",
+                (area, cefr, topic, time.time())
+            )
+            row = conn.execute(
+                f"""SELECT id, content FROM problems p
+                    WHERE area = ? AND cefr = ?{clause} AND serve_count < ?
+                      AND NOT EXISTS (
+                          SELECT 1 FROM served s WHERE s.problem_id = p.id AND s.student_id = ?
+                      )
+                    ORDER BY serve_count, created_at
+                    LIMIT 1""",
+                (area, cefr, *params, self.max_serves, student_id)
+            ).fetchone()
+            if row:
+                # 풀 참조가 정리되기 전에(serve_count 반영 전) 학생 세션 참조부터 기록
+                self._track_served_audio(row[1], session_id or f"pool-serve-{student_id}")
+                conn.execute("UPDATE problems SET serve_count = serve_count + 1 WHERE id = ?", (row[0],))
+                conn.execute(
+                    "INSERT OR IGNORE INTO served (problem_id, student_id, served_at) VALUES (?, ?, ?)",
+                    (row[0], student_id, time.time())
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        # 풀이 줄었으니 워커에 보충 신호
+        self._wake.set()
+
+        if row:
+            print(f"⚡ 문제 풀 제공: area={area}, cefr={cefr}, topic={topic or '*'}, id={row[0]}")
+            return row[1]
+        print(f"🫙 문제 풀 비어 있음: area={area}, cefr={cefr}, topic={topic or '*'} → 동기 생성")
+        return None
+
+    def _targets(self) -> List[Tuple[str, str, str]]:
+        """보충 대상 키 (기본 영역×레벨 + 최근 요청된 키 max_topic_targets개)"""
+        keys = {(area, level, ANY_TOPIC) for area in AREAS for level in self.levels}
+        with self._db() as conn:
+            conn.execute("DELETE FROM targets WHERE requested_at < ?", (time.time() - self.target_ttl_s,))
+            keys.update(conn.execute(
+                "SELECT area, cefr, topic FROM targets ORDER BY requested_at DESC LIMIT ?",
+                (self.max_topic_targets,)
+            ).fetchall())
+        return sorted(keys)
+
+    def _prune(self):
+        """모두 소진된 문제 정리 (듣기 오디오 참조도 해제)"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, content FROM problems WHERE serve_count >= ?", (self.max_serves,)
+            ).fetchall()
+            conn.execute("DELETE FROM served WHERE problem_id IN "
+                         "(SELECT id FROM problems WHERE serve_count >= ?)", (self.max_serves,))
+            conn.execute("DELETE FROM problems WHERE serve_count >= ?", (self.max_serves,))
+            # 같은 오디오를 쓰는 문제가 풀에 남아 있으면 참조 유지
+            urls = {
+                m.group(1) for _, content in rows for m in [_AUDIO_URL_RE.search(content)] if m
+            }
+            urls = [
+                url for url in urls
+                if not conn.execute("SELECT 1 FROM problems WHERE instr(content, ?) > 0 LIMIT 1", (url,)).fetchone()
+            ]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        if urls:
+            self._release_audio(urls)
+
+    @staticmethod
+    def _track_served_audio(content: str, session_id: str):
+        """제공하는 듣기 문제의 오디오를 학생 세션에 연결 (즉시 기록, 다른 프로세스의 정리보다 먼저)"""
+        match = _AUDIO_URL_RE.search(content)
+        if not match:
+            return
+        try:
+            from api.services.audio_session_service import AudioSessionService
+            from shared.services.tts_service import get_tts_service
+        except ImportError:
+            return
+        audio_sessions = AudioSessionService.get_instance()
+        audio_sessions.track_audio(session_id, str(get_tts_service().audio_path(match.group(1))))
+        audio_sessions.flush()
+
+    @staticmethod
+    def _release_audio(urls: List[str]):
+        """정리한 듣기 문제의 오디오를 풀 세션에서 해제 (다른 세션이 안 쓰면 파일 삭제)"""
+        try:
+            from api.services.audio_session_service import AudioSessionService
+            from shared.services.tts_service import get_tts_service
+        except ImportError:
+            return
+        tts = get_tts_service()
+        paths = [str(tts.audio_path(url)) for url in urls]
+        deleted = AudioSessionService.get_instance().release_audio(POOL_SESSION_ID, paths)
+        print(f"🧹 문제 풀 오디오 해제: {len(paths)}개 (삭제 {deleted}개)")
+
+    # ------------------------------------------------------------------
+    # Background replenishment
+    # ------------------------------------------------------------------
+    def _acquire_lease(self, ttl_s: float = 120.0) -> bool:
+        """여러 uvicorn 워커 중 하나만 보충하도록 임대(lease) 획득"""
+        now = time.time()
+        with self._db() as conn:
+            cur = conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES ('replenish', ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                (self._owner, now + ttl_s, now)
+            )
+            return cur.rowcount > 0
+
+    def start_worker(self, generator: Callable[..., str], interval_s: float = 30.0):
+        """
+        보충 워커 시작
+
+        Args:
+            generator: generator(area=, difficulty=, topic=, session_id=) -> 문제 본문
+            interval_s: 보충 주기 (take 호출 시 즉시 깨어남)
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._generator = generator
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._worker_loop, args=(interval_s,), name="problem-pool", daemon=True
+        )
+        self._thread.start()
+        print(f"✅ Problem pool worker started (levels={self.levels}, low={self.low_water}, high={self.high_water})")
+
+    def stop_worker(self):
+        """보충 워커 종료"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _worker_loop(self, interval_s: float):
+        while not self._stop.is_set():
+            try:
+                if self._acquire_lease():
+                    self._prune()
+                    self.replenish_once()
+            except Exception as e:
+                print(f"⚠️  Problem pool replenish failed: {e}")
+            self._wake.wait(interval_s)
+            self._wake.clear()
+
+    def replenish_once(self) -> int:
+        """low_water 미만인 키를 high_water까지 채움 (생성한 문제 수 반환)"""
+        generated = 0
+        for area, cefr, topic in self._targets():
+            if self._stop.is_set():
+                break
+            count = self.available(area, cefr, topic)
+            if count >= self.low_water:
+                continue
+            for _ in range(self.high_water - count):
+                if self._stop.is_set() or not self._acquire_lease():
+                    return generated
+                chosen_topic = topic or random.choice(DEFAULT_TOPICS)
+                try:
+                    content = self._generator(
+                        area=area, difficulty=cefr, topic=chosen_topic, session_id=POOL_SESSION_ID
+                    )
+                except Exception as e:
+                    print(f"⚠️  Problem pool generation failed ({area}/{cefr}/{chosen_topic}): {e}")
+                    break
+                if not content:
+                    break
+                self.put(area, cefr, chosen_topic, content)
+                generated += 1
+                count += 1
+                print(f"🧺 문제 풀 보충: area={area}, cefr={cefr}, topic={chosen_topic} "
+                      f"({count}/{self.high_water})")
+        return generated
+
+
+def get_problem_pool() -> ProblemPoolService:
+    """문제 풀 싱글톤 getter"""
+    return ProblemPoolService.get_instance()
@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+"""
+Roster Store
+학생/선생님/반 공용 조회·저장 계층
+
+- 학생(students_rag.json)과 반(class.json)은 SQLite(data/roster.db, WAL)에 레코드 단위 JSON으로 저장한다.
+  수정은 레코드 하나만 읽고 쓰는 짧은 BEGIN IMMEDIATE 트랜잭션이라, 동시에 저장해도
+  갱신이 유실되거나 파일이 깨지지 않고, 명단 크기와 무관하게 한 레코드만 기록한다.
+- 조회는 메모리 인덱스(student_id, class_id, teacher_id, 반→학생)에서 O(1)로 처리한다.
+  다른 프로세스(uvicorn 워커)의 커밋은 PRAGMA data_version으로 감지해 바뀐 레코드(seq 증가분)만 다시 읽는다.
+- 원본 JSON 파일은 스냅샷으로 유지한다: 처음 실행 시(또는 JSON이 외부에서 수정되면) DB로 가져오고
+  (JSON에서 빠진 학생/반은 DB에서도 삭제하고 roster_tombstones에 남겨 다른 프로세스 캐시에서도 지운다),
+  저장 후에는 백그라운드에서 모아서(ROSTER_EXPORT_DELAY_S) 원자적으로 다시 써서 오프라인 스크립트가 그대로 읽을 수 있다.
+- teachers.json은 읽기 전용이라 파일 인덱스(mtime 변경 시 재로딩)로만 보관한다.
+
+반환되는 dict는 캐시와 공유되므로 호출부에서 직접 수정하지 말 것 (수정은 update_student/update_class).
+"""
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+ROSTER_DATA_DIR = os.getenv("ROSTER_DATA_DIR", "/home/sh/projects/ClassMate/data/json")
+ROSTER_DB = os.getenv("ROSTER_DB", "data/roster.db")
+ROSTER_EXPORT_DELAY_S = float(os.getenv("ROSTER_EXPORT_DELAY_S", "2"))  # 음수면 JSON 스냅샷 저장 안 함
+
+
+def student_record(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """students_rag.json 항목 → 원본데이터"""
+    return entry.get("원본데이터", {})
+
+
+def _file_stamp(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class _JsonTable:
+    """JSON 배열 파일 하나 + ID 인덱스 (mtime 변경 시 재로딩, 읽기 전용)"""
+
+    def __init__(self, path: Path, key: Callable[[Dict[str, Any]], Optional[str]]):
+        self.path = path
+        self._key = key
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, int]] = None
+        self.rows: List[Dict[str, Any]] = []
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.loads = 0
+
+    def fresh(self) -> "_JsonTable":
+        """최신 상태 보장 (변경 없으면 stat 한 번)"""
+        stamp = _file_stamp(self.path)
+        if stamp == self._stamp:
+            return self
+        with self._lock:
+            stamp = _file_stamp(self.path)
+            if stamp != self._stamp:
+                rows: List[Dict[str, Any]] = []
+                if stamp is not None:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        rows = json.load(f)
+                by_id = {rid: row for row in rows if (rid := self._key(row)) is not None}
+                # 인덱스를 다 만든 뒤 한 번에 교체 (조회 중인 다른 스레드는 이전 버전을 계속 사용)
+                self.rows, self.by_id, self._stamp = rows, by_id, stamp
+                self.loads += 1
+                print(f"📇 Roster loaded: {self.path.name} ({len(rows)} rows)")
+        return self
+
+
+class _RecordTable:
+    """
+    SQLite 레코드 테이블 하나의 메모리 인덱스 (kind = "student" | "class")
+
+    roster_records(kind, id, group_id, ord, body, version, seq, updated_at)
+    - body: 레코드 JSON, group_id: 반→학생 인덱스용 class_id, ord: JSON 파일 내 순서
+    - version: 레코드별 수정 횟수 (낙관적 갱신용), seq: DB 전체 단조 증가 번호 (증분 재로딩용)
+    roster_tombstones(kind, id, seq): JSON에서 빠져 삭제된 레코드 (증분 재로딩 시 캐시에서 제거)
+    """
+
+    def __init__(self, store: "RosterStore", kind: str, json_path: Path,
+                 key: Callable[[Dict[str, Any]], Optional[str]],
+                 group: Callable[[Dict[str, Any]], Optional[str]]):
+        self.store = store
+        self.kind = kind
+        self.json_path = json_path
+        self.key = key
+        self._group = group
+        self._lock = threading.Lock()
+        self._max_seq = 0
+        self._json_checked: Optional[Tuple[int, int]] = None
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.versions: Dict[str, int] = {}
+        self.order: Dict[str, int] = {}
+        self.rows: List[Dict[str, Any]] = []
+        self.by_group: Dict[str, List[Dict[str, Any]]] = {}
+        self.loads = 0
+
+    @property
+    def meta_key(self) -> str:
+        return f"{self.kind}_json_stamp"
+
+    # ---------- JSON 스냅샷 ↔ DB ----------
+
+    def _import_json_if_changed(self) -> None:
+        """JSON 파일이 마지막 가져오기/내보내기 이후 (외부에서) 바뀌었으면 DB로 가져오기"""
+        stamp = _file_stamp(self.json_path)
+        if stamp is None or stamp == self._json_checked:
+            return
+        changed = 0
+        with self.store._transaction() as conn:
+            row = conn.execute("SELECT value FROM roster_meta WHERE key = ?", (self.meta_key,)).fetchone()
+            if not (row and tuple(json.loads(row["value"])) == stamp):
+                with open(self.json_path, "r", encoding="utf-8") as f:
+                    rows = json.load(f)
+                existing = {
+                    r["id"]: r["body"]
+                    for r in conn.execute("SELECT id, body FROM roster_records WHERE kind = ?", (self.kind,))
+                }
+                seen = set()
+                for ord_, rec in enumerate(rows):
+                    rid = self.key(rec)
+                    if rid is None:
+                        continue
+                    seen.add(rid)
+                    body = json.dumps(rec, ensure_ascii=False)
+                    if existing.get(rid) == body:
+                        conn.execute("UPDATE roster_records SET ord = ? WHERE kind = ? AND id = ?",
+                                     (ord_, self.kind, rid))
+                        continue
+                    conn.execute("""
+                        INSERT INTO roster_records (kind, id, group_id, ord, body, version, seq, updated_at)
+                        VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+                        ON CONFLICT (kind, id) DO UPDATE SET
+                            group_id = excluded.group_id, ord = excluded.ord, body = excluded.body,
+                            version = roster_records.version + 1, seq = excluded.seq,
+                            updated_at = excluded.updated_at
+                    """, (self.kind, rid, self._group(rec), ord_, body, self.store._next_seq(conn), time.time()))
+                    changed += 1
+                # JSON에서 빠진 레코드 삭제 (삭제 표시는 seq로 다른 프로세스에 전파)
+                for rid in existing.keys() - seen:
+                    conn.execute("DELETE FROM roster_records WHERE kind = ? AND id = ?", (self.kind, rid))
+                    conn.execute("INSERT OR REPLACE INTO roster_tombstones (kind, id, seq) VALUES (?, ?, ?)",
+                                 (self.kind, rid, self.store._next_seq(conn)))
+                    changed += 1
+                conn.execute("INSERT OR REPLACE INTO roster_meta (key, value) VALUES (?, ?)",
+                             (self.meta_key, json.dumps(stamp)))
+        self._json_checked = stamp
+        if changed:
+            print(f"📥 Roster imported: {self.json_path.name} → {self.store.db_path.name} ({changed} records)")
+
+    def export_json(self) -> None:
+        """
+        DB → JSON 스냅샷 (임시 파일 + rename)
+        쓰기 트랜잭션 안에서 기록해, 스냅샷과 stamp 사이에 끼어든 저장이 다시 가져오기로 덮이지 않게 한다.
+        """
+        self.json_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.store._transaction() as conn:
+            rows = [json.loads(r["body"]) for r in conn.execute(
+                "SELECT body FROM roster_records WHERE kind = ? ORDER BY ord, id", (self.kind,)
+            )]
+            tmp = self.json_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.json_path)
+            stamp = _file_stamp(self.json_path)
+            conn.execute("INSERT OR REPLACE INTO roster_meta (key, value) VALUES (?, ?)",
+                         (self.meta_key, json.dumps(stamp)))
+        self._json_checked = stamp
+
+    # ---------- 캐시 ----------
+
+    def fresh(self) -> "_RecordTable":
+        """최신 상태 보장 (JSON stat 1회 + data_version 확인, 바뀐 레코드만 재로딩)"""
+        self._import_json_if_changed()
+        if self.loads and not self.store._db_changed(self.kind):
+            return self
+        with self._lock:
+            with self.store._db() as conn:
+                changed = conn.execute(
+                    "SELECT id, ord, body, version, seq FROM roster_records WHERE kind = ? AND seq > ?",
+                    (self.kind, self._max_seq),
+                ).fetchall()
+                deleted = conn.execute(
+                    "SELECT id, seq FROM roster_tombstones WHERE kind = ? AND seq > ?",
+                    (self.kind, self._max_seq),
+                ).fetchall() if self.loads else []
+            if changed or deleted or not self.loads:
+                self._apply(changed, deleted)
+        return self
+
+    def _apply(self, changed: List[sqlite3.Row], deleted: List[sqlite3.Row] = ()) -> None:
+        by_id, versions, order = dict(self.by_id), dict(self.versions), dict(self.order)
+        max_seq = self._max_seq
+        # 삭제와 재추가가 모두 보이면 seq가 큰 쪽이 최종 상태
+        tombstones = {r["id"]: r["seq"] for r in deleted}
+        for r in changed:
+            if r["seq"] < tombstones.get(r["id"], 0):
+                continue
+            tombstones.pop(r["id"], None)
+            by_id[r["id"]] = json.loads(r["body"])
+            versions[r["id"]] = r["version"]
+            order[r["id"]] = r["ord"] if r["ord"] is not None else len(order)
+            max_seq = max(max_seq, r["seq"])
+        for rid, seq in tombstones.items():
+            by_id.pop(rid, None)
+            versions.pop(rid, None)
+            order.pop(rid, None)
+        max_seq = max([max_seq, *(r["seq"] for r in deleted)])
+        rows = sorted(by_id.values(), key=lambda rec: order.get(self.key(rec), 0))
+        by_group: Dict[str, List[Dict[str, Any]]] = {}
+        for rec in rows:
+            gid = self._group(rec)
+            if gid:
+                by_group.setdefault(gid, []).append(rec)
+        # 인덱스를 다 만든 뒤 한 번에 교체 (조회 중인 다른 스레드는 이전 버전을 계속 사용)
+        self.by_id, self.versions, self.order, self.rows, self.by_group = by_id, versions, order, rows, by_group
+        self._max_seq = max_seq
+        self.loads += 1
+        print(f"📇 Roster refreshed: {self.kind} ({len(changed)} changed, {len(tombstones)} removed, {len(rows)} total)")
+
+    # ---------- 쓰기 ----------
+
+    def update(self, rid: str, mutate: Callable[[Dict[str, Any]], None],
+               if_version: Optional[int] = None) -> Optional[Tuple[Dict[str, Any], int]]:
+        """
+        레코드 하나를 원자적으로 수정 (읽기-수정-쓰기를 한 트랜잭션에서)
+
+        Returns:
+            (수정된 레코드, 새 version). if_version이 현재 version과 다르면 수정하지 않고 None.
+
+        Raises:
+            KeyError: 레코드 없음
+        """
+        self._import_json_if_changed()
+        with self.store._transaction() as conn:
+            row = conn.execute(
+                "SELECT body, version FROM roster_records WHERE kind = ? AND id = ?", (self.kind, rid)
+            ).fetchone()
+            if row is None:
+                raise KeyError(rid)
+            if if_version is not None and row["version"] != if_version:
+                return None
+            rec = json.loads(row["body"])
+            mutate(rec)
+            version = row["version"] + 1
+            conn.execute(
+                "UPDATE roster_records SET body = ?, group_id = ?, version = ?, seq = ?, updated_at = ? "
+                "WHERE kind = ? AND id = ?",
+                (json.dumps(rec, ensure_ascii=False), self._group(rec), version,
+                 self.store._next_seq(conn), time.time(), self.kind, rid),
+            )
+        self.store._schedule_export(self)
+        return rec, version
+
+
+class RosterStore:
+    """학생/선생님/반 레코드 저장소 + 인덱스 캐시 (Singleton)"""
+
+    _instance = None
+
+    def __init__(self, data_dir: str = ROSTER_DATA_DIR, db_path: str = ROSTER_DB):
+        self.data_dir = Path(data_dir)
+        self.db_path = Path(db_path)
+        self._reader_lock = threading.Lock()
+        self._reader: Optional[sqlite3.Connection] = None
+        self._seen_versions: Dict[str, int] = {}
+        self._export_lock = threading.Lock()
+        self._export_timers: Dict[str, threading.Timer] = {}
+        self._init_db()
+
+        self._students = _RecordTable(
+            self, "student", self.data_dir / "students_rag.json",
+            key=lambda e: student_record(e).get("student_id"),
+            group=lambda e: student_record(e).get("class_id"),
+        )
+        self._classes = _RecordTable(
+            self, "class", self.data_dir / "class.json",
+            key=lambda c: c.get("class_id"),
+            group=lambda c: None,
+        )
+        self._teachers = _JsonTable(self.data_dir / "teachers.json", lambda t: t.get("teacher_id"))
+
+    @classmethod
+    def get_instance(cls) -> RosterStore:
+        """싱글톤 인스턴스 반환"""
+        if cls._instance is None:
+            cls._instance = RosterStore()
+        return cls._instance
+
+    # ==================== Storage ====================
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _db(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """쓰기 트랜잭션 (짧게 유지: 레코드 하나 읽고 쓰기)"""
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _init_db(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS roster_records (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    group_id TEXT,
+                    ord INTEGER,
+                    body TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    seq INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (kind, id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_roster_records_seq ON roster_records (kind, seq);
+                CREATE TABLE IF NOT EXISTS roster_tombstones (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    PRIMARY KEY (kind, id)
+                );
+                CREATE TABLE IF NOT EXISTS roster_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            """)
+
+    @staticmethod
+    def _next_seq(conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM roster_meta WHERE key = 'seq'").fetchone()
+        seq = int(row["value"]) + 1 if row else 1
+        conn.execute("INSERT OR REPLACE INTO roster_meta (key, value) VALUES ('seq', ?)", (str(seq),))
+        return seq
+
+    def _db_changed(self, kind: str) -> bool:
+        """마지막 확인 이후 (어느 연결에서든) 커밋이 있었는지 - 상주 읽기 연결의 data_version"""
+        with self._reader_lock:
+            if self._reader is None:
+                self._reader = self._connect()
+            version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+            changed = self._seen_versions.get(kind) != version
+            self._seen_versions[kind] = version
+            return changed
+
+    def _schedule_export(self, table: _RecordTable) -> None:
+        """연속 저장을 모아 JSON 스냅샷은 한 번만 기록"""
+        if ROSTER_EXPORT_DELAY_S < 0:
+            return
+        with self._export_lock:
+            if table.kind in self._export_timers:
+                return
+            timer = threading.Timer(ROSTER_EXPORT_DELAY_S, self._run_export, args=(table,))
+            timer.daemon = True
+            self._export_timers[table.kind] = timer
+            timer.start()
+
+    def _run_export(self, table: _RecordTable) -> None:
+        with self._export_lock:
+            self._export_timers.pop(table.kind, None)
+        try:
+            table.export_json()
+        except Exception as e:
+            print(f"⚠️  Roster JSON export failed ({table.json_path.name}): {e}")
+
+    def flush(self) -> None:
+        """대기 중인 JSON 스냅샷 즉시 기록 (서버 종료 시)"""
+        with self._export_lock:
+            timers, self._export_timers = self._export_timers, {}
+        for timer in timers.values():
+            timer.cancel()
+        for table in (self._students, self._classes):
+            if table.kind in timers:
+                self._run_export(table)
+
+    # ==================== 학생 ====================
+
+    def student_entries(self) -> List[Dict[str, Any]]:
+        """students_rag.json 전체 항목 ({"원본데이터", "자연어요약", ...})"""
+        return self._students.fresh().rows
+
+    def get_student_entry(self, student_id: str) -> Optional[Dict[str, Any]]:
+        return self._students.fresh().by_id.get(student_id)
+
+    def get_student(self, student_id: str) -> Optional[Dict[str, Any]]:
+        """학생 원본데이터 (없으면 None)"""
+        entry = self.get_student_entry(student_id)
+        return student_record(entry) if entry else None
+
+    def students_in_classes(self, class_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """반 목록에 속한 학생 항목 (파일 순서 유지)"""
+        table = self._students.fresh()
+        by_group, order, key = table.by_group, table.order, table.key
+        entries = [e for class_id in set(class_ids) for e in by_group.get(class_id, [])]
+        return sorted(entries, key=lambda e: order.get(key(e), 0))
+
+    def update_student(self, student_id: str, mutate: Callable[[Dict[str, Any]], None],
+                       if_version: Optional[int] = None) -> Optional[Tuple[Dict[str, Any], int]]:
+        """학생 항목 하나를 원자적으로 수정 → (항목, version). KeyError: 학생 없음"""
+        return self._students.update(student_id, mutate, if_version)
+
+    # ==================== 선생님 ====================
+
+    def get_teacher(self, teacher_id: str) -> Optional[Dict[str, Any]]:
+        return self._teachers.fresh().by_id.get(teacher_id)
+
+    def assigned_classes(self, teacher_id: str) -> List[str]:
+        """선생님 담당 반 ID 목록 (없으면 빈 목록)"""
+        teacher = self.get_teacher(teacher_id)
+        return list(teacher.get("assigned_classes") or []) if teacher else []
+
+    # ==================== 반 ====================
+
+    def classes(self) -> List[Dict[str, Any]]:
+        return self._classes.fresh().rows
+
+    def get_class(self, class_id: str) -> Optional[Dict[str, Any]]:
+        return self._classes.fresh().by_id.get(class_id)
+
+    def update_class(self, class_id: str, mutate: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """반 정보 하나를 원자적으로 수정 → 수정된 반. KeyError: 반 없음"""
+        cls, _ = self._classes.update(class_id, mutate)
+        return cls
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "students": {"rows": len(self._students.rows), "loads": self._students.loads},
+            "classes": {"rows": len(self._classes.rows), "loads": self._classes.loads},
+            "teachers": {"rows": len(self._teachers.rows), "loads": self._teachers.loads},
+        }
+
+
+def get_roster_store() -> RosterStore:
+    """Roster Store 싱글톤 반환"""
+    return RosterStore.get_instance()
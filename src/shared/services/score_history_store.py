@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""
+Score History Store
+학생 영역별 점수(radar_scores) 시계열 저장소 + 추이 조회
+
+- 학생마다 날짜(일 단위 ordinal, int32)와 5개 영역 점수(float32, n×5) 배열을 SQLite(data/score_history.db, WAL)에
+  BLOB 한 행으로 저장한다 (점 하나당 24바이트). 기록 추가는 학생 한 명의 행만 읽고 쓰는 짧은 BEGIN IMMEDIATE 트랜잭션.
+- 조회용으로는 전체 학생의 점을 (학생, 날짜) 순으로 이어 붙인 열 배열을 메모리에 두고,
+  이동 평균 / N주 변화량 / 반 백분위 밴드를 NumPy 벡터 연산으로 계산한다.
+  다른 프로세스의 기록은 PRAGMA data_version으로 감지해 바뀐 학생(seq 증가분)만 다시 읽는다.
+- 처음 실행 시 students_rag.json의 assessment.score_history(이전 방식)와 현재 radar_scores를 한 번 가져온다.
+- 같은 날 여러 번 기록하면 그날 점수는 마지막 값으로 대체된다 (하루 한 점).
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SCORE_HISTORY_DB = os.getenv("SCORE_HISTORY_DB", "data/score_history.db")
+SCORE_HISTORY_MAX_POINTS = int(os.getenv("SCORE_HISTORY_MAX_POINTS", "0"))  # 학생당 최대 점 수 (0: 제한 없음)
+
+AREAS = ("grammar", "vocabulary", "reading", "listening", "writing")
+AREA_ALIASES = {
+    "문법": "grammar", "GR": "grammar",
+    "어휘": "vocabulary", "VO": "vocabulary",
+    "독해": "reading", "RD": "reading",
+    "듣기": "listening", "LS": "listening",
+    "쓰기": "writing", "WR": "writing",
+}
+AREA_LABELS = {"grammar": "문법", "vocabulary": "어휘", "reading": "독해", "listening": "듣기", "writing": "쓰기"}
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def normalize_area(area: Optional[str]) -> Optional[str]:
+    """'독해' / 'RD' / 'reading' → 'reading' (None이면 None). 알 수 없는 영역이면 ValueError"""
+    if area is None:
+        return None
+    key = AREA_ALIASES.get(area.strip(), AREA_ALIASES.get(area.strip().upper(), area.strip().lower()))
+    if key not in AREAS:
+        raise ValueError(f"unknown area {area!r} (areas: {', '.join(AREAS)})")
+    return key
+
+
+def _to_day(value: Any) -> int:
+    """date / 'YYYY-MM-DD...' 문자열 → 일 단위 ordinal"""
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+def _from_day(day: int) -> str:
+    return date.fromordinal(int(day)).isoformat()
+
+
+def _scores_row(scores: Dict[str, Any]) -> np.ndarray:
+    return np.array([np.nan if scores.get(a) is None else float(scores[a]) for a in AREAS], dtype=np.float32)
+
+
+def _round(value: Any) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), 1)
+
+
+class _Columns:
+    """전체 학생 시계열을 이어 붙인 열 배열 (읽기 전용 스냅샷)"""
+
+    def __init__(self, series: Dict[str, Tuple[Optional[str], np.ndarray, np.ndarray]]):
+        self.students = sorted(series)
+        self.index = {sid: i for i, sid in enumerate(self.students)}
+        self.class_ids = np.array([series[sid][0] or "" for sid in self.students], dtype=object)
+        lengths = np.array([len(series[sid][1]) for sid in self.students], dtype=np.int64)
+        self.end = np.cumsum(lengths)
+        self.start = self.end - lengths
+        if self.students:
+            self.days = np.concatenate([series[sid][1] for sid in self.students]).astype(np.int64)
+            self.scores = np.concatenate([series[sid][2] for sid in self.students]).reshape(-1, len(AREAS))
+        else:
+            self.days = np.zeros(0, dtype=np.int64)
+            self.scores = np.zeros((0, len(AREAS)), dtype=np.float32)
+        owner = np.repeat(np.arange(len(self.students), dtype=np.int64), lengths)
+        # (학생, 날짜) 정렬 키 → as-of 조회를 searchsorted 한 번으로
+        self._span = int(self.days.max()) + 1 if len(self.days) else 1
+        self.keys = owner * self._span + self.days
+
+    def segment(self, sid: str) -> Tuple[np.ndarray, np.ndarray]:
+        i = self.index.get(sid)
+        if i is None:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, len(AREAS)), dtype=np.float32)
+        return self.days[self.start[i]:self.end[i]], self.scores[self.start[i]:self.end[i]]
+
+    def as_of(self, members: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """
+        각 학생(members)의 각 날짜(days) 시점 최신 점수
+
+        Returns:
+            (len(members), len(days), 5) float 배열 (그 날짜 이전 기록이 없으면 NaN)
+        """
+        out = np.full((len(members), len(days), len(AREAS)), np.nan, dtype=np.float32)
+        if not len(members) or not len(days) or not len(self.keys):
+            return out
+        clipped = np.minimum(days, self._span - 1)
+        query = members[:, None] * self._span + clipped[None, :]
+        pos = np.searchsorted(self.keys, query, side="right") - 1
+        valid = (pos >= self.start[members][:, None]) & (days[None, :] >= 0)
+        out[valid] = self.scores[pos[valid]]
+        return out
+
+
+class ScoreHistoryStore:
+    """학생 점수 시계열 저장소 (Singleton)"""
+
+    _instance = None
+
+    def __init__(self, db_path: str = SCORE_HISTORY_DB):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._reader: Optional[sqlite3.Connection] = None
+        self._seen_version: Optional[int] = None
+        self._series: Dict[str, Tuple[Optional[str], np.ndarray, np.ndarray]] = {}
+        self._max_seq = 0
+        self._columns: Optional[_Columns] = None
+        self._init_db()
+        self._import_roster_once()
+
+    @classmethod
+    def get_instance(cls) -> ScoreHistoryStore:
+        """싱글톤 인스턴스 반환"""
+        if cls._instance is None:
+            cls._instance = ScoreHistoryStore()
+        return cls._instance
+
+    # ==================== Storage ====================
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS score_series (
+                    student_id TEXT PRIMARY KEY,
+                    class_id TEXT,
+                    n INTEGER NOT NULL,
+                    days BLOB NOT NULL,
+                    scores BLOB NOT NULL,
+                    seq INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_score_series_seq ON score_series (seq);
+                CREATE TABLE IF NOT EXISTS score_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            """)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _next_seq(conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM score_meta WHERE key = 'seq'").fetchone()
+        seq = int(row["value"]) + 1 if row else 1
+        conn.execute("INSERT OR REPLACE INTO score_meta (key, value) VALUES ('seq', ?)", (str(seq),))
+        return seq
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Tuple[np.ndarray, np.ndarray]:
+        days = np.frombuffer(row["days"], dtype=np.int32)
+        scores = np.frombuffer(row["scores"], dtype=np.float32).reshape(-1, len(AREAS))
+        return days, scores
+
+    @staticmethod
+    def _merge(days: np.ndarray, scores: np.ndarray, new_days: np.ndarray,
+               new_scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """날짜순 병합, 같은 날짜는 나중 값 우선"""
+        all_days = np.concatenate([days, new_days]).astype(np.int32)
+        all_scores = np.concatenate([scores, new_scores]).astype(np.float32).reshape(-1, len(AREAS))
+        # 뒤집어서 unique → 같은 날짜 중 마지막으로 들어온 값의 위치
+        _, last = np.unique(all_days[::-1], return_index=True)
+        keep = len(all_days) - 1 - last
+        order = keep[np.argsort(all_days[keep], kind="stable")]
+        if SCORE_HISTORY_MAX_POINTS > 0:
+            order = order[-SCORE_HISTORY_MAX_POINTS:]
+        return all_days[order], all_scores[order]
+
+    def _write(self, conn: sqlite3.Connection, student_id: str, class_id: Optional[str],
+               new_days: np.ndarray, new_scores: np.ndarray) -> int:
+        row = conn.execute(
+            "SELECT class_id, days, scores FROM score_series WHERE student_id = ?", (student_id,)
+        ).fetchone()
+        if row is not None:
+            old_days, old_scores = self._decode(row)
+            # 빠진 영역은 그 날짜 시점의 직전 기록으로 채움 (일부 영역만 입력해도 나머지 추이가 끊기지 않게)
+            prev = np.searchsorted(old_days, new_days, side="right") - 1
+            fill = np.where((prev >= 0)[:, None], old_scores[np.maximum(prev, 0)], np.nan)
+            new_scores = np.where(np.isnan(new_scores), fill, new_scores).astype(np.float32)
+            days, scores = self._merge(old_days, old_scores, new_days, new_scores)
+            class_id = class_id or row["class_id"]
+        else:
+            days, scores = self._merge(np.zeros(0, np.int32), np.zeros((0, len(AREAS)), np.float32),
+                                       new_days, new_scores)
+        conn.execute(
+            "INSERT OR REPLACE INTO score_series (student_id, class_id, n, days, scores, seq, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (student_id, class_id, len(days), days.tobytes(), scores.tobytes(), self._next_seq(conn), time.time()),
+        )
+        return len(days)
+
+    def _import_roster_once(self) -> None:
+        """이전 방식(students_rag.json의 assessment.score_history + 현재 radar_scores)을 한 번만 가져오기"""
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM score_meta WHERE key = 'roster_imported'").fetchone():
+                return
+            try:
+                from shared.services.roster_store import get_roster_store, student_record
+                entries = get_roster_store().student_entries()
+            except Exception as e:
+                print(f"⚠️  Score history import skipped (roster unavailable): {e}")
+                return
+            imported = 0
+            for entry in entries:
+                data = student_record(entry)
+                student_id = data.get("student_id")
+                assessment = data.get("assessment") or {}
+                points = [(h.get("date"), h.get("scores") or {}) for h in assessment.get("score_history") or []]
+                if assessment.get("radar_scores") and data.get("updated_at"):
+                    points.append((data["updated_at"], assessment["radar_scores"]))
+                points = [(d, s) for d, s in points if d]
+                if not student_id or not points:
+                    continue
+                self._write(
+                    conn, student_id, data.get("class_id"),
+                    np.array([_to_day(d) for d, _ in points], dtype=np.int32),
+                    np.stack([_scores_row(s) for _, s in points]),
+                )
+                imported += 1
+            conn.execute("INSERT OR REPLACE INTO score_meta (key, value) VALUES ('roster_imported', ?)",
+                         (str(time.time()),))
+        print(f"📈 Score history imported from roster: {imported} students")
+
+    def _fresh(self) -> _Columns:
+        """다른 연결의 커밋이 있으면 바뀐 학생만 다시 읽고 열 배열 재구성"""
+        with self._lock:
+            if self._reader is None:
+                self._reader = self._connect()
+            version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+            if self._columns is not None and version == self._seen_version:
+                return self._columns
+            rows = self._reader.execute(
+                "SELECT student_id, class_id, days, scores, seq FROM score_series WHERE seq > ?", (self._max_seq,)
+            ).fetchall()
+            self._seen_version = version
+            if rows or self._columns is None:
+                for row in rows:
+                    days, scores = self._decode(row)
+                    self._series[row["student_id"]] = (row["class_id"], days, scores)
+                    self._max_seq = max(self._max_seq, row["seq"])
+                self._columns = _Columns(self._series)
+            return self._columns
+
+    # ==================== 기록 ====================
+
+    def append(self, student_id: str, scores: Dict[str, Any], on: Optional[Any] = None,
+               class_id: Optional[str] = None) -> int:
+        """
+        점수 한 점 기록 (같은 날짜가 있으면 대체)
+
+        Args:
+            student_id: 학생 ID
+            scores: {"grammar": 80, ...} (없는 영역은 NaN)
+            on: 기록 날짜 (기본: 오늘)
+            class_id: 학생의 반 (반 백분위 밴드용, 생략 시 기존 값 유지)
+
+        Returns:
+            학생의 총 기록 수
+        """
+        with self._transaction() as conn:
+            return self._write(conn, student_id, class_id,
+                               np.array([_to_day(on or date.today())], dtype=np.int32),
+                               _scores_row(scores)[None, :])
+
+    # ==================== 조회 ====================
+
+    def series(self, student_id: str, area: Optional[str] = None,
+               days: Optional[int] = None) -> Dict[str, Any]:
+        """학생 점수 기록 {"dates": [...], "<area>": [...]} (days: 최근 N일만)"""
+        day_arr, scores = self._fresh().segment(student_id)
+        if days is not None and len(day_arr):
+            mask = day_arr >= day_arr[-1] - days
+            day_arr, scores = day_arr[mask], scores[mask]
+        areas = [normalize_area(area)] if area else list(AREAS)
+        result: Dict[str, Any] = {"dates": [_from_day(d) for d in day_arr]}
+        for a in areas:
+            result[a] = [_round(v) for v in scores[:, AREAS.index(a)]]
+        return result
+
+    @staticmethod
+    def _moving_average(values: np.ndarray, window: int) -> np.ndarray:
+        """NaN을 건너뛰는 후행 이동 평균 (앞쪽은 있는 점만으로)"""
+        filled = np.where(np.isnan(values), 0.0, values).astype(np.float64)
+        counts = (~np.isnan(values)).astype(np.float64)
+        csum = np.cumsum(np.insert(filled, 0, 0.0, axis=0), axis=0)
+        ccnt = np.cumsum(np.insert(counts, 0, 0.0, axis=0), axis=0)
+        idx = np.arange(1, len(values) + 1)
+        lo = np.maximum(idx - window, 0)
+        total, n = csum[idx] - csum[lo], ccnt[idx] - ccnt[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, total / np.maximum(n, 1), np.nan)
+
+    def student_trend(self, student_id: str, area: Optional[str] = None, days: int = 30,
+                      window: int = 3) -> Optional[Dict[str, Any]]:
+        """
+        학생 영역별 추이 요약
+
+        Returns:
+            {"student_id", "from", "to", "points", "areas": {area: {"first", "last", "delta", "slope_per_week",
+            "moving_average": [...]}}, "dates": [...]} (기록 없으면 None)
+        """
+        cols = self._fresh()
+        day_arr, scores = cols.segment(student_id)
+        if not len(day_arr):
+            return None
+        mask = day_arr >= day_arr[-1] - days
+        day_arr, scores = day_arr[mask], scores[mask].astype(np.float64)
+        areas = [normalize_area(area)] if area else list(AREAS)
+        ma = self._moving_average(scores, max(1, window))
+        summary: Dict[str, Any] = {}
+        for a in areas:
+            col = scores[:, AREAS.index(a)]
+            ok = ~np.isnan(col)
+            first = col[ok][0] if ok.any() else np.nan
+            last = col[ok][-1] if ok.any() else np.nan
+            slope = np.nan
+            if ok.sum() >= 2 and np.ptp(day_arr[ok]) > 0:
+                slope = np.polyfit(day_arr[ok].astype(np.float64), col[ok], 1)[0] * 7
+            summary[a] = {
+                "first": _round(first),
+                "last": _round(last),
+                "delta": _round(last - first),
+                "slope_per_week": _round(slope),
+                "moving_average": [_round(v) for v in ma[:, AREAS.index(a)]],
+            }
+        return {
+            "student_id": student_id,
+            "from": _from_day(day_arr[0]),
+            "to": _from_day(day_arr[-1]),
+            "points": int(len(day_arr)),
+            "dates": [_from_day(d) for d in day_arr],
+            "areas": summary,
+        }
+
+    def _members(self, cols: _Columns, class_id: Optional[str] = None,
+                 student_ids: Optional[Iterable[str]] = None) -> np.ndarray:
+        if student_ids is not None:
+            return np.array([cols.index[s] for s in student_ids if s in cols.index], dtype=np.int64)
+        if class_id is None:
+            return np.arange(len(cols.students), dtype=np.int64)
+        return np.flatnonzero(cols.class_ids == class_id).astype(np.int64)
+
+    def deltas(self, weeks: int = 4, area: Optional[str] = None, class_id: Optional[str] = None,
+               student_ids: Optional[Iterable[str]] = None, on: Optional[Any] = None) -> List[Dict[str, Any]]:
+        """
+        N주 전 대비 점수 변화량 (학생별, 반/학생 목록 필터)
+
+        Returns:
+            [{"student_id", "class_id", "<area>": {"then", "now", "delta"}}] (delta 기준 오름차순은 호출부에서)
+        """
+        cols = self._fresh()
+        members = self._members(cols, class_id, student_ids)
+        end = _to_day(on or date.today())
+        snap = cols.as_of(members, np.array([end - weeks * 7, end], dtype=np.int64))
+        areas = [normalize_area(area)] if area else list(AREAS)
+        rows = []
+        for k, m in enumerate(members):
+            row: Dict[str, Any] = {"student_id": cols.students[m], "class_id": cols.class_ids[m] or None}
+            for a in areas:
+                then, now = snap[k, 0, AREAS.index(a)], snap[k, 1, AREAS.index(a)]
+                row[a] = {"then": _round(then), "now": _round(now), "delta": _round(now - then)}
+            rows.append(row)
+        return rows
+
+    def class_bands(self, class_id: Optional[str] = None, area: Optional[str] = None, days: int = 90,
+                    step_days: int = 7, percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                    student_ids: Optional[Iterable[str]] = None, on: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        반(또는 학생 목록) 날짜별 백분위 밴드 - 각 날짜 시점의 학생별 최신 점수 기준
+
+        Returns:
+            {"dates": [...], "students": n, "areas": {area: {"p10": [...], ..., "mean": [...], "count": [...]}}}
+        """
+        cols = self._fresh()
+        members = self._members(cols, class_id, student_ids)
+        end = _to_day(on or date.today())
+        grid = np.arange(end - days, end + 1, max(1, step_days), dtype=np.int64)
+        if grid[-1] != end:
+            grid = np.append(grid, end)
+        snap = cols.as_of(members, grid).astype(np.float64)  # (학생, 날짜, 영역)
+        areas = [normalize_area(area)] if area else list(AREAS)
+        result: Dict[str, Any] = {"dates": [_from_day(d) for d in grid], "students": int(len(members)), "areas": {}}
+        for a in areas:
+            values = snap[:, :, AREAS.index(a)]
+            count = (~np.isnan(values)).sum(axis=0)
+            bands: Dict[str, Any] = {"count": count.tolist()}
+            if len(members):
+                with warnings.catch_warnings():
+                    # 기록이 하나도 없는 날짜(모두 NaN)는 NaN으로 둔다
+                    warnings.simplefilter("ignore", category=RuntimeWarning)
+                    pct = np.nanpercentile(values, list(percentiles), axis=0)
+                    mean = np.nanmean(values, axis=0)
+            else:
+                pct = np.full((len(percentiles), len(grid)), np.nan)
+                mean = np.full(len(grid), np.nan)
+            for p, row in zip(percentiles, pct):
+                bands[f"p{int(p) if float(p).is_integer() else p}"] = [_round(v) for v in row]
+            bands["mean"] = [_round(v) for v in mean]
+            result["areas"][a] = bands
+        return result
+
+    def student_percentile(self, student_id: str, class_id: Optional[str] = None,
+                           on: Optional[Any] = None) -> Dict[str, Optional[float]]:
+        """반 안에서 학생의 영역별 현재 백분위 (0-100, 기록 없으면 None)"""
+        cols = self._fresh()
+        if student_id not in cols.index:
+            return {a: None for a in AREAS}
+        if class_id is None:
+            class_id = cols.class_ids[cols.index[student_id]] or None
+        members = self._members(cols, class_id)
+        snap = cols.as_of(members, np.array([_to_day(on or date.today())], dtype=np.int64))[:, 0, :]
+        mine = snap[np.flatnonzero(members == cols.index[student_id])[0]]
+        result: Dict[str, Optional[float]] = {}
+        for j, a in enumerate(AREAS):
+            col = snap[:, j]
+            col = col[~np.isnan(col)]
+            if np.isnan(mine[j]) or not len(col):
+                result[a] = None
+            else:
+                # 동점은 절반만 아래로 계산
+                result[a] = round(float(((col < mine[j]).sum() + 0.5 * (col == mine[j]).sum()) / len(col) * 100), 1)
+        return result
+
+    def describe_trend(self, student_id: str, area: Optional[str] = None, days: int = 30,
+                       window: int = 3) -> str:
+        """에이전트 응답용 추이 요약 텍스트"""
+        trend = self.student_trend(student_id, area, days, window)
+        if trend is None:
+            return f"{student_id} 학생의 점수 기록이 없습니다."
+        percentile = self.student_percentile(student_id)
+        lines = [f"**점수 추이** ({trend['from']} ~ {trend['to']}, 기록 {trend['points']}회)"]
+        for a, s in trend["areas"].items():
+            if s["last"] is None:
+                continue
+            change = "" if s["delta"] is None else f", 변화 {s['delta']:+.1f}점"
+            slope = "" if s["slope_per_week"] is None else f", 주당 {s['slope_per_week']:+.1f}점"
+            rank = "" if percentile.get(a) is None else f", 반 내 백분위 {percentile[a]:.0f}"
+            lines.append(f"- {AREA_LABELS[a]}: {s['first']} → {s['last']}{change}{slope}{rank}")
+        if len(lines) == 1:
+            lines.append("- 해당 영역 기록 없음")
+        return "\n".join(lines)
+
+
+def get_score_history_store() -> ScoreHistoryStore:
+    """Score History Store 싱글톤 반환"""
+    return ScoreHistoryStore.get_instance()
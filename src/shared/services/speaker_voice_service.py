@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Speaker Voice Service
+듣기 문제 화자 이름 → 성별/음성 매핑 (결정적, 영구 저장)
+
+- 성별은 번들된 이름 목록(shared/data/first_names.json)과 과거 LLM 판단(data/speaker_voices.json)에서 찾는다.
+- 처음 보는 이름만 LLM에 물어보고, 결과를 저장해 다음부터 재사용한다.
+- 음성은 이름 해시로 고정 선택되어 같은 이름은 항상 같은 음성을 쓴다 (TTS 캐시 재사용).
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# 성별별 음성 (TTSService.voice_map 키)
+VOICES = {
+    "female": ["Samantha", "Karen", "Victoria"],
+    "male": ["David", "Daniel", "Mark"],
+}
+
+_SEED_FILE = Path(__file__).resolve().parents[1] / "data" / "first_names.json"
+
+
+class SpeakerVoiceService:
+    """화자 성별/음성 결정 (Singleton)"""
+
+    _instance = None
+
+    def __init__(self):
+        self.learned_file = Path(os.getenv("SPEAKER_VOICES_FILE", "data/speaker_voices.json"))
+        self._lock = threading.Lock()
+        self.seed: Dict[str, str] = self._load_seed()
+        self.learned: Dict[str, str] = self._load_learned()
+
+    @classmethod
+    def get_instance(cls) -> SpeakerVoiceService:
+        """싱글톤 인스턴스 반환"""
+        if cls._instance is None:
+            cls._instance = SpeakerVoiceService()
+        return cls._instance
+
+    def _load_seed(self) -> Dict[str, str]:
+        try:
+            with open(_SEED_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {
+                name.lower(): gender
+                for gender, names in data.items()
+                for name in names
+            }
+        except Exception as e:
+            print(f"Warning: Failed to load first-name list: {e}")
+            return {}
+
+    def _load_learned(self) -> Dict[str, str]:
+        if not self.learned_file.exists():
+            return {}
+        try:
+            with open(self.learned_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Warning: Failed to load speaker voices: {e}")
+            return {}
+
+    def _save_learned(self):
+        """학습한 이름 저장 (다른 워커가 저장한 이름과 병합 후 임시 파일 + rename으로 원자적 교체)"""
+        try:
+            self.learned = {**self._load_learned(), **self.learned}
+            self.learned_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.learned_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.learned, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp, self.learned_file)
+        except Exception as e:
+            print(f"Warning: Failed to save speaker voices: {e}")
+
+    def gender_of(self, name: str) -> Optional[str]:
+        """알려진 이름의 성별 (모르면 None)"""
+        key = name.strip().lower()
+        return self.learned.get(key) or self.seed.get(key)
+
+    @staticmethod
+    def voice_for(name: str, gender: str) -> str:
+        """이름 해시 기반 고정 음성"""
+        voices = VOICES[gender]
+        digest = hashlib.md5(name.strip().lower().encode()).digest()
+        return voices[digest[0] % len(voices)]
+
+    def _learn_with_llm(self, names: List[str], client) -> Dict[str, str]:
+        """처음 보는 이름의 성별을 LLM으로 판단"""
+        prompt = (
+            f"Given these English first names: {', '.join(names)}\n"
+            "For each name, answer the most likely gender (male or female).\n"
+            'Respond with ONLY valid JSON: {"Name1": "female", "Name2": "male"}'
+        )
+        try:
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+                max_tokens=200,
+                temperature=0
+            )
+            content = response.choices[0].message.content or "{}"
+            json_match = re.search(r'\{.*\}', content, re.DOTALL)
+            decided = json.loads(json_match.group(0) if json_match else content)
+        except Exception as e:
+            print(f"   ⚠️  화자 성별 LLM 판단 실패, 규칙 기반 사용: {e}")
+            return {}
+
+        learned = {}
+        for name, gender in decided.items():
+            gender = str(gender).strip().lower()
+            if gender in VOICES:
+                learned[name.strip().lower()] = gender
+        if learned:
+            with self._lock:
+                self.learned.update(learned)
+                self._save_learned()
+            print(f"   ✅ 새 화자 이름 학습: {learned}")
+        return learned
+
+    def assign(self, names: List[str], client=None) -> List[Dict[str, str]]:
+        """
+        대화 화자들의 성별/음성 결정
+
+        Args:
+            names: 화자 이름 (등장 순서)
+            client: 처음 보는 이름 판단용 LLM 클라이언트 (None이면 LLM 호출 안 함)
+
+        Returns:
+            [{"name": ..., "gender": ..., "voice": ...}, ...] - 같은 대화 안에서는 서로 다른 음성
+        """
+        unknown = [n for n in names if not self.gender_of(n)]
+        if unknown and client is not None:
+            self._learn_with_llm(unknown, client)
+
+        speakers = []
+        used_voices = set()
+        for i, name in enumerate(names):
+            gender = self.gender_of(name)
+            if not gender:
+                # 기본값: 남/녀 번갈아
+                gender = "female" if i % 2 == 0 else "male"
+
+            voice = self.voice_for(name, gender)
+            if voice in used_voices:
+                # 같은 대화에서 음성이 겹치면 다음 음성으로 (결정적)
+                voices = VOICES[gender]
+                start = voices.index(voice)
+                for offset in range(1, len(voices)):
+                    candidate = voices[(start + offset) % len(voices)]
+                    if candidate not in used_voices:
+                        voice = candidate
+                        break
+            used_voices.add(voice)
+            speakers.append({"name": name, "gender": gender, "voice": voice})
+
+        return speakers
+
+
+def get_speaker_voice_service() -> SpeakerVoiceService:
+    """화자 음성 서비스 싱글톤 getter"""
+    return SpeakerVoiceService.get_instance()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+TTS Segment Cache
+발화 단위 TTS 결과 캐시 (model, voice, speed, format, 정규화 텍스트 → 오디오 bytes)
+
+생성된 대화에는 "Hi, how can I help you?" 같은 문장이 반복되므로,
+문제 전체가 아니라 발화 단위로 캐시해 재생성·재시도 시 TTS 호출을 줄인다.
+디스크 용량 한도를 넘으면 가장 오래 사용하지 않은 파일부터 삭제한다 (LRU).
+"""
+from __future__ import annotations
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """캐시 키용 텍스트 정규화 (유니코드 NFC + 공백 정리, 대소문자/문장부호는 억양에 영향이 있어 유지)"""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class TTSSegmentCache:
+    """디스크 기반 발화 캐시 (Singleton)"""
+
+    _instance = None
+
+    def __init__(self):
+        self.cache_dir = Path(os.getenv("TTS_SEGMENT_CACHE_DIR", "data/tts_segments"))
+        self.max_bytes = int(float(os.getenv("TTS_SEGMENT_CACHE_MB", "512")) * 1024 * 1024)
+        self._lock = threading.Lock()
+        # path -> (size, last_used)
+        self._index: Dict[Path, Tuple[int, float]] = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._scan()
+
+    @classmethod
+    def get_instance(cls) -> TTSSegmentCache:
+        """싱글톤 인스턴스 반환"""
+        if cls._instance is None:
+            cls._instance = TTSSegmentCache()
+        return cls._instance
+
+    def _scan(self):
+        """기존 캐시 파일 인덱싱 (mtime을 마지막 사용 시각으로 사용)"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for path in self.cache_dir.glob("*/*.seg"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            self._index[path] = (st.st_size, st.st_mtime)
+            self._total_bytes += st.st_size
+
+    @staticmethod
+    def make_key(model: str, voice: str, speed: float, text: str, fmt: str = "mp3") -> str:
+        raw = f"{model}|{voice}|{speed:.2f}|{fmt}|{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.seg"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """캐시된 오디오 (없으면 None)"""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                if path in self._index:
+                    size, _ = self._index.pop(path)
+                    self._total_bytes -= size
+            return None
+
+        now = time.time()
+        try:
+            os.utime(path, (now, now))  # 다른 워커도 LRU 순서를 볼 수 있도록
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            if path not in self._index:
+                self._total_bytes += len(data)
+            self._index[path] = (len(data), now)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """오디오 저장 (임시 파일 + rename으로 원자적 기록) 후 용량 초과 시 LRU 정리"""
+        if not data:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️  Failed to cache TTS segment: {e}")
+            return
+
+        with self._lock:
+            if path in self._index:
+                self._total_bytes -= self._index[path][0]
+            self._index[path] = (len(data), time.time())
+            self._total_bytes += len(data)
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        """가장 오래 사용하지 않은 파일부터 한도의 90%까지 삭제"""
+        target = int(self.max_bytes * 0.9)
+        with self._lock:
+            victims = sorted(self._index.items(), key=lambda kv: kv[1][1])
+            removed = 0
+            for path, (size, _) in victims:
+                if self._total_bytes <= target:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                del self._index[path]
+                self._total_bytes -= size
+                removed += 1
+        if removed:
+            print(f"🧹 TTS segment cache evicted {removed} files ({self._total_bytes / 1048576:.1f}MB kept)")
+
+
+def get_tts_segment_cache() -> TTSSegmentCache:
+    """TTS 발화 캐시 싱글톤 getter"""
+    return TTSSegmentCache.get_instance()
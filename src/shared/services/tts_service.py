@@ -4,11 +4,15 @@ TTS Service - OpenAI TTS API를 사용한 고품질 음성 생성 및 효과음
 import os
 import re
 import json
+import time
 import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
-from openai import OpenAI
 from datetime import datetime
+from shared.services.llm_client import get_llm_client
+from shared.services.tts_segment_cache import get_tts_segment_cache
 
 # Import audio session tracking
 try:
@@ -18,23 +22,30 @@ except ImportError:
     AUDIO_TRACKING_AVAILABLE = False
     print("⚠️  AudioSessionService not available - audio tracking disabled")
 
-# pydub는 효과음 믹싱에만 사용 (선택적)
-try:
-    from pydub import AudioSegment
-    PYDUB_AVAILABLE = True
-except ImportError:
-    PYDUB_AVAILABLE = False
-    print("⚠️  pydub not available - audio mixing disabled")
+# 다중 화자 믹싱은 PCM + NumPy로 처리하고 ffmpeg로 한 번만 인코딩 (선택적)
+from shared.services import audio_mixer
+if not audio_mixer.MIXER_AVAILABLE:
+    print("⚠️  ffmpeg not available - audio mixing disabled")
 
 
 class TTSService:
     """OpenAI TTS를 사용한 듣기 문제 음성 생성"""
 
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.client = get_llm_client()
+        self.tts_model = "tts-1"
+        self.segment_cache = get_tts_segment_cache()
         self.audio_dir = Path('/home/sh/projects/ClassMate/static/audio')
         self.effects_dir = Path('/home/sh/projects/ClassMate/static/effects')
 
+        # 발화별 병렬 합성 설정 (TTS RPM 한도를 넘지 않도록 동시 요청 수 제한)
+        self.max_concurrency = int(os.getenv('TTS_CONCURRENCY', '4'))
+        self.line_retries = 2
+
+        # 점진적 재생: 첫 발화가 준비되면 스트리밍 URL로 바로 재생 시작
+        self.progressive = os.getenv('TTS_PROGRESSIVE', 'true').lower() == 'true'
+        self.progressive_stale_s = 120  # 이보다 오래 갱신 없는 .part 파일은 중단된 렌더링으로 간주
+
         # 음성 매핑 (OpenAI TTS 음성)
         self.voice_map = {
             'Samantha': 'nova',      # Female - warm
@@ -184,7 +195,7 @@ class TTSService:
         else:
             return 'nova'
 
-    def generate_tts_segment(self, text: str, voice: str, speed: float = 1.0) -> bytes:
+    def generate_tts_segment(self, text: str, voice: str, speed: float = 1.0, response_format: str = "mp3") -> bytes:
         """
         OpenAI TTS로 음성 생성
 
@@ -192,20 +203,31 @@ class TTSService:
             text: 발화 텍스트
             voice: OpenAI voice (nova, onyx, etc.)
             speed: 속도 (0.25 ~ 4.0)
+            response_format: "mp3" 또는 "pcm" (24kHz 16-bit mono, 믹싱용)
 
         Returns:
-            MP3 audio bytes
+            audio bytes (response_format 형식)
         """
+        # 발화 캐시 확인 (같은 문장/음성/속도/형식은 재합성하지 않음)
+        cache_key = self.segment_cache.make_key(self.tts_model, voice, speed, text, fmt=response_format)
+        cached = self.segment_cache.get(cache_key)
+        if cached:
+            print(f"♻️  TTS segment cache hit: voice={voice}, text='{text[:50]}...'")
+            return cached
+
         try:
             print(f"🎤 Generating TTS: voice={voice}, text='{text[:50]}...'")
 
             response = self.client.audio.speech.create(
-                model="tts-1",
+                model=self.tts_model,
                 voice=voice,
                 input=text,
-                speed=speed
+                speed=speed,
+                response_format=response_format
             )
 
+            self.segment_cache.put(cache_key, response.content)
+
             # Return audio bytes directly
             return response.content
 
@@ -213,6 +235,38 @@ class TTSService:
             print(f"❌ TTS generation failed: {e}")
             return b''  # Empty bytes on error
 
+    def _synthesize_line(self, index: int, total: int, text: str, voice: str, speed: float,
+                         response_format: str) -> bytes:
+        """발화 하나 합성 (실패 시 해당 발화만 재시도)"""
+        for attempt in range(self.line_retries + 1):
+            audio_bytes = self.generate_tts_segment(text, voice, speed, response_format)
+            if audio_bytes:
+                return audio_bytes
+            if attempt < self.line_retries:
+                print(f"    🔁 Retrying TTS for line {index+1}/{total} ({attempt + 1}/{self.line_retries})")
+                time.sleep(0.5 * (2 ** attempt))
+        return b''
+
+    def synthesize_lines(self, dialogue_lines: List[Dict], speakers: List[Dict], speed: float,
+                         response_format: str = "mp3") -> List[bytes]:
+        """
+        모든 발화를 병렬로 합성 (동시 요청 수는 TTS_CONCURRENCY로 제한)
+
+        Returns:
+            dialogue_lines와 같은 순서의 audio bytes 리스트 (실패한 발화는 b'')
+        """
+        total = len(dialogue_lines)
+        jobs = []
+        for i, line in enumerate(dialogue_lines):
+            voice = self.get_openai_voice(line['speaker'], speakers)
+            print(f"  [{i+1}/{total}] {line['speaker']}: {line['text'][:30]}... (voice={voice})")
+            jobs.append((i, total, line['text'], voice, speed, response_format))
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, total) or 1,
+                                thread_name_prefix="tts-line") as pool:
+            # map은 입력 순서대로 결과를 돌려줌
+            return list(pool.map(lambda job: self._synthesize_line(*job), jobs))
+
     def create_listening_audio(
         self,
         content: str,
@@ -249,9 +303,9 @@ class TTSService:
 
         print(f"📝 Generating TTS for {len(dialogue_lines)} lines from {len(speakers)} speakers")
 
-        # Check if pydub is available for multi-speaker support
-        if not PYDUB_AVAILABLE:
-            print("⚠️ pydub not available - using single voice fallback")
+        # Check if ffmpeg is available for multi-speaker support
+        if not audio_mixer.MIXER_AVAILABLE:
+            print("⚠️ ffmpeg not available - using single voice fallback")
             # Fallback to simple version
             voice = 'alloy'
             if speakers and len(speakers) > 0:
@@ -280,69 +334,40 @@ class TTSService:
 
             return f"/static/audio/{filename}"
 
-        # 2. 각 발화를 개별 TTS로 생성 (화자별 다른 음성)
-        combined_audio = AudioSegment.silent(duration=500)  # 0.5초 무음으로 시작
-
-        for i, line in enumerate(dialogue_lines):
-            speaker_name = line['speaker']
-            text = line['text']
-
-            # 음성 선택 (화자별)
-            voice = self.get_openai_voice(speaker_name, speakers)
-
-            print(f"  [{i+1}/{len(dialogue_lines)}] {speaker_name}: {text[:30]}... (voice={voice})")
-
-            # TTS 생성
-            audio_bytes = self.generate_tts_segment(text, voice, speed)
+        # 2. 각 발화를 개별 TTS로 생성 (화자별 다른 음성, raw PCM으로 병렬 합성)
+        segments_bytes = self.synthesize_lines(dialogue_lines, speakers, speed, response_format="pcm")
 
+        segments = []
+        for i, audio_bytes in enumerate(segments_bytes):
             if not audio_bytes:
                 print(f"    ⚠️ TTS failed for line {i+1}, skipping")
                 continue
+            segments.append(audio_mixer.pcm_to_array(audio_bytes))
 
-            # bytes를 AudioSegment로 변환
-            try:
-                from io import BytesIO
-                segment = AudioSegment.from_mp3(BytesIO(audio_bytes))
-
-                # 볼륨 부스트 (+6dB로 소리 키우기)
-                segment = segment + 6
-
-                # 결합 (발화 사이 0.3초 간격)
-                combined_audio += segment
-                combined_audio += AudioSegment.silent(duration=300)
-
-            except Exception as e:
-                print(f"    ⚠️ Failed to convert audio segment: {e}")
-                continue
+        if not segments:
+            print("❌ All TTS segments failed")
+            return None
 
-        # 3. 효과음 추가 (있으면)
+        # 3. 효과음 (프로세스당 한 번만 디코딩)
+        effect = None
         if effect_type and effect_type in self.effects:
-            effect_file = self.effects_dir / self.effects[effect_type]
-            if effect_file.exists():
-                try:
-                    effect = AudioSegment.from_mp3(str(effect_file))
-                    # 효과음을 배경에 깔기 (볼륨 -15dB로 조정 - 이전보다 5dB 더 크게)
-                    effect = effect - 15
-                    # 효과음 길이를 대화 길이에 맞춤
-                    if len(effect) < len(combined_audio):
-                        effect = effect * (len(combined_audio) // len(effect) + 1)
-                    effect = effect[:len(combined_audio)]
-
-                    combined_audio = combined_audio.overlay(effect)
+            try:
+                effect = audio_mixer.load_effect(self.effects_dir / self.effects[effect_type])
+                if effect is not None:
                     print(f"✅ Added sound effect: {effect_type}")
-                except Exception as e:
-                    print(f"⚠️ Failed to add effect: {e}")
+            except Exception as e:
+                print(f"⚠️ Failed to add effect: {e}")
 
-        # 4. 파일 저장 (해시 기반 파일명)
+        # 4. 믹싱 (발화 +6dB, 간격 0.3초, 효과음 -15dB 반복, 전체 +3dB) 후 한 번만 인코딩
         content_hash = hashlib.md5(content.encode()).hexdigest()[:12]
         filename = f"listening_{content_hash}.mp3"
         output_path = self.audio_dir / filename
 
         try:
-            # 전체 오디오에 추가 볼륨 부스트 적용
-            combined_audio = combined_audio + 3
-            combined_audio.export(str(output_path), format="mp3", bitrate="192k")
-            print(f"✅ Audio saved: {output_path} ({len(combined_audio)}ms, {len(dialogue_lines)} segments, +9dB boost)")
+            mixed = audio_mixer.mix_dialogue(segments, effect)
+            audio_mixer.encode_mp3(mixed, output_path, bitrate="192k")
+            duration_ms = len(mixed) * 1000 // audio_mixer.SAMPLE_RATE
+            print(f"✅ Audio saved: {output_path} ({duration_ms}ms, {len(segments)} segments, +9dB boost)")
 
             # Track audio file for cleanup
             if session_id and AUDIO_TRACKING_AVAILABLE:
@@ -359,7 +384,148 @@ class TTSService:
             print(f"❌ Failed to save audio: {e}")
             return None
 
-    def get_or_create_audio(self, content: str, force_regenerate: bool = False, session_id: Optional[str] = None) -> Optional[str]:
+    def _track_audio(self, session_id: Optional[str], path: Path):
+        """세션에 오디오 파일 연결 (정리용)"""
+        if session_id and AUDIO_TRACKING_AVAILABLE:
+            try:
+                audio_service = AudioSessionService.get_instance()
+                audio_service.track_audio(session_id, str(path))
+            except Exception as e:
+                print(f"⚠️  Failed to track audio: {e}")
+
+    def audio_path(self, audio_url: str) -> Path:
+        """오디오 URL(/static/audio/..., 스트리밍 URL) → 추적에 쓰인 파일 경로"""
+        return self.audio_dir / Path(audio_url.split("?", 1)[0]).name
+
+    def partial_path(self, filename: str) -> Path:
+        """렌더링 중인 MP3 (완료되면 filename으로 rename)"""
+        return self.audio_dir / f"{filename}.part"
+
+    def _claim_partial(self, part_path: Path) -> bool:
+        """
+        .part 파일을 원자적으로 생성해 렌더링 권한 획득 (여러 워커 중 하나만 렌더링)
+
+        Returns:
+            True면 이 호출이 렌더링 담당, False면 이미 다른 곳에서 렌더링 중
+        """
+        try:
+            fd = os.open(part_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            return True
+        except FileExistsError:
+            try:
+                age = time.time() - part_path.stat().st_mtime
+            except FileNotFoundError:
+                return self._claim_partial(part_path)
+            if age < self.progressive_stale_s:
+                return False
+            print(f"⚠️  Stale partial audio, restarting: {part_path.name}")
+            part_path.unlink(missing_ok=True)
+            return self._claim_partial(part_path)
+
+    def start_progressive_audio(
+        self,
+        content: str,
+        speed: float = 0.9,
+        session_id: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        듣기 오디오를 백그라운드에서 발화 순서대로 렌더링하고 스트리밍 URL을 즉시 반환
+
+        첫 발화가 합성되는 즉시 MP3 프레임이 .part 파일에 기록되고
+        /api/audio/stream/{filename}이 이를 따라가며 전송한다.
+        렌더링이 끝나면 .part가 정적 파일로 rename되어 이후 요청은 /static/audio에서 받는다.
+
+        Returns:
+            스트리밍 URL (예: '/api/audio/stream/listening_abc123.mp3'), 파싱 실패 시 None
+        """
+        speakers, audio_text, effect_type = self.parse_listening_problem(content)
+        dialogue_lines = self.parse_dialogue_lines(audio_text) if audio_text else []
+        if not speakers or not dialogue_lines:
+            # 파싱 실패 처리는 기존 경로에 위임
+            return self.create_listening_audio(content, speed=speed, session_id=session_id)
+
+        content_hash = hashlib.md5(content.encode()).hexdigest()[:12]
+        filename = f"listening_{content_hash}.mp3"
+        output_path = self.audio_dir / filename
+        part_path = self.partial_path(filename)
+
+        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        if self._claim_partial(part_path):
+            print(f"📡 Progressive audio started: {filename} ({len(dialogue_lines)} lines)")
+            threading.Thread(
+                target=self._render_progressive,
+                args=(dialogue_lines, speakers, effect_type, speed, output_path, part_path),
+                name=f"tts-progressive-{content_hash}",
+                daemon=True
+            ).start()
+        else:
+            print(f"📡 Progressive audio already rendering: {filename}")
+
+        self._track_audio(session_id, output_path)
+        return f"/api/audio/stream/{filename}"
+
+    def _render_progressive(
+        self,
+        dialogue_lines: List[Dict],
+        speakers: List[Dict],
+        effect_type: Optional[str],
+        speed: float,
+        output_path: Path,
+        part_path: Path
+    ):
+        """발화를 병렬 합성하되 순서대로 믹싱해 ffmpeg에 흘려보냄"""
+        total = len(dialogue_lines)
+        effect = None
+        if effect_type and effect_type in self.effects:
+            try:
+                effect = audio_mixer.load_effect(self.effects_dir / self.effects[effect_type])
+            except Exception as e:
+                print(f"⚠️ Failed to load effect: {e}")
+
+        mixer = audio_mixer.StreamingMixer(effect)
+        written = 0
+        try:
+            with open(part_path, 'wb') as part_file, \
+                    ThreadPoolExecutor(max_workers=min(self.max_concurrency, total) or 1,
+                                       thread_name_prefix="tts-line") as pool:
+                futures = [
+                    pool.submit(self._synthesize_line, i, total, line['text'],
+                                self.get_openai_voice(line['speaker'], speakers), speed, "pcm")
+                    for i, line in enumerate(dialogue_lines)
+                ]
+                encoder = audio_mixer.start_mp3_encoder(part_file, bitrate="192k")
+                try:
+                    encoder.stdin.write(mixer.silence(500).tobytes())
+                    for i, future in enumerate(futures):
+                        audio_bytes = future.result()
+                        if not audio_bytes:
+                            print(f"    ⚠️ TTS failed for line {i+1}, skipping")
+                            continue
+                        encoder.stdin.write(mixer.add(audio_mixer.pcm_to_array(audio_bytes)).tobytes())
+                        encoder.stdin.flush()
+                        written += 1
+                finally:
+                    encoder.stdin.close()
+                    encoder.wait()
+
+            if not written or encoder.returncode != 0:
+                raise RuntimeError(f"no audio rendered (lines={written}, ffmpeg={encoder.returncode})")
+
+            os.replace(part_path, output_path)
+            duration_ms = mixer.position * 1000 // audio_mixer.SAMPLE_RATE
+            print(f"✅ Progressive audio finalized: {output_path} ({duration_ms}ms, {written} segments)")
+        except Exception as e:
+            print(f"❌ Progressive audio failed: {e}")
+            part_path.unlink(missing_ok=True)
+
+    def get_or_create_audio(
+        self,
+        content: str,
+        force_regenerate: bool = False,
+        session_id: Optional[str] = None,
+        progressive: Optional[bool] = None
+    ) -> Optional[str]:
         """
         캐시된 오디오 파일이 있으면 반환, 없으면 생성
 
@@ -367,6 +533,8 @@ class TTSService:
             content: 문제 내용
             force_regenerate: True면 기존 파일 무시하고 재생성
             session_id: 세션 ID (오디오 추적용)
+            progressive: True면 스트리밍 URL을 즉시 반환하고 백그라운드에서 렌더링
+                         (None이면 TTS_PROGRESSIVE 설정, 미리 생성하는 문제 풀은 False로 호출)
 
         Returns:
             오디오 파일 URL
@@ -379,14 +547,14 @@ class TTSService:
         if not force_regenerate and file_path.exists():
             print(f"✅ Using cached audio: {filename}")
             # Track cached audio file too
-            if session_id and AUDIO_TRACKING_AVAILABLE:
-                try:
-                    audio_service = AudioSessionService.get_instance()
-                    audio_service.track_audio(session_id, str(file_path))
-                except Exception as e:
-                    print(f"⚠️  Failed to track cached audio: {e}")
+            self._track_audio(session_id, file_path)
             return f"/static/audio/{filename}"
 
+        if progressive is None:
+            progressive = self.progressive
+        if progressive and audio_mixer.MIXER_AVAILABLE:
+            return self.start_progressive_audio(content, session_id=session_id)
+
         # 새로 생성
         return self.create_listening_audio(content, session_id=session_id)
 
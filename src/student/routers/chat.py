@@ -7,11 +7,10 @@ from __future__ import annotations
 from typing import List
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import json
-from pathlib import Path
 import os
-from openai import OpenAI
+from shared.services.llm_client import get_llm_client
 from shared.services import get_graph_rag_service
+from shared.services.roster_store import get_roster_store
 from student.services import get_student_agent_service
 from shared.prompts import PromptManager
 
@@ -165,34 +164,16 @@ async def chat_with_student_legacy(request: ChatRequest):
 
         # 2. GraphRAG 실패 시 JSON 폴백
         if not use_graphrag:
-            students_file = Path("/home/sh/projects/ClassMate/data/json/students_rag.json")
-            class_file = Path("/home/sh/projects/ClassMate/data/json/class.json")
-
-            with open(students_file, "r", encoding="utf-8") as f:
-                students_data = json.load(f)
-
-            student_summary = None
-            student_raw = None
-            for s in students_data:
-                original = s.get("원본데이터", {})
-                if original.get("student_id") == request.student_id:
-                    student_summary = s.get("자연어요약", "")
-                    student_raw = original
-                    break
-
-            if not student_raw:
+            roster = get_roster_store()
+            entry = roster.get_student_entry(request.student_id)
+            if not entry:
                 raise HTTPException(status_code=404, detail=f"Student not found: {request.student_id}")
 
+            student_summary = entry.get("자연어요약", "")
+            student_raw = entry.get("원본데이터", {})
             student_name = student_raw['name']
 
-            with open(class_file, "r", encoding="utf-8") as f:
-                classes_data = json.load(f)
-
-            class_info = None
-            for c in classes_data:
-                if c.get("class_id") == student_raw.get("class_id"):
-                    class_info = c
-                    break
+            class_info = roster.get_class(student_raw.get("class_id"))
 
             rag_context = f"""**{student_raw['name']} 학생의 학습 현황:**
 {student_summary}
@@ -222,7 +203,7 @@ async def chat_with_student_legacy(request: ChatRequest):
                 student_context=rag_context
             )
 
-        client = OpenAI(api_key=api_key)
+        client = get_llm_client(api_key=api_key)
 
         messages = [{"role": "system", "content": system_prompt}]
         for msg in request.messages:
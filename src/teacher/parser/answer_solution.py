@@ -4,7 +4,7 @@ import re
 from typing import Dict, Tuple
 from pathlib import Path
 from teacher.parser.docai_utils import process_file, doc_text
-import fitz  # type: ignore
+from teacher.parser.exam_document import PdfSource, exam_document, source_path
 
 ANS1 = re.compile(r"(?m)^\s*(\d{1,3})\s*[\).:：-]?\s*([A-Ea-e1-9]|[①-⑳])\b")
 ANS2 = re.compile(r"(?mi)^\s*(\d{1,3})\s*(?:번)?\s*(?:정답|Answer)\s*[:：=\)]?\s*([A-Ea-e1-9]|[①-⑳])\b")
@@ -17,16 +17,14 @@ def parse_answer_any(project: str, location: str, pid: str, path: str) -> Dict[i
     for m in ANS2.finditer(t): out[int(m.group(1))] = m.group(2).upper()
     return out
 
-def _pdf_pages(path: str) -> int:
-    d = fitz.open(path); n=d.page_count; d.close(); return n
-
-def parse_solution(project: str, location: str, pid: str, path: str) -> Tuple[Dict[int,str], Dict[int,str]]:
-    # 15p 초과는 로컬 텍스트로 우회
-    if Path(path).suffix.lower()==".pdf" and _pdf_pages(path)>15:
-        d=fitz.open(path)
-        txt="\n".join(p.get_text("text") for p in d); d.close()  # type: ignore[attr-defined]
-    else:
-        d = process_file(project, location, pid, path)
+def parse_solution(project: str, location: str, pid: str, path: PdfSource) -> Tuple[Dict[int,str], Dict[int,str]]:
+    # 15p 초과는 로컬 텍스트로 우회 (이미 추출된 페이지 텍스트 재사용)
+    txt = None
+    if Path(source_path(path)).suffix.lower()==".pdf":
+        with exam_document(path) as sd:
+            if sd.page_count>15: txt = sd.full_text()
+    if txt is None:
+        d = process_file(project, location, pid, source_path(path))
         txt = doc_text(d)
     parts = re.split(r"(?m)^\s*(\d{1,3})[.)]\s+", txt or "")
     answers: Dict[int,str] = {}; rationales: Dict[int,str] = {}
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-exam batch ingestion (term-start onboarding of many past papers)
+
+Discovers every exam under a directory tree with scan_assets, parses them concurrently
+in a process pool (pipeline.run_pipeline per exam, stage checkpoints included), then
+uploads all outputs to Neo4j in one batched pass with a single warm embedding model
+and writes a per-exam summary report.
+
+LLM concurrency is a global budget: each worker gets budget // workers slots for the
+VLM/mapping models (VLM_CONCURRENCY, MAPPER_CONCURRENCY and the LLM client's
+per-process model limits), so the pool as a whole never exceeds the budget.
+
+    python src/teacher/parser/batch_ingest.py input/ --workers 4 --llm-budget 8 --with-llm
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SRC = Path(__file__).resolve().parents[2]  # src/teacher/parser/batch_ingest.py -> src/
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from teacher.shared.config import scan_assets
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "2"))
+BATCH_LLM_BUDGET = int(os.getenv("BATCH_LLM_BUDGET", "8"))  # concurrent LLM requests across all workers
+
+
+def discover_exams(root: str, only: Optional[List[str]] = None) -> Dict[str, Dict[str, Optional[str]]]:
+    """exam_id -> scan_assets group (+ "folder": directory of the question PDF)"""
+    exams: Dict[str, Dict[str, Optional[str]]] = {}
+    for exam_id, group in sorted(scan_assets(root).items()):
+        if only and exam_id not in only:
+            continue
+        question = group.get("question")
+        if not question or not question.lower().endswith(".pdf"):
+            print(f"[batch] skip {exam_id}: no question PDF")
+            continue
+        folder = Path(question).parent
+        # pipeline.py looks for answer/solution/audio next to the question PDF
+        for kind, path in group.items():
+            if path and kind != "question" and Path(path).parent != folder:
+                print(f"[batch] warn {exam_id}: {kind} file is outside {folder} and will be ignored: {path}")
+        exams[exam_id] = dict(group, folder=folder.as_posix())
+    return exams
+
+
+def _init_worker(llm_slots: int, models: List[str]) -> None:
+    """Process initializer: cap this worker's share of the LLM budget before the parser is imported."""
+    os.environ["VLM_CONCURRENCY"] = str(llm_slots)
+    os.environ["MAPPER_CONCURRENCY"] = str(llm_slots)
+    try:
+        limits = json.loads(os.getenv("LLM_MODEL_LIMITS") or "{}")
+    except json.JSONDecodeError:
+        limits = {}
+    for model in models:
+        # batch_share=1.0: the whole per-worker slot count is usable by the batch lane
+        limits[model] = dict(limits.get(model, {}), concurrency=llm_slots, batch_share=1.0)
+    os.environ["LLM_MODEL_LIMITS"] = json.dumps(limits)
+    from teacher.parser import pipeline  # noqa: F401  (import once per process)
+
+
+def _exam_outputs(out_dir: str, exam_id: str) -> Dict[str, str]:
+    return {
+        "out": f"{out_dir}/problems_{exam_id}.json",
+        "fig_out": f"{out_dir}/figures_{exam_id}.json",
+        "tbl_out": f"{out_dir}/tables_{exam_id}.json",
+    }
+
+
+def parse_exam(exam_id: str, folder: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse one exam (runs in a pool worker). Never raises; failures are reported in the summary."""
+    from teacher.parser.pipeline import build_arg_parser, run_pipeline
+
+    outputs = _exam_outputs(options["out_dir"], exam_id)
+    argv = [
+        folder,
+        exam_id,
+        "--taxonomy", options["taxonomy"],
+        "--parser-mode", options["parser_mode"],
+        "--vlm-model", options["vlm_model"],
+        "--llm-model", options["llm_model"],
+        "--assets-dir", options["assets_dir"],
+        "--out", outputs["out"],
+        "--fig-out", outputs["fig_out"],
+        "--tbl-out", outputs["tbl_out"],
+        "--bbox-padding", str(options["bbox_padding"]),
+    ]
+    annotated_pdf = Path(f"output/bbox/question_{exam_id}_annotated.pdf")
+    if annotated_pdf.exists():
+        argv.extend(["--annotated-pdf", annotated_pdf.as_posix()])
+    if options.get("with_llm"):
+        argv.append("--with-llm")
+    if options.get("refresh_vlm"):
+        argv.append("--refresh-vlm")
+
+    started = time.monotonic()
+    summary: Dict[str, Any] = {"exam_id": exam_id, "folder": folder, "pid": os.getpid(), **outputs}
+    try:
+        result = run_pipeline(build_arg_parser().parse_args(argv))
+        summary.update(status="parsed", problems=result.get("problems"), figures=result.get("figures"),
+                       tables=result.get("tables"), audio=result.get("audio"))
+    except Exception as err:
+        summary.update(status="failed", error=f"{err.__class__.__name__}: {err}")
+    summary["parse_seconds"] = round(time.monotonic() - started, 1)
+    return summary
+
+
+def parse_exams(exams: Dict[str, Dict[str, Optional[str]]], options: Dict[str, Any],
+                workers: int = BATCH_WORKERS, llm_budget: int = BATCH_LLM_BUDGET) -> List[Dict[str, Any]]:
+    workers = max(1, min(workers, len(exams)))
+    llm_slots = max(1, llm_budget // workers)
+    print(f"[batch] Parsing {len(exams)} exams with {workers} workers "
+          f"(LLM budget {llm_budget} → {llm_slots} per worker)")
+    summaries: List[Dict[str, Any]] = []
+    # spawn: workers must not inherit the parent's Neo4j driver / model state
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(llm_slots, sorted({options["vlm_model"], options["llm_model"]})),
+    ) as pool:
+        futures = {pool.submit(parse_exam, exam_id, g["folder"], options): exam_id for exam_id, g in exams.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            exam_id = futures[future]
+            try:
+                summary = future.result()
+            except Exception as err:  # worker died (e.g. OOM)
+                summary = {"exam_id": exam_id, "folder": exams[exam_id]["folder"], "status": "failed",
+                           "error": f"{err.__class__.__name__}: {err}"}
+            summaries.append(summary)
+            state = "ok" if summary["status"] == "parsed" else f"FAILED ({summary.get('error')})"
+            print(f"[batch] {done}/{len(exams)} {exam_id}: {state}")
+    order = list(exams)
+    return sorted(summaries, key=lambda s: order.index(s["exam_id"]))
+
+
+def ingest_exams(summaries: List[Dict[str, Any]], skip_embedding: bool = False, init_schema: bool = False) -> None:
+    """One batched Neo4j upload for every successfully parsed exam; fills in per-exam ingest counts."""
+    from teacher.parser.upload_problems import driver, ingest_batch
+
+    parsed = [s for s in summaries if s["status"] == "parsed"]
+    if not parsed:
+        return
+    paths = [p for s in parsed for p in (s["tbl_out"], s["fig_out"], s["out"]) if Path(p).exists()]
+    try:
+        counts = ingest_batch(paths, skip_embedding=skip_embedding, init_schema=init_schema)
+    except Exception as err:
+        for s in parsed:
+            s.update(status="ingest_failed", error=f"{err.__class__.__name__}: {err}")
+        return
+    finally:
+        driver.close()
+    for s in parsed:
+        per_exam = [counts.get(str(Path(p)), {}) for p in (s["tbl_out"], s["fig_out"], s["out"])]
+        s["ingest"] = {k: sum(c.get(k, 0) for c in per_exam) for k in ("problem", "tbl", "fig", "errors")}
+        s["status"] = "ingested" if not s["ingest"]["errors"] else "ingested_with_errors"
+
+
+def write_report(summaries: List[Dict[str, Any]], path: str, started_at: float) -> None:
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started_at)),
+        "seconds": round(time.time() - started_at, 1),
+        "exams": len(summaries),
+        "by_status": {st: sum(1 for s in summaries if s["status"] == st) for st in sorted({s["status"] for s in summaries})},
+        "results": summaries,
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n=== Batch report ({report['seconds']}s) → {path} ===")
+    for s in summaries:
+        ing = s.get("ingest") or {}
+        print(f"  {s['exam_id']:<24} {s['status']:<22} problems={s.get('problems', '-')} "
+              f"figs={s.get('figures', '-')} tbls={s.get('tables', '-')} "
+              f"neo4j={ing.get('problem', '-')}/{ing.get('errors', '-')}err "
+              f"{s.get('parse_seconds', '-')}s" + (f"  {s['error']}" if s.get("error") else ""))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parse and ingest every exam under a directory tree")
+    ap.add_argument("root", help="Directory scanned recursively for question_/answer_/solution_/audio_ files")
+    ap.add_argument("--exams", nargs="*", default=None, help="Only these exam ids")
+    ap.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Parallel parse processes")
+    ap.add_argument("--llm-budget", type=int, default=BATCH_LLM_BUDGET, help="Concurrent LLM requests across all workers")
+    ap.add_argument("--taxonomy", default="src/teacher/taxonomy.yaml")
+    ap.add_argument("--assets-dir", default="output/assets")
+    ap.add_argument("--out-dir", default="output")
+    ap.add_argument("--parser-mode", choices=["vlm", "docai"], default="vlm")
+    ap.add_argument("--vlm-model", default="o3")
+    ap.add_argument("--llm-model", default="o3")
+    ap.add_argument("--with-llm", action="store_true")
+    ap.add_argument("--refresh-vlm", action="store_true")
+    ap.add_argument("--bbox-padding", type=float, default=0.02)
+    ap.add_argument("--no-ingest", action="store_true", help="Parse only")
+    ap.add_argument("--skip-embedding", action="store_true")
+    ap.add_argument("--init-schema", action="store_true")
+    ap.add_argument("--report", default=None, help="Report path (default: <out-dir>/batch_report_<timestamp>.json)")
+    args = ap.parse_args()
+
+    started_at = time.time()
+    exams = discover_exams(args.root, args.exams)
+    if not exams:
+        print(f"[batch] no exams found under {args.root}")
+        return
+    print(f"[batch] Found {len(exams)} exams: {', '.join(exams)}")
+
+    options = {
+        "taxonomy": args.taxonomy,
+        "assets_dir": args.assets_dir,
+        "out_dir": args.out_dir,
+        "parser_mode": args.parser_mode,
+        "vlm_model": args.vlm_model,
+        "llm_model": args.llm_model,
+        "with_llm": args.with_llm,
+        "refresh_vlm": args.refresh_vlm,
+        "bbox_padding": args.bbox_padding,
+    }
+    summaries = parse_exams(exams, options, workers=args.workers, llm_budget=args.llm_budget)
+    if not args.no_ingest:
+        ingest_exams(summaries, skip_embedding=args.skip_embedding, init_schema=args.init_schema)
+
+    report = args.report or f"{args.out_dir}/batch_report_{time.strftime('%Y%m%d_%H%M%S', time.localtime(started_at))}.json"
+    write_report(summaries, report, started_at)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import hashlib
 import re
 from pathlib import Path
 from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import fitz  # PyMuPDF
 from google.cloud import documentai_v1 as docai
+from teacher.parser.exam_document import ExamDocument, PdfSource, exam_document, source_path
+from teacher.parser.roi_crop import crop_regions, pad_box, polygon_box
 
 # -------------------- Document AI config --------------------
 LANG_HINTS = ["ko", "en"]
@@ -28,14 +29,17 @@ def _guess_mime(path: str) -> str:
     return "application/octet-stream"
 
 # -------------------- safe page iterators --------------------
-def _iter_pdf_pages(pdf_path: str) -> Iterator[Tuple[int, fitz.Page]]:
+def _iter_pdf_pages(pdf_path: PdfSource) -> Iterator[Tuple[int, fitz.Page]]:
     """Typed iterator to keep static checkers happy."""
-    pdf = fitz.open(pdf_path)
-    try:
-        for i in range(len(pdf)):
-            yield i + 1, pdf[i]
-    finally:
-        pdf.close()
+    with exam_document(pdf_path) as pdf:
+        for pno in pdf.page_numbers():
+            yield pno, pdf.page(pno)
+
+def _iter_page_texts(pdf_path: PdfSource) -> Iterator[Tuple[int, str]]:
+    """(page_no, text) using the document's memoized page text."""
+    with exam_document(pdf_path) as pdf:
+        for pno in pdf.page_numbers():
+            yield pno, pdf.text(pno)
 
 def _iter_doc_pages(d: docai.Document) -> Iterator[Tuple[int, Any]]:
     for i, p in enumerate(getattr(d, "pages", []) or [], start=1):
@@ -43,29 +47,27 @@ def _iter_doc_pages(d: docai.Document) -> Iterator[Tuple[int, Any]]:
 
 
 def load_annotation_rois(
-    annotated_pdf_path: Optional[str],
+    annotated_pdf_path: Optional[PdfSource],
 ) -> Tuple[Dict[int, List[List[List[float]]]], Dict[int, List[List[List[float]]]]]:
     """Parse an annotated PDF produced by opendataloader to extract figure/table bounding boxes."""
     figures: Dict[int, List[List[List[float]]]] = {}
     tables: Dict[int, List[List[List[float]]]] = {}
     if not annotated_pdf_path:
         return figures, tables
-    path = Path(annotated_pdf_path)
+    path = Path(source_path(annotated_pdf_path))
     if not path.exists():
         return figures, tables
     try:
-        doc = fitz.open(path.as_posix())
+        doc = annotated_pdf_path if isinstance(annotated_pdf_path, ExamDocument) else ExamDocument(path.as_posix())
     except Exception:
         return figures, tables
     try:
-        for page_index, page in enumerate(doc, start=1):
-            width, height = page.rect.width, page.rect.height
-            annot = page.first_annot
-            while annot:
-                content = (annot.info.get("content") or "").lower()
-                rect = annot.rect
+        for page_index in doc.page_numbers():
+            width, height = doc.page_size(page_index)
+            for annot in doc.annotations(page_index):
+                content = annot["content"].lower()
+                rect = annot["rect"]
                 if not content or rect is None:
-                    annot = annot.next
                     continue
                 norm = [
                     [float(rect.x0 / width), float(rect.y0 / height)],
@@ -76,15 +78,12 @@ def load_annotation_rois(
                 area = (rect.width * rect.height) / (width * height) if width and height else 0.0
                 if "image" in content:
                     if area < 0.02:
-                        annot = annot.next
                         continue
                     figures.setdefault(page_index, []).append(norm)
                 elif "table" in content:
                     if "table cell" in content:
-                        annot = annot.next
                         continue
                     tables.setdefault(page_index, []).append(norm)
-                annot = annot.next
         for mapping in (figures, tables):
             for page_no, rois in mapping.items():
                 mapping[page_no] = sorted(
@@ -92,18 +91,16 @@ def load_annotation_rois(
                     key=lambda nv: min(pt[1] for pt in nv),
                 )
     finally:
-        doc.close()
+        if doc is not annotated_pdf_path:
+            doc.close()
     return figures, tables
 
 # 추가: 페이지 도형(사각형) 감지
-def _rects_on_page(pdf_path: str, page_no: int, min_area: float = 0.03) -> List[List[List[float]]]:
-    import fitz
-    doc = fitz.open(pdf_path)
-    try:
-        pg = doc[page_no - 1]
-        W, H = pg.rect.width, pg.rect.height
+def _rects_on_page(pdf_path: PdfSource, page_no: int, min_area: float = 0.03) -> List[List[List[float]]]:
+    with exam_document(pdf_path) as doc:
+        W, H = doc.page_size(page_no)
         out: List[List[List[float]]] = []
-        for d in pg.get_drawings():
+        for d in doc.drawings(page_no):
             r = d.get("rect")
             if not r:
                 # path로 구성된 닫힌 사각형 처리
@@ -116,8 +113,6 @@ def _rects_on_page(pdf_path: str, page_no: int, min_area: float = 0.03) -> List[
             out.append([[r.x0 / W, r.y0 / H], [r.x1 / W, r.y0 / H],
                         [r.x1 / W, r.y1 / H], [r.x0 / W, r.y1 / H]])
         return out
-    finally:
-        doc.close()
 
 def _v_overlap(a: Tuple[float, float], b: Tuple[float, float]) -> float:
     y0 = max(a[0], b[0]); y1 = min(a[1], b[1])
@@ -164,7 +159,7 @@ def _match_question(range_map: Dict[int, Tuple[int, float, float]], page: int, s
 def detect_figures(
     doc: docai.Document,
     exam_id_base: str,
-    pdf_path: str,
+    pdf_path: PdfSource,
     annotated_figures: Optional[Dict[int, List[List[List[float]]]]] = None,
 ) -> List[Dict[str, Any]]:
     figs: List[Dict[str, Any]] = []
@@ -183,8 +178,9 @@ def detect_figures(
 
     # 2) 각 페이지의 큰 사각형(테두리 상자) 수집
     page_rects: Dict[int, List[List[List[float]]]] = {}
-    for i in doc_pages.keys():
-        page_rects[i] = _rects_on_page(pdf_path, i, min_area=0.04)
+    with exam_document(pdf_path) as pdf:
+        for i in doc_pages.keys():
+            page_rects[i] = _rects_on_page(pdf, i, min_area=0.04)
 
     def _append_figure(no: Optional[int], page: int, nv: List[List[float]]) -> None:
         nonlocal fcount
@@ -381,7 +377,7 @@ def _refine_type(column: str, inferred: str) -> str:
 def extract_tables(
     doc: docai.Document,
     exam_id_base: str,
-    pdf_path: str,
+    pdf_path: PdfSource,
     annotated_tables: Optional[Dict[int, List[List[List[float]]]]] = None,
 ) -> List[Dict[str,Any]]:
     tbls: List[Dict[str,Any]] = []
@@ -426,15 +422,14 @@ def extract_tables(
                 "types": _infer_column_types(rows, columns),
                 "rows": rows,
                 "option_row_map": {labels[i]: i for i in range(len(labels))} if labels else {},
-                "source": {"file": str(pdf_path), "page": pi, "bbox_norm": nv},
+                "source": {"file": source_path(pdf_path), "page": pi, "bbox_norm": nv},
                 "storage_key": None,
                 "public_url": None,
                 "local_path": None
             })
     # fallback: text pattern (e.g., Sports Bags)
     if not tbls:
-        for pno, pg in _iter_pdf_pages(pdf_path):
-            txt = pg.get_text("text")  # type: ignore[attr-defined]
+        for pno, txt in _iter_page_texts(pdf_path):
             if "Sports Bags" in txt and "Model" in txt and "Water-resistant" in txt:
                 rows = []
                 rx = re.compile(r"^\s*[①-⑤]\s*([A-E])\s*\$?(\d+)\s+(Small|Medium|Large)\s+(\d+)\s+([◯○O]|[✗xX×])", re.M)
@@ -466,15 +461,14 @@ def extract_tables(
                         "types": types_map,
                         "rows": rows,
                         "option_row_map": {label: idx for idx, label in enumerate(["①","②","③","④","⑤"][:len(rows)])},
-                        "source": {"file": str(pdf_path), "page": pno, "bbox_norm": nv},
+                        "source": {"file": source_path(pdf_path), "page": pno, "bbox_norm": nv},
                         "storage_key": None,
                         "public_url": None,
                         "local_path": None
                     })
     # fallback: Under the Sea Mascot Contest (problem 28)
     if not any(t.get("problem_id") == f"{exam_id_base}-0028" for t in tbls):
-        for pno, pg in _iter_pdf_pages(pdf_path):
-            txt = pg.get_text("text")  # type: ignore[attr-defined]
+        for pno, txt in _iter_page_texts(pdf_path):
             if "Under the Sea Mascot Contest" in txt and "1st prize" in txt and "2nd prize" in txt:
                 # Extract prize table
                 rows = []
@@ -515,7 +509,7 @@ def extract_tables(
                         "types": types_map,
                         "rows": rows,
                         "option_row_map": {},
-                        "source": {"file": str(pdf_path), "page": pno, "bbox_norm": nv},
+                        "source": {"file": source_path(pdf_path), "page": pno, "bbox_norm": nv},
                         "storage_key": None,
                         "public_url": None,
                         "local_path": None
@@ -564,76 +558,63 @@ def extract_tables(
                         tbl["problem_id"] = f"{exam_id_base}-{match_no:04d}"
     return tbls
 
-def save_roi_pngs(pdf_path: str, figures: List[Dict[str,Any]], tables: List[Dict[str,Any]], out_dir: Optional[str], padding: float = 0.02) -> None:
+def save_roi_pngs(pdf_path: PdfSource, figures: List[Dict[str,Any]], tables: List[Dict[str,Any]], out_dir: Optional[str], padding: float = 0.02) -> None:
     """
     Save ROI PNGs with optional padding to avoid clipping.
+    Each page is rendered once (200 dpi) and all of its figure/table crops are sliced from it.
 
     Args:
         padding: Padding to add to each side as a fraction of page dimensions (default: 0.02 = 2%)
     """
     if not out_dir: return
     Path(out_dir).mkdir(parents=True, exist_ok=True)
-    def _clip(page: fitz.Page, nv: List[List[float]]) -> fitz.Rect:
-        xs = [x for x,_ in nv]; ys = [y for _,y in nv]
-        # Add padding (2% of page size by default) to avoid clipping
-        x_pad = padding
-        y_pad = padding
-        x0 = max(0.0, min(xs) - x_pad)
-        y0 = max(0.0, min(ys) - y_pad)
-        x1 = min(1.0, max(xs) + x_pad)
-        y1 = min(1.0, max(ys) + y_pad)
-        return fitz.Rect(x0*page.rect.width, y0*page.rect.height,
-                         x1*page.rect.width, y1*page.rect.height)
-    pdf = fitz.open(pdf_path)
-    try:
-        for idx, f in enumerate(figures):
-            nv = f.get("bbox_norm")
+    jobs: List[Dict[str, Any]] = []
+    owners: List[Tuple[str, int, Dict[str, Any]]] = []
+    for kind, assets in (("figure", figures), ("table", tables)):
+        for idx, a in enumerate(assets):
+            src = a if kind == "figure" else a["source"]
+            nv = src.get("bbox_norm")
             if not nv or not isinstance(nv, list):
-                print(f"[warn] Skipping figure {idx} ({f.get('problem_id')}): bbox is not a valid list")
+                print(f"[warn] Skipping {kind} {idx} ({a.get('problem_id')}): bbox is not a valid list")
                 continue
             if not all(isinstance(pt, (list, tuple)) and len(pt) == 2 for pt in nv):
-                print(f"[warn] Skipping figure {idx} ({f.get('problem_id')}): bbox points are invalid")
+                print(f"[warn] Skipping {kind} {idx} ({a.get('problem_id')}): bbox points are invalid")
                 continue
-            try:
-                page = pdf[f["page"]-1]
-                pix = page.get_pixmap(clip=_clip(page, nv), dpi=200)
-                p = Path(out_dir)/f"{f['asset_id']}.png"
-                pix.save(p.as_posix())
-                f["local_path"] = p.as_posix()
-                try:
-                    f["hash"] = hashlib.sha1(pix.tobytes()).hexdigest()[:16]
-                except Exception:
-                    f["hash"] = None
-            except Exception as e:
-                print(f"[warn] Failed to generate PNG for figure {idx} ({f.get('problem_id')}): {e}")
-        for idx, t in enumerate(tables):
-            nv = t["source"].get("bbox_norm")
-            if not nv or not isinstance(nv, list):
-                print(f"[warn] Skipping table {idx} ({t.get('problem_id')}): bbox is not a valid list")
-                continue
-            if not all(isinstance(pt, (list, tuple)) and len(pt) == 2 for pt in nv):
-                print(f"[warn] Skipping table {idx} ({t.get('problem_id')}): bbox points are invalid")
+            if not src.get("page"):
+                print(f"[warn] Skipping {kind} {idx} ({a.get('problem_id')}): page is missing")
                 continue
-            try:
-                page = pdf[t["source"]["page"]-1]
-                pix = page.get_pixmap(clip=_clip(page, nv), dpi=200)
-                p = Path(out_dir)/f"{t['table_id']}.png"
-                pix.save(p.as_posix())
-                t["local_path"] = p.as_posix()
-            except Exception as e:
-                print(f"[warn] Failed to generate PNG for table {idx} ({t.get('problem_id')}): {e}")
-    finally:
-        pdf.close()
+            name = a["asset_id"] if kind == "figure" else a["table_id"]
+            jobs.append({
+                "page": int(src["page"]),
+                "box": pad_box(polygon_box(nv), padding),
+                "out_path": (Path(out_dir)/f"{name}.png").as_posix(),
+            })
+            owners.append((kind, idx, a))
+    results = crop_regions(pdf_path, jobs, dpi=200)
+    for (kind, idx, a), res in zip(owners, results):
+        if res is None:
+            print(f"[warn] Failed to generate PNG for {kind} {idx} ({a.get('problem_id')})")
+            continue
+        a["local_path"] = res["path"]
+        if kind == "figure":
+            a["hash"] = res["hash"]
 
 # -------------------- helpers --------------------
-def find_qno_positions(pdf_path: str) -> Dict[int, Dict[str, float]]:
+def find_qno_positions(pdf_path: PdfSource) -> Dict[int, Dict[str, float]]:
+    with exam_document(pdf_path) as doc:
+        return dict(doc.memo("qno_positions", lambda: _scan_qno_positions(doc)))
+
+def _scan_qno_positions(doc: ExamDocument) -> Dict[int, Dict[str, float]]:
+    # Match "n." / "n)" against the memoized words (first occurrence in reading order,
+    # later pages win) instead of 198 page.search_for() calls per page.
     out: Dict[int, Dict[str, float]] = {}
-    for pno, pg in _iter_pdf_pages(pdf_path):
+    for pno in doc.page_numbers():
+        _, height = doc.page_size(pno)
+        words = doc.words(pno)
         for n in range(1, 100):
             for token in (f"{n}.", f"{n})"):
-                rects = pg.search_for(token)  # type: ignore[attr-defined]
-                if rects:
-                    r = rects[0]
-                    out[n] = {"page": pno, "y0": r.y0/pg.rect.height, "y1": r.y1/pg.rect.height}
+                hit = next((w for w in words if token in w[4]), None)
+                if hit:
+                    out[n] = {"page": pno, "y0": hit[1]/height, "y1": hit[3]/height}
                     break
     return out
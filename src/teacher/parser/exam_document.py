@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+ExamDocument: one open PyMuPDF document shared by every parser stage.
+
+Per-page text, words, drawings, annotations and rasters are computed on first use and
+memoized, so stages that walk the same PDF (VLM rendering, text-only parse, question
+positions, rectangle detection, ROI cropping, solution text) no longer reopen it or
+re-extract the same page content.
+
+Parser functions accept either a path or an ExamDocument (PdfSource). With a path they
+open a private document for the call, so standalone/CLI use keeps working unchanged.
+"""
+from __future__ import annotations
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+
+EXAM_DOC_RASTER_CACHE = int(os.getenv("EXAM_DOC_RASTER_CACHE", "4"))  # rasters kept per document
+
+# (x0, y0, x1, y1, word, block_no, line_no, word_no) as returned by page.get_text("words")
+Word = Tuple[float, float, float, float, str, int, int, int]
+
+
+class ExamDocument:
+    def __init__(self, path: str, raster_cache: int = EXAM_DOC_RASTER_CACHE):
+        self.path = str(path)
+        self._doc = fitz.open(self.path)
+        # PyMuPDF documents are not thread-safe; all page access goes through this lock
+        self._lock = threading.RLock()
+        self._text: Dict[int, str] = {}
+        self._words: Dict[int, List[Word]] = {}
+        self._drawings: Dict[int, List[Dict[str, Any]]] = {}
+        self._annotations: Dict[int, List[Dict[str, Any]]] = {}
+        self._rasters: "OrderedDict[Tuple[int, float, bool], fitz.Pixmap]" = OrderedDict()
+        self._raster_cache = max(0, raster_cache)
+        self._derived: Dict[str, Any] = {}
+
+    def __enter__(self) -> "ExamDocument":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"ExamDocument({self.path!r}, pages={self.page_count})"
+
+    def close(self) -> None:
+        with self._lock:
+            self._rasters.clear()
+            if not self._doc.is_closed:
+                self._doc.close()
+
+    # -------------------- pages --------------------
+    @property
+    def page_count(self) -> int:
+        return self._doc.page_count
+
+    def page_numbers(self) -> range:
+        return range(1, self.page_count + 1)
+
+    def page(self, page_no: int) -> fitz.Page:
+        """1-based page access."""
+        with self._lock:
+            return self._doc[page_no - 1]
+
+    def page_size(self, page_no: int) -> Tuple[float, float]:
+        rect = self.page(page_no).rect
+        return rect.width, rect.height
+
+    # -------------------- memoized extraction --------------------
+    def text(self, page_no: int) -> str:
+        with self._lock:
+            if page_no not in self._text:
+                self._text[page_no] = self.page(page_no).get_text("text") or ""
+            return self._text[page_no]
+
+    def full_text(self, sep: str = "\n") -> str:
+        return sep.join(self.text(n) for n in self.page_numbers())
+
+    def words(self, page_no: int) -> List[Word]:
+        with self._lock:
+            if page_no not in self._words:
+                self._words[page_no] = self.page(page_no).get_text("words")
+            return self._words[page_no]
+
+    def drawings(self, page_no: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            if page_no not in self._drawings:
+                self._drawings[page_no] = self.page(page_no).get_drawings()
+            return self._drawings[page_no]
+
+    def annotations(self, page_no: int) -> List[Dict[str, Any]]:
+        """[{"content": str, "rect": fitz.Rect}] in annotation order."""
+        with self._lock:
+            if page_no not in self._annotations:
+                out: List[Dict[str, Any]] = []
+                page = self.page(page_no)  # annots hold a weak ref; keep the page alive while walking
+                annot = page.first_annot
+                while annot:
+                    out.append({"content": annot.info.get("content") or "", "rect": annot.rect})
+                    annot = annot.next
+                self._annotations[page_no] = out
+            return self._annotations[page_no]
+
+    def raster(self, page_no: int, dpi: Optional[float] = None, zoom: Optional[float] = None,
+               grayscale: bool = False) -> fitz.Pixmap:
+        """Full-page raster at `dpi` (or explicit `zoom`), alpha-free; the last few are kept."""
+        if zoom is None:
+            zoom = (dpi or 72.0) / 72.0
+        key = (page_no, round(zoom, 4), grayscale)
+        with self._lock:
+            pix = self._rasters.get(key)
+            if pix is not None:
+                self._rasters.move_to_end(key)
+                return pix
+            colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+            pix = self.page(page_no).get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+            if self._raster_cache:
+                self._rasters[key] = pix
+                while len(self._rasters) > self._raster_cache:
+                    self._rasters.popitem(last=False)
+            return pix
+
+    def memo(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Memoize a derived, document-wide result (e.g. question number positions)."""
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = compute()
+            return self._derived[key]
+
+
+PdfSource = Union[str, ExamDocument]
+
+
+def source_path(src: PdfSource) -> str:
+    return src.path if isinstance(src, ExamDocument) else str(src)
+
+
+@contextmanager
+def exam_document(src: PdfSource) -> Iterator[ExamDocument]:
+    """Borrow `src` if it is already an ExamDocument, otherwise open (and close) one."""
+    if isinstance(src, ExamDocument):
+        yield src
+        return
+    doc = ExamDocument(src)
+    try:
+        yield doc
+    finally:
+        doc.close()
@@ -6,8 +6,10 @@ import json
 import sys
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
-from PIL import Image
-import fitz
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from teacher.parser.exam_document import PdfSource
+from teacher.parser.roi_crop import crop_regions
 
 def load_vlm_results(problems_path: str, figures_path: str, tables_path: str) -> Tuple[List[Dict], List[Dict], List[Dict]]:
     """Load VLM parsing results"""
@@ -19,8 +21,37 @@ def load_vlm_results(problems_path: str, figures_path: str, tables_path: str) ->
         tables = json.load(f)
     return problems, figures, tables
 
+def extract_assets(
+    pdf_path: PdfSource,
+    assets: List[Tuple[str, int, List[float], str]],
+    dpi: int = 150
+) -> List[str]:
+    """
+    Extract many assets at once: (label, page_num, bbox_norm, output_path) each.
+    bbox_norm: [x1, y1, x2, y2] where values are 0-1 (relative to page dimensions)
+    Each page is rendered once and every asset on it is cropped from that raster.
+    Returns the paths that were written.
+    """
+    jobs = []
+    labels = []
+    for label, page_num, bbox_norm, output_path in assets:
+        if not bbox_norm or len(bbox_norm) != 4:
+            print(f"  ⚠ {label}: Invalid bbox_norm: {bbox_norm}")
+            continue
+        jobs.append({"page": page_num, "box": tuple(bbox_norm), "out_path": output_path})
+        labels.append(label)
+    
+    written = []
+    for label, job, res in zip(labels, jobs, crop_regions(pdf_path, jobs, dpi=dpi)):
+        if res is None:
+            print(f"  ✗ {label}: extraction failed (page {job['page']}, bbox {list(job['box'])})")
+            continue
+        print(f"  ✓ {label}: {res['width']}x{res['height']} → {res['path']}")
+        written.append(res["path"])
+    return written
+
 def extract_asset_from_bbox(
-    pdf_path: str,
+    pdf_path: PdfSource,
     page_num: int,
     bbox_norm: List[float],
     output_path: str,
@@ -29,50 +60,9 @@ def extract_asset_from_bbox(
     """
     Extract asset from PDF using normalized bbox coordinates.
     bbox_norm: [x1, y1, x2, y2] where values are 0-1 (relative to page dimensions)
-    Returns True if successful.
+    Returns True if successful. Prefer extract_assets() for more than one asset.
     """
-    if not bbox_norm or len(bbox_norm) != 4:
-        print(f"  ⚠ Invalid bbox_norm: {bbox_norm}")
-        return False
-    
-    try:
-        doc = fitz.open(pdf_path)
-        page = doc[page_num - 1]
-        
-        # Get page dimensions
-        page_width = page.rect.width
-        page_height = page.rect.height
-        
-        # Convert normalized coordinates to actual pixel coordinates
-        x1_norm, y1_norm, x2_norm, y2_norm = bbox_norm
-        x1 = x1_norm * page_width
-        y1 = y1_norm * page_height
-        x2 = x2_norm * page_width
-        y2 = y2_norm * page_height
-        
-        # Create bbox for PyMuPDF
-        pdf_bbox = [x1, y1, x2, y2]
-        
-        print(f"  → Page {page_num}: {page_width:.0f}x{page_height:.0f}")
-        print(f"  → Normalized bbox: {bbox_norm}")
-        print(f"  → Actual bbox: [{x1:.1f}, {y1:.1f}, {x2:.1f}, {y2:.1f}]")
-        
-        # Extract region
-        pix = page.get_pixmap(clip=pdf_bbox, dpi=dpi)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        doc.close()
-        
-        # Save
-        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-        img.save(output_path)
-        
-        print(f"  ✓ Extracted: {img.width}x{img.height} → {output_path}")
-        return True
-        
-    except Exception as e:
-        print(f"  ✗ Extraction failed: {e}")
-        return False
+    return bool(extract_assets(pdf_path, [(Path(output_path).name, page_num, bbox_norm, output_path)], dpi))
 
 def main():
     import argparse
@@ -101,7 +91,7 @@ def main():
     
     # Extract figures
     print("\n=== Extracting figures ===")
-    extracted_files = []
+    assets: List[Tuple[str, int, List[float], str]] = []
     
     for fig in figures:
         asset_id = fig.get("asset_id") or fig.get("id")
@@ -125,12 +115,9 @@ def main():
         
         output_path = Path(args.output_dir) / filename
         
-        print(f"\nFigure {asset_id} (Problem ID: {problem_id}):")
-        if extract_asset_from_bbox(args.pdf, page_num, bbox_norm, str(output_path), args.dpi):
-            extracted_files.append(str(output_path))
+        assets.append((f"Figure {asset_id} (Problem ID: {problem_id})", page_num, bbox_norm, str(output_path)))
     
     # Extract tables
-    print("\n=== Extracting tables ===")
     
     for tbl in tables:
         table_id = tbl.get("table_id") or tbl.get("id")
@@ -154,9 +141,10 @@ def main():
         
         output_path = Path(args.output_dir) / filename
         
-        print(f"\nTable {table_id} (Problem ID: {problem_id}):")
-        if extract_asset_from_bbox(args.pdf, page_num, bbox_norm, str(output_path), args.dpi):
-            extracted_files.append(str(output_path))
+        assets.append((f"Table {table_id} (Problem ID: {problem_id})", page_num, bbox_norm, str(output_path)))
+    
+    # One render per page for all figures and tables
+    extracted_files = extract_assets(args.pdf, assets, args.dpi)
     
     # Summary
     print(f"\n=== Summary ===")
@@ -170,19 +158,15 @@ def main():
         load_dotenv()
         
         import os
-        sys.path.insert(0, str(Path(__file__).parent.parent))
-        from teacher.gcs_io import upload_public
+        sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+        from teacher.shared.gcs_io import get_uploader
         
         bucket = args.gcs_bucket or os.getenv('GCS_BUCKET', 'classmate__v1')
         print(f"  Using bucket: {bucket}")
         
-        for local_path in extracted_files:
-            dest = Path(local_path).name
-            try:
-                public_url, _ = upload_public(local_path, bucket, dest)
-                print(f"  ✓ {dest}: {public_url}")
-            except Exception as e:
-                print(f"  ✗ {dest}: {e}")
+        urls = get_uploader(bucket).upload_many((p, Path(p).name) for p in extracted_files)
+        for dest, public_url in urls.items():
+            print(f"  ✓ {dest}: {public_url}" if public_url else f"  ✗ {dest}")
 
 if __name__ == "__main__":
     main()
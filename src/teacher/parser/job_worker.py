@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Parse/ingest job worker
+
+Runs inside the API's persistent process pool (see api/services/parse_job_runner.py).
+Each worker process imports the pipeline once, keeps the Neo4j driver and the
+embedding model warm, and reports stage progress to the parent through a queue.
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+_events = None  # multiprocessing queue shared with the parent
+CANCEL_CHECK_INTERVAL_S = 1.0
+WORKER_STARTED = "worker_started"  # first event of every job: tells the parent which pid to kill on timeout
+
+
+class JobCancelled(Exception):
+    """Raised from the progress callback when the job was cancelled."""
+
+
+def init_worker(workdir: str, preload_embeddings: bool, event_queue) -> None:
+    """Process initializer: chdir to the project root and warm up heavy imports/models."""
+    global _events
+    _events = event_queue
+    os.chdir(workdir)
+
+    started = time.monotonic()
+    from teacher.parser import pipeline, upload_problems  # noqa: F401  (import once per process)
+    if preload_embeddings:
+        try:
+            from teacher.shared.embeddings import _load_model
+            _load_model()
+        except Exception as err:
+            print(f"[worker {os.getpid()}] embedding preload failed: {err}")
+    print(f"[worker {os.getpid()}] ready in {time.monotonic() - started:.1f}s")
+
+
+def warm_up() -> int:
+    """No-op task used to make the pool spawn (and initialise) its processes up front."""
+    return os.getpid()
+
+
+def _cancel_requested(cancel_db: str, job_id: str) -> bool:
+    # Read-only peek at the parent's job queue (api/services/parse_job_queue.py)
+    try:
+        conn = sqlite3.connect(cancel_db, timeout=5)
+        try:
+            row = conn.execute(
+                "SELECT cancel_requested FROM parse_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return bool(row and row[0])
+
+
+def _reporter(job_id: str, cancel_db: Optional[str] = None):
+    last_check = [0.0]
+
+    def progress(stage: str, done: int = 1, total: int = 1, message: str = "") -> None:
+        if _events is not None:
+            _events.put({
+                "job_id": job_id,
+                "stage": stage,
+                "done": done,
+                "total": total,
+                "message": message,
+                "at": time.time(),
+            })
+        # Progress callbacks are the pipeline's cancellation points
+        now = time.monotonic()
+        if cancel_db and now - last_check[0] >= CANCEL_CHECK_INTERVAL_S:
+            last_check[0] = now
+            if _cancel_requested(cancel_db, job_id):
+                raise JobCancelled(job_id)
+    return progress
+
+
+def _result_summary(path: str) -> Optional[Dict[str, Any]]:
+    import json
+    p = Path(path)
+    if not p.exists():
+        return None
+    with open(p, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {"count": len(data), "file": p.resolve().as_posix()}
+
+
+def run_parse_job(job_id: str, exam_id: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Parse one exam and ingest the result into Neo4j.
+
+    Args:
+        job_id: job identifier (progress events are tagged with it)
+        exam_id: exam id; inputs are read from input/<exam_id>/
+        options: {"ingest": bool, "refresh_vlm": bool, "bbox_padding": float, "skip_embedding": bool,
+                  "skip_parse": bool (resume from ingest), "cancel_db": path of the job queue DB}
+
+    Returns:
+        {"problems": {...}, "figures": {...}, "tables": {...}, "ingest": {...}}
+    """
+    from teacher.parser.pipeline import build_arg_parser, run_pipeline
+    from teacher.parser.upload_problems import ingest
+
+    options = options or {}
+    if _events is not None:
+        _events.put({"job_id": job_id, "stage": WORKER_STARTED, "pid": os.getpid(), "at": time.time()})
+    progress = _reporter(job_id, options.get("cancel_db"))
+
+    argv = [
+        f"input/{exam_id}",
+        exam_id,
+        "--taxonomy", "src/teacher/taxonomy.yaml",
+        "--parser-mode", "vlm",
+        "--out", f"output/problems_{exam_id}.json",
+        "--fig-out", f"output/figures_{exam_id}.json",
+        "--tbl-out", f"output/tables_{exam_id}.json",
+        "--bbox-padding", str(options.get("bbox_padding", 0.02)),
+    ]
+    annotated_pdf = Path(f"output/bbox/question_{exam_id}_annotated.pdf")
+    if annotated_pdf.exists():
+        argv.extend(["--annotated-pdf", annotated_pdf.as_posix()])
+    if options.get("refresh_vlm"):
+        argv.append("--refresh-vlm")
+    args = build_arg_parser().parse_args(argv)
+
+    if not (options.get("skip_parse") and Path(args.out).exists()):
+        run_pipeline(args, progress=progress)
+
+    results: Dict[str, Any] = {}
+    for key, path in (("problems", args.out), ("figures", args.fig_out), ("tables", args.tbl_out)):
+        summary = _result_summary(path)
+        if summary:
+            results[key] = summary
+
+    if options.get("ingest", True):
+        results["ingest"] = ingest(
+            args.out, skip_embedding=bool(options.get("skip_embedding")), progress=progress
+        )
+    return results
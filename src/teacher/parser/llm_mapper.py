@@ -1,8 +1,18 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-from typing import List, Dict, Any
-import json, re
-from openai import OpenAI  # type: ignore
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+import json, os, re, time
+from shared.services.llm_client import get_llm_client, LANE_BATCH
+
+# Batches are sized by tokens (stem + options + rationale), not by a fixed item count
+MAPPER_BATCH_TOKENS = int(os.getenv("MAPPER_BATCH_TOKENS", "6000"))
+MAPPER_MAX_BATCH_ITEMS = int(os.getenv("MAPPER_MAX_BATCH_ITEMS", "20"))
+MAPPER_CONCURRENCY = int(os.getenv("MAPPER_CONCURRENCY", "4"))
+MAPPER_OUTPUT_TOKENS_PER_ITEM = int(os.getenv("MAPPER_OUTPUT_TOKENS_PER_ITEM", "450"))
+MAPPER_REASONING_TOKENS = int(os.getenv("MAPPER_REASONING_TOKENS", "2000"))
+MAPPER_MAX_ROUNDS = int(os.getenv("MAPPER_MAX_ROUNDS", "3"))  # first pass + re-queues of missing items
 
 def _heal(opts: List[str]) -> List[str]:
     def sq(s:str)->str: return re.sub(r"[ \t\u00A0\u2000-\u200B\ufeff]+"," ", s).strip()
@@ -26,10 +36,85 @@ _SYS = (
 " Respond with valid JSON only."
 )
 
+@lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # tiktoken missing or encoding not downloadable (offline)
+        print(f"[mapper] tiktoken unavailable, estimating tokens from length: {e}")
+        return None
+
+def _count_tokens(text: str) -> int:
+    enc = _encoder()
+    return len(enc.encode(text, disallowed_special=())) if enc else len(text) // 4 + 1
+
+def _item_payload(it: Dict[str,Any]) -> Dict[str,Any]:
+    return {"item_id":it["item_id"],"no":it["no"],"stem":it["stem"],
+            "options":_heal(it.get("options",[])),
+            "answer":it.get("answer"),"rationale":it.get("rationale",""),
+            "audio_transcript":it.get("audio_transcript")}
+
+def _plan_batches(payloads: List[Dict[str,Any]], costs: Dict[str,int],
+                  budget: int, max_items: int) -> List[List[Dict[str,Any]]]:
+    """Greedy, order-preserving packing; an item larger than the budget gets its own batch."""
+    batches: List[List[Dict[str,Any]]] = []
+    cur: List[Dict[str,Any]] = []; used = 0
+    for p in payloads:
+        cost = costs[str(p["item_id"])]
+        if cur and (used + cost > budget or len(cur) >= max_items):
+            batches.append(cur); cur = []; used = 0
+        cur.append(p); used += cost
+    if cur: batches.append(cur)
+    return batches
+
+def _map_batch(cli, model: str, exam_id: str, taxonomy: Dict[str,Any],
+               batch: List[Dict[str,Any]]) -> Dict[str,Dict[str,Any]]:
+    """One mapping request. Returns item_id -> mapped item (only ids that were asked for)."""
+    payload = {"exam_id":exam_id,"taxonomy":taxonomy,"items":batch}
+    r = cli.chat.completions.create(
+        model=model,
+        messages=[{"role":"system","content":_SYS},{"role":"user","content":json.dumps(payload,ensure_ascii=False)}],
+        response_format={"type":"json_object"},
+        max_completion_tokens=MAPPER_REASONING_TOKENS + MAPPER_OUTPUT_TOKENS_PER_ITEM * len(batch),
+    )
+    asked = {str(p["item_id"]) for p in batch}
+    out: Dict[str,Dict[str,Any]] = {}
+    for it in json.loads(r.choices[0].message.content or "{}").get("items",[]):
+        iid = str(it.get("item_id")) if isinstance(it, dict) else None
+        if iid in asked and iid not in out:
+            out[iid] = it
+    return out
+
+def _finalize(it: Dict[str,Any], base: Dict[str,Any]) -> Dict[str,Any]:
+    it["item_id"] = base["item_id"]
+    it.setdefault("no", base.get("no"))  # Preserve problem number
+    it.setdefault("stem", base["stem"])
+    it["options"]=_heal(it.get("options",[]) or base.get("options",[]))
+    it.setdefault("answer", base.get("answer"))  # Preserve answer
+    if base.get("audio_transcript"): it["audio_transcript"]=base["audio_transcript"]
+    it.setdefault("area","AREA_UNKNOWN"); it.setdefault("mid_code","MID_UNKNOWN")
+    it.setdefault("grade_band","GB_UNKNOWN"); it.setdefault("cefr","A1")
+    it["difficulty"]=int(it.get("difficulty") or 1)
+    it.setdefault("type","MCQ" if len(it["options"])>=4 else "SA")
+    it.setdefault("rationale",""); it.setdefault("tags",[]); it.setdefault("features",{})
+    return it
+
+def _unmapped(base: Dict[str,Any]) -> Dict[str,Any]:
+    """An item the model never returned: keep what the parser produced (rationale, tags, ...) and fill
+    the gaps with the same defaults as the no-LLM path in the pipeline."""
+    it = dict(base)
+    if not it.get("cefr"): it["cefr"] = "B1"
+    if not it.get("difficulty"): it["difficulty"] = 3
+    return it
+
 def map_with_gpt5(exam_id: str, items_in: List[Dict[str,Any]],
-                  taxonomy: Dict[str,Any], api_key: str, model="o4-mini", batch_size=15)->List[Dict[str,Any]]:
+                  taxonomy: Dict[str,Any], api_key: str, model="o4-mini",
+                  batch_tokens: int = MAPPER_BATCH_TOKENS,
+                  concurrency: int = MAPPER_CONCURRENCY,
+                  max_batch_items: Optional[int] = None)->List[Dict[str,Any]]:
     """
-    Classify problems with o4-mini in batches to avoid token limits.
+    Classify problems with o4-mini in token-sized batches dispatched concurrently.
 
     Args:
         exam_id: Exam identifier
@@ -37,52 +122,51 @@ def map_with_gpt5(exam_id: str, items_in: List[Dict[str,Any]],
         taxonomy: Taxonomy dict with areas, mid_codes, grade_bands
         api_key: OpenAI API key
         model: Model name (default: o4-mini)
-        batch_size: Number of problems to process per batch (default: 15)
+        batch_tokens: Item token budget per request (tiktoken count of stem/options/rationale)
+        concurrency: Max batches in flight (the LLM client's batch lane caps this further)
+        max_batch_items: Hard cap on items per request (default: MAPPER_MAX_BATCH_ITEMS)
 
     Returns:
-        List of classified problems with tags and features
+        List of classified problems with tags and features, in input order.
+        Results are matched by item_id; items the model dropped are re-sent in a
+        follow-up batch, and items still missing after MAPPER_MAX_ROUNDS keep
+        their parsed fields with the unknown taxonomy defaults (cefr B1, difficulty 3).
     """
-    cli = OpenAI(api_key=api_key)
-    all_results = []
-
-    # Process in batches
-    for batch_start in range(0, len(items_in), batch_size):
-        batch_end = min(batch_start + batch_size, len(items_in))
-        batch = items_in[batch_start:batch_end]
-
-        print(f"   Processing batch {batch_start+1}-{batch_end} ({len(batch)} problems)...")
-
-        payload = {"exam_id":exam_id,"taxonomy":taxonomy,"items":[
-            {"item_id":it["item_id"],"no":it["no"],"stem":it["stem"],
-             "options":_heal(it.get("options",[])),
-             "answer":it.get("answer"),"rationale":it.get("rationale",""),
-             "audio_transcript":it.get("audio_transcript")} for it in batch]}
-
-        r = cli.chat.completions.create(
-            model=model,
-            messages=[{"role":"system","content":_SYS},{"role":"user","content":json.dumps(payload,ensure_ascii=False)}],
-            response_format={"type":"json_object"},
-            max_completion_tokens=8000  # Increase token limit for longer responses
-        )
-
-        js = json.loads(r.choices[0].message.content or "{}").get("items",[])
+    cli = get_llm_client(lane=LANE_BATCH, api_key=api_key)
+    started = time.monotonic()
+    payloads = [_item_payload(it) for it in items_in]
+    costs = {str(p["item_id"]): _count_tokens(json.dumps(p, ensure_ascii=False)) for p in payloads}
+    max_items = max_batch_items or MAPPER_MAX_BATCH_ITEMS
+    mapped: Dict[str,Dict[str,Any]] = {}
 
-        # Process batch results
-        for i,it in enumerate(js):
-            if i >= len(batch):
-                break  # Safety check
-            base = batch[i]
-            it.setdefault("item_id", base["item_id"])
-            it.setdefault("no", base.get("no"))  # Preserve problem number
-            it.setdefault("stem", base["stem"])
-            it["options"]=_heal(it.get("options",[]) or base.get("options",[]))
-            it.setdefault("answer", base.get("answer"))  # Preserve answer
-            if base.get("audio_transcript"): it["audio_transcript"]=base["audio_transcript"]
-            it.setdefault("area","AREA_UNKNOWN"); it.setdefault("mid_code","MID_UNKNOWN")
-            it.setdefault("grade_band","GB_UNKNOWN"); it.setdefault("cefr","A1")
-            it["difficulty"]=int(it.get("difficulty") or 1)
-            it.setdefault("type","MCQ" if len(it["options"])>=4 else "SA")
-            it.setdefault("rationale",""); it.setdefault("tags",[]); it.setdefault("features",{})
-            all_results.append(it)
+    pending = payloads
+    for round_no in range(1, MAPPER_MAX_ROUNDS + 1):
+        if not pending:
+            break
+        # Re-queued items go out in smaller batches: a dropped item is often a truncated response
+        batches = _plan_batches(pending, costs, batch_tokens // round_no, max(1, max_items // round_no))
+        print(f"   Round {round_no}: {len(pending)} problems in {len(batches)} batches "
+              f"(≤{batch_tokens // round_no} tokens, {min(concurrency, len(batches))} concurrent)...")
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches))),
+                                thread_name_prefix="tax-map") as pool:
+            futures = {pool.submit(_map_batch, cli, model, exam_id, taxonomy, b): b for b in batches}
+            for fut in as_completed(futures):
+                batch = futures[fut]
+                try:
+                    got = fut.result()
+                except Exception as e:
+                    print(f"   [warn] batch of {len(batch)} failed: {e}")
+                    continue
+                mapped.update(got)
+                if len(got) < len(batch):
+                    print(f"   [warn] batch returned {len(got)}/{len(batch)} items; re-queueing the rest")
+        pending = [p for p in pending if str(p["item_id"]) not in mapped]
 
-    return all_results
+    if pending:
+        print(f"   [warn] {len(pending)} problems unmapped after {MAPPER_MAX_ROUNDS} rounds: "
+              f"{', '.join(str(p['item_id']) for p in pending)}")
+    print(f"   Mapped {len(mapped)}/{len(items_in)} problems in {time.monotonic() - started:.1f}s")
+    return [
+        _finalize(dict(mapped[str(it["item_id"])]) if str(it["item_id"]) in mapped else _unmapped(it), it)
+        for it in items_in
+    ]
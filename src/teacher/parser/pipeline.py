@@ -18,8 +18,10 @@ except ImportError:
     pass  # dotenv not installed, assume env vars are set
 
 import argparse, json, yaml, os
-from typing import List, Optional, Dict, Any, Tuple
+from typing import Callable, List, Optional, Dict, Any, Tuple
 import unicodedata
+from contextlib import ExitStack
+from dataclasses import dataclass, field
 from teacher.shared.config import load
 from teacher.parser.docai_utils import (
     process_file, doc_text, split_items_by_number,
@@ -27,7 +29,9 @@ from teacher.parser.docai_utils import (
 )
 from teacher.parser.answer_solution import parse_answer_any, parse_solution
 from teacher.parser.llm_mapper import map_with_gpt5
-from teacher.shared.gcs_io import upload_public
+from teacher.shared.gcs_io import GCS_BACKEND, get_uploader
+from teacher.parser.exam_document import ExamDocument, PdfSource, source_path
+from teacher.parser.stages import Stage, StageRunner, file_digest, json_digest
 from teacher.parser.vlm_utils import (
     parse_questions_text_only,
     vlm_parse_exam,
@@ -37,6 +41,16 @@ from teacher.parser.vlm_utils import (
     parse_solutions_text,
 )
 
+# progress(stage, done, total, message) - used by in-process job workers to report stage progress.
+# The callback may raise to abort the run (e.g. job cancellation).
+ProgressFn = Callable[[str, int, int, str], None]
+
+
+def _emit(progress: Optional[ProgressFn], stage: str, done: int = 1, total: int = 1, message: str = "") -> None:
+    if progress is not None:
+        progress(stage, done, total, message)
+
+
 def _find_first(root: Path, base: str, exts=(".pdf",".png",".jpg",".jpeg",".mp3",".m4a",".wav"))->Optional[str]:
     for ext in exts:
         p=root/f"{base}{ext}"
@@ -44,17 +58,34 @@ def _find_first(root: Path, base: str, exts=(".pdf",".png",".jpg",".jpeg",".mp3"
     return None
 
 
-def _safe_upload(local: str, bucket: Optional[str], dest: str) -> Optional[str]:
+def _start_upload(local: str, bucket: Optional[str], dest: str):
+    """Queue an upload on the shared uploader pool; resolve it with _finish_upload()."""
     if not bucket:
         return None
     try:
-        public_url, _ = upload_public(local, bucket, dest)
+        return get_uploader(bucket).submit(local, dest)
+    except Exception as err:  # pragma: no cover - misconfiguration fallback
+        print(f"[warn] GCS upload skipped ({dest}): {err}")
+        return None
+
+
+def _finish_upload(future, dest: str) -> Optional[str]:
+    if future is None:
+        return None
+    try:
+        public_url, _ = future.result()
         return public_url
     except Exception as err:  # pragma: no cover - network failure fallback
         print(f"[warn] GCS upload skipped ({dest}): {err}")
         return None
 
 
+def _asset_dest(asset: Dict[str, Any], prefix: str) -> str:
+    if asset.get("problem_id"):
+        return f"{prefix}_{asset['problem_id']}.png"
+    return Path(asset["local_path"]).name
+
+
 def _map_answer_to_option(token: Optional[str], options: List[str]) -> Optional[str]:
     if not token:
         return None
@@ -104,11 +135,11 @@ def _map_answer_to_option(token: Optional[str], options: List[str]) -> Optional[
 
 def _build_docai_items(
     cfg,
-    qpdf: str,
+    qpdf: PdfSource,
     exam_id: str,
-    annotated_pdf: Optional[str] = None,
+    annotated_pdf: Optional[PdfSource] = None,
 ) -> Tuple[List[dict], List[dict], List[dict]]:
-    doc = process_file(cfg.project, cfg.location, cfg.ocr_processor_id, qpdf)
+    doc = process_file(cfg.project, cfg.location, cfg.ocr_processor_id, source_path(qpdf))
     txt = doc_text(doc)
     items = []
     for ch in split_items_by_number(txt):
@@ -190,7 +221,7 @@ def _vlm_sanitize_text(s: Any) -> str:
 
 def _parse_exam(
     cfg,
-    qpdf: str,
+    qpdf: PdfSource,
     exam_id: str,
     parser_mode: str,
     taxonomy_data: Dict[str, Any],
@@ -199,7 +230,10 @@ def _parse_exam(
     vlm_model: str,
     vlm_max_pages: Optional[int],
     vlm_max_tokens: Optional[int],
-    annotated_pdf_path: Optional[str] = None,
+    annotated_pdf_path: Optional[PdfSource] = None,
+    refresh_vlm: bool = False,
+    progress: Optional[ProgressFn] = None,
+    failed_pages: Optional[List[int]] = None,
 ) -> Tuple[List[dict], List[dict], List[dict]]:
     parser_mode = (parser_mode or "vlm").lower()
     if parser_mode not in {"vlm", "docai"}:
@@ -222,6 +256,10 @@ def _parse_exam(
             vlm_max_pages,
             vlm_max_tokens or 2000,
             annotated_pdf_path,
+            refresh=refresh_vlm,
+            on_page=(lambda done, total: _emit(progress, "vlm_pages", done, total)) if progress else None,
+            on_render=(lambda done, total: _emit(progress, "render", done, total)) if progress else None,
+            failed_pages=failed_pages,
         )
         items = _merge_vlm_items(exam_id, base_map, vlm_items or [])
         if not items:
@@ -544,7 +582,10 @@ def _parse_exam(
     # DocAI fallback
     return _build_docai_items(cfg, qpdf, exam_id, annotated_pdf_path)
 
-def main():
+STAGE_NAMES = ["answers", "parse", "merge", "rois", "upload", "taxonomy", "save"]
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
     ap=argparse.ArgumentParser(description="DocAI→GPT-5→answer/solution→ROI PNG→mp3→JSON")
     ap.add_argument("folder"); ap.add_argument("exam_id")
     ap.add_argument("--taxonomy", default="src/teacher/taxonomy.yaml")
@@ -560,69 +601,90 @@ def main():
     ap.add_argument("--vlm-max-tokens", type=int, default=8000)
     ap.add_argument("--annotated-pdf", default=None, help="Path to annotated PDF for better text extraction")
     ap.add_argument("--bbox-padding", type=float, default=0.02, help="Padding around bboxes as fraction of page size (default: 0.02 = 2%%)")
-    args=ap.parse_args()
-
-    cfg = load()
-    root=Path(args.folder)
-    qpdf=(root/f"question_{args.exam_id}.pdf").as_posix()
-    if not Path(qpdf).exists(): raise FileNotFoundError(qpdf)
-
-    openai_key = os.getenv("OPENAI_API_KEY")
-
-    # 0) 오디오 선업로드
-    audio_local = _find_first(root, f"audio_{args.exam_id}") or _find_first(root, f"listening_{args.exam_id}")
-    audio_url=None
-    if audio_local:
-        dest=f"listening/{args.exam_id}/{Path(audio_local).name}"
-        uploaded = _safe_upload(audio_local, cfg.gcs_bucket, dest)
-        if uploaded:
-            audio_url = uploaded
-        else:
-            audio_url = Path(audio_local).resolve().as_uri()
-
-    # 선행 정답/해설 (힌트용)
+    ap.add_argument("--refresh-vlm", action="store_true", help="Ignore cached per-page VLM results and re-parse every page")
+    ap.add_argument("--from-stage", choices=STAGE_NAMES, default=None, help="Re-run this stage and every stage after it")
+    ap.add_argument("--only-stage", choices=STAGE_NAMES, default=None, help="Re-run only this stage on top of the latest upstream checkpoints")
+    return ap
+
+
+@dataclass
+class _PipelineContext:
+    args: argparse.Namespace
+    cfg: Any
+    root: Path
+    qdoc: ExamDocument
+    sdoc: Optional[ExamDocument]
+    adoc: Optional[PdfSource]
+    ans_path: Optional[str]
+    audio_local: Optional[str]
+    audio_dest: Optional[str]
+    audio_upload: Any
+    taxonomy: Dict[str, Any]
+    openai_key: Optional[str]
+    progress: Optional[ProgressFn]
+    _digests: Dict[str, Optional[str]] = field(default_factory=dict)
+
+    def digest(self, path: Optional[str]) -> Optional[str]:
+        # File digests are computed once per run and shared by every stage key
+        if path not in self._digests:
+            self._digests[path] = file_digest(path)
+        return self._digests[path]
+
+
+def _pairs(mapping: Dict[int, str]) -> List[List[Any]]:
+    return [[int(k), v] for k, v in mapping.items()]
+
+
+def _unpairs(pairs: List[List[Any]]) -> Dict[int, str]:
+    return {int(k): v for k, v in pairs}
+
+
+# 0) 선행 정답/해설 (힌트용)
+def _stage_answers(ctx: _PipelineContext, up: Dict[str, Any]) -> Dict[str, Any]:
     ans: Dict[int, str] = {}
     rats: Dict[int, str] = {}
-    sol_path=(root/f"solution_{args.exam_id}.pdf").as_posix()
-    if Path(sol_path).exists():
-        ans_txt, rats_txt = parse_solutions_text(sol_path)
+    if ctx.sdoc:
+        ans_txt, rats_txt = parse_solutions_text(ctx.sdoc)
         ans.update(ans_txt); rats.update(rats_txt)
-    ans_path = _find_first(root, f"answer_{args.exam_id}", exts=(".pdf",".png",".jpg",".jpeg"))
-    if ans_path:
-        ans.update(parse_answer_any(cfg.project, cfg.location, cfg.ocr_processor_id, ans_path))
+    if ctx.ans_path:
+        ans.update(parse_answer_any(ctx.cfg.project, ctx.cfg.location, ctx.cfg.ocr_processor_id, ctx.ans_path))
+    _emit(ctx.progress, "answer_hints", message=f"{len(ans)} answers")
+    return {"answers": _pairs(ans), "rationales": _pairs(rats)}
 
-    # 1) 문제 파싱
-    taxonomy={}
-    if Path(args.taxonomy).exists():
-        with open(args.taxonomy,"r",encoding="utf-8") as f: taxonomy=yaml.safe_load(f) or {}
-
-    # Find annotated PDF if not specified
-    annotated_pdf = args.annotated_pdf
-    if not annotated_pdf:
-        # Try to find in output/bbox
-        bbox_path = Path("output/bbox") / f"question_{args.exam_id}_annotated.pdf"
-        if bbox_path.exists():
-            annotated_pdf = bbox_path.as_posix()
-            print(f"[info] Using annotated PDF: {annotated_pdf}")
 
+# 1) 문제 파싱
+def _stage_parse(ctx: _PipelineContext, up: Dict[str, Any]) -> Dict[str, Any]:
+    args = ctx.args
+    failed_pages: List[int] = []
     items, tbls, figs = _parse_exam(
-        cfg,
-        qpdf,
+        ctx.cfg,
+        ctx.qdoc,
         args.exam_id,
         args.parser_mode,
-        taxonomy,
-        ans,
-        openai_key,
+        ctx.taxonomy,
+        _unpairs(up["answers"]["answers"]),
+        ctx.openai_key,
         args.vlm_model,
         args.vlm_max_pages,
         args.vlm_max_tokens,
-        annotated_pdf,
+        ctx.adoc,
+        refresh_vlm=args.refresh_vlm,
+        progress=ctx.progress,
+        failed_pages=failed_pages,
     )
+    if failed_pages:
+        print(f"[warn] VLM pages failed: {sorted(failed_pages)} (parse result will not be checkpointed)")
+    return {"items": items, "tables": tbls, "figures": figs, "failed_pages": sorted(failed_pages)}
+
 
-    # 2) 정답/해설(추가 보정)
-    if Path(sol_path).exists():
+# 2) 정답/해설(추가 보정)
+def _stage_merge(ctx: _PipelineContext, up: Dict[str, Any]) -> Dict[str, Any]:
+    items = up["parse"]["items"]
+    ans = _unpairs(up["answers"]["answers"])
+    rats = _unpairs(up["answers"]["rationales"])
+    if ctx.sdoc:
         try:
-            doc_ans, doc_rats = parse_solution(cfg.project, cfg.location, cfg.ocr_processor_id, sol_path)
+            doc_ans, doc_rats = parse_solution(ctx.cfg.project, ctx.cfg.location, ctx.cfg.ocr_processor_id, ctx.sdoc)
         except Exception:
             doc_ans, doc_rats = {}, {}
         if doc_ans:
@@ -637,7 +699,7 @@ def main():
             token = _vlm_sanitize_answer(it["answer"], it.get("options", []))
             it["answer"] = _map_answer_to_option(token, it.get("options", []))
 
-    base_entries = parse_questions_text_only(qpdf)
+    base_entries = parse_questions_text_only(ctx.qdoc)
     base_option_map: Dict[int, List[str]] = {
         entry["no"]: [_vlm_sanitize_text(o) for o in entry.get("options", []) if _vlm_sanitize_text(o)]
         for entry in base_entries
@@ -660,53 +722,73 @@ def main():
         if it.get("answer"):
             token = _vlm_sanitize_answer(it["answer"], it["options"])
             it["answer"] = _map_answer_to_option(token, it["options"])
+    _emit(ctx.progress, "answers_merged", message=f"{len(items)} items")
+    return {"items": items}
 
-    # 3) ROI → PNG (파일명 규칙 유지) + 필요시 GCS 업로드
+
+# 3) ROI → PNG (파일명 규칙 유지)
+def _stage_rois(ctx: _PipelineContext, up: Dict[str, Any]) -> Dict[str, Any]:
+    args = ctx.args
+    figs, tbls = up["parse"]["figures"], up["parse"]["tables"]
     print(f"[debug] Before save_roi_pngs: {len(figs)} figs, {len(tbls)} tbls")
     for idx, f in enumerate(figs):
         print(f"[debug] Fig {idx} ({f.get('problem_id')}): bbox={f.get('bbox_norm') is not None}, page={f.get('page')}")
     for idx, t in enumerate(tbls):
         print(f"[debug] Tbl {idx} ({t.get('problem_id')}): bbox={t.get('source', {}).get('bbox_norm') is not None}, page={t.get('source', {}).get('page')}")
     print(f"[info] Using bbox padding: {args.bbox_padding} ({args.bbox_padding*100:.1f}%)")
-    save_roi_pngs(qpdf, figs, tbls, args.assets_dir, padding=args.bbox_padding)
+    save_roi_pngs(ctx.qdoc, figs, tbls, args.assets_dir, padding=args.bbox_padding)
     print(f"[debug] After save_roi_pngs:")
     for idx, f in enumerate(figs):
         print(f"[debug] Fig {idx}: local_path={f.get('local_path') is not None}")
     for idx, t in enumerate(tbls):
         print(f"[debug] Tbl {idx}: local_path={t.get('local_path') is not None}")
-    for a in figs:
-        local = a.get("local_path")
-        if not local:
+    _emit(ctx.progress, "rois_saved", message=f"{len(figs)} figs, {len(tbls)} tbls")
+    return {"figures": figs, "tables": tbls}
+
+
+# 3-1) GCS 업로드 (그림/표 PNG 병렬 업로드 + 오디오 선업로드 회수)
+def _stage_upload(ctx: _PipelineContext, up: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = ctx.cfg
+    figs, tbls = up["rois"]["figures"], up["rois"]["tables"]
+    failed = 0
+    pending = []
+    for a, prefix in [(f, "image") for f in figs] + [(t, "table") for t in tbls]:
+        if not a.get("local_path"):
             continue
-        if a.get("problem_id"):
-            rel = f"image_{a['problem_id']}.png"
-        else:
-            rel = Path(local).name
-        dest = rel
-        uploaded = _safe_upload(local, cfg.gcs_bucket, dest)
+        dest = _asset_dest(a, prefix)
+        pending.append((a, dest, _start_upload(a["local_path"], cfg.gcs_bucket, dest)))
+    for a, dest, future in pending:
+        uploaded = _finish_upload(future, dest)
         if uploaded:
             a["storage_key"] = dest
             a["public_url"] = uploaded
-    for t in tbls:
-        local = t.get("local_path")
-        if not local:
-            continue
-        if t.get("problem_id"):
-            rel = f"table_{t['problem_id']}.png"
-        else:
-            rel = Path(local).name
-        dest = rel
-        uploaded = _safe_upload(local, cfg.gcs_bucket, dest)
-        if uploaded:
-            t["storage_key"] = dest
-            t["public_url"] = uploaded
-
-    # 4) taxonomy → LLM 매핑 or 폴백
+        elif future is not None:
+            failed += 1
+    audio_url = None
+    if ctx.audio_local:
+        audio_url = _finish_upload(ctx.audio_upload, ctx.audio_dest)
+        if not audio_url and ctx.audio_upload is not None:
+            failed += 1
+        audio_url = audio_url or Path(ctx.audio_local).resolve().as_uri()
+    if cfg.gcs_bucket and (pending or ctx.audio_upload):
+        get_uploader(cfg.gcs_bucket).manifest.save()
+    _emit(ctx.progress, "assets_uploaded", message=f"{failed} failed" if failed else "")
+    return {"figures": figs, "tables": tbls, "audio_url": audio_url, "failed": failed}
+
+
+# 4) taxonomy → LLM 매핑 or 폴백
+def _stage_taxonomy(ctx: _PipelineContext, up: Dict[str, Any]) -> Dict[str, Any]:
+    args = ctx.args
+    items = up["merge"]["items"]
+    audio_url = up["upload"]["audio_url"]
+    unmapped: List[str] = []
     if args.with_llm:
-        if not openai_key: raise RuntimeError("OPENAI_API_KEY 필요(--with-llm)")
+        if not ctx.openai_key: raise RuntimeError("OPENAI_API_KEY 필요(--with-llm)")
         if audio_url:
             for it in items: it["audio_transcript"]=audio_url  # LLM에 힌트 전달
-        items = map_with_gpt5(args.exam_id, items, taxonomy, openai_key, model=args.llm_model)
+        items = map_with_gpt5(args.exam_id, items, ctx.taxonomy, ctx.openai_key, model=args.llm_model)
+        # Items left unknown (dropped or in failed batches every round) keep the stage incomplete
+        unmapped = [str(it["item_id"]) for it in items if it.get("area") == "AREA_UNKNOWN"]
         # LLM 결과에서 LS만 오디오 주입(보수적으로 원하면 전체 주입)
         if audio_url:
             for it in items:
@@ -726,8 +808,15 @@ def main():
         for it in items:
             if it.get("area") == "LS" and not it.get("audio_transcript"):
                 it["audio_transcript"] = audio_url
+    return {"items": items, "unmapped": unmapped}
 
-    # 5) 저장(요구 스펙에 맞춰 구조 정리)
+
+# 5) 저장(요구 스펙에 맞춰 구조 정리)
+def _stage_save(ctx: _PipelineContext, up: Dict[str, Any]) -> Dict[str, Any]:
+    args = ctx.args
+    items = up["taxonomy"]["items"]
+    figs, tbls = up["upload"]["figures"], up["upload"]["tables"]
+    audio_url = up["upload"]["audio_url"]
     for it in items:
         it.pop("references", None)
     for a in figs:
@@ -759,6 +848,106 @@ def main():
     with open(args.fig_out,"w",encoding="utf-8") as f: json.dump(figs,f,ensure_ascii=False,indent=2)
     with open(args.tbl_out,"w",encoding="utf-8") as f: json.dump(tbls,f,ensure_ascii=False,indent=2)
     print(f"ok -> {args.out} items={len(items)} figs={len(figs)} tbls={len(tbls)} audio={'yes' if audio_url else 'no'}")
+    _emit(ctx.progress, "saved", message=args.out)
+    return {"problems": len(items), "figures": len(figs), "tables": len(tbls), "audio": bool(audio_url),
+            "files": [args.out, args.fig_out, args.tbl_out]}
+
+
+def _asset_files(out: Dict[str, Any]) -> List[str]:
+    return [a["local_path"] for a in out["figures"] + out["tables"] if a.get("local_path")]
+
+
+def _pipeline_stages() -> List[Stage]:
+    # Declared inputs are everything a stage reads besides upstream outputs
+    return [
+        Stage("answers", _stage_answers, event="answer_hints",
+              inputs=lambda c: {"solution": c.digest(c.sdoc.path if c.sdoc else None),
+                                "answer": c.digest(c.ans_path)}),
+        Stage("parse", _stage_parse, deps=("answers",), event="vlm_pages",
+              complete=lambda out: not out["failed_pages"],
+              inputs=lambda c: {"question": c.digest(c.qdoc.path),
+                                "annotated": c.digest(source_path(c.adoc)) if c.adoc else None,
+                                "taxonomy": json_digest(c.taxonomy),
+                                "parser_mode": c.args.parser_mode, "vlm_model": c.args.vlm_model,
+                                "vlm_max_pages": c.args.vlm_max_pages, "vlm_max_tokens": c.args.vlm_max_tokens}),
+        Stage("merge", _stage_merge, deps=("answers", "parse"), event="answers_merged",
+              inputs=lambda c: {"question": c.digest(c.qdoc.path),
+                                "solution": c.digest(c.sdoc.path if c.sdoc else None)}),
+        Stage("rois", _stage_rois, deps=("parse",), event="rois_saved", files=_asset_files,
+              inputs=lambda c: {"question": c.digest(c.qdoc.path), "assets_dir": c.args.assets_dir,
+                                "bbox_padding": c.args.bbox_padding}),
+        Stage("upload", _stage_upload, deps=("rois",), event="assets_uploaded",
+              complete=lambda out: not out["failed"],
+              inputs=lambda c: {"bucket": c.cfg.gcs_bucket, "audio": c.digest(c.audio_local),
+                                "audio_dest": c.audio_dest, "backend": GCS_BACKEND,
+                                "emulator": os.getenv("STORAGE_EMULATOR_HOST")}),
+        Stage("taxonomy", _stage_taxonomy, deps=("merge", "upload"),
+              complete=lambda out: not out.get("unmapped"),
+              inputs=lambda c: {"with_llm": c.args.with_llm, "llm_model": c.args.llm_model,
+                                "taxonomy": json_digest(c.taxonomy)}),
+        Stage("save", _stage_save, deps=("taxonomy", "upload"), event="saved",
+              files=lambda out: out["files"],
+              inputs=lambda c: {"out": c.args.out, "fig_out": c.args.fig_out, "tbl_out": c.args.tbl_out}),
+    ]
+
+
+def run_pipeline(args: argparse.Namespace, progress: Optional[ProgressFn] = None) -> Dict[str, Any]:
+    """Run the full parse for one exam in-process (CLI and job workers share this)."""
+    # Every input PDF is opened once (ExamDocument) and shared by all stages below
+    with ExitStack() as docs:
+        return _run_pipeline(args, docs, progress)
+
+
+def _run_pipeline(args: argparse.Namespace, docs: ExitStack, progress: Optional[ProgressFn]) -> Dict[str, Any]:
+    cfg = load()
+    root=Path(args.folder)
+    qpdf=(root/f"question_{args.exam_id}.pdf").as_posix()
+    if not Path(qpdf).exists(): raise FileNotFoundError(qpdf)
+    qdoc = docs.enter_context(ExamDocument(qpdf))
+    sol_path=(root/f"solution_{args.exam_id}.pdf").as_posix()
+    sdoc = docs.enter_context(ExamDocument(sol_path)) if Path(sol_path).exists() else None
+
+    taxonomy={}
+    if Path(args.taxonomy).exists():
+        with open(args.taxonomy,"r",encoding="utf-8") as f: taxonomy=yaml.safe_load(f) or {}
+
+    # Find annotated PDF if not specified
+    annotated_pdf = args.annotated_pdf
+    if not annotated_pdf:
+        # Try to find in output/bbox
+        bbox_path = Path("output/bbox") / f"question_{args.exam_id}_annotated.pdf"
+        if bbox_path.exists():
+            annotated_pdf = bbox_path.as_posix()
+            print(f"[info] Using annotated PDF: {annotated_pdf}")
+    adoc = docs.enter_context(ExamDocument(annotated_pdf)) if annotated_pdf and Path(annotated_pdf).exists() else annotated_pdf
+
+    # 오디오 선업로드 (백그라운드 - 파싱과 겹쳐 실행, upload 단계에서 회수; 매니페스트에 있으면 즉시 완료)
+    audio_local = _find_first(root, f"audio_{args.exam_id}") or _find_first(root, f"listening_{args.exam_id}")
+    audio_dest = f"listening/{args.exam_id}/{Path(audio_local).name}" if audio_local else None
+    audio_upload = _start_upload(audio_local, cfg.gcs_bucket, audio_dest) if audio_local else None
+
+    ctx = _PipelineContext(
+        args=args, cfg=cfg, root=root, qdoc=qdoc, sdoc=sdoc, adoc=adoc,
+        ans_path=_find_first(root, f"answer_{args.exam_id}", exts=(".pdf",".png",".jpg",".jpeg")),
+        audio_local=audio_local, audio_dest=audio_dest, audio_upload=audio_upload,
+        taxonomy=taxonomy, openai_key=os.getenv("OPENAI_API_KEY"), progress=progress,
+    )
+    runner = StageRunner(
+        _pipeline_stages(),
+        checkpoint_dir=Path("output") / args.exam_id / ".stages",
+        from_stage=args.from_stage,
+        only_stage=args.only_stage,
+        force=("parse",) if args.refresh_vlm else (),
+        on_skip=lambda stage: _emit(progress, stage.event, message="cached") if stage.event else None,
+    )
+    outputs = runner.run(ctx)
+    print(f"[stage] ran: {', '.join(runner.executed) or '-'} | up to date: {', '.join(runner.skipped) or '-'}")
+    last = runner.only_stage or "save"
+    return outputs[last] if last == "save" else {"stage": last, "outputs": outputs[last]}
+
+
+def main():
+    run_pipeline(build_arg_parser().parse_args())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Page-grouped ROI cropping.
+
+Crops (figures, tables, extracted assets) are grouped by page; each page is rendered
+once at the target DPI and every crop on it is a zero-copy NumPy slice of that raster.
+PNG/WebP encoding runs in a thread pool while the next page renders, and the content
+hash is taken from the encoded bytes that are written, so nothing is encoded twice.
+Cost scales with the number of pages rather than the number of assets.
+"""
+from __future__ import annotations
+import hashlib
+import io
+import math
+import os
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from teacher.parser.exam_document import PdfSource, exam_document
+
+ROI_ENCODE_WORKERS = int(os.getenv("ROI_ENCODE_WORKERS", "4"))
+
+# Normalized (x0, y0, x1, y1) in page fractions
+NormBox = Tuple[float, float, float, float]
+
+
+def pad_box(box: NormBox, padding: float) -> NormBox:
+    x0, y0, x1, y1 = box
+    return (max(0.0, x0 - padding), max(0.0, y0 - padding),
+            min(1.0, x1 + padding), min(1.0, y1 + padding))
+
+
+def polygon_box(nv: Sequence[Sequence[float]]) -> NormBox:
+    """4-point normalized polygon (bbox_norm) -> (x0, y0, x1, y1)."""
+    xs = [float(pt[0]) for pt in nv]; ys = [float(pt[1]) for pt in nv]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _pixel_box(box: NormBox, page_w: float, page_h: float, zoom: float, width: int, height: int) -> Tuple[int, int, int, int]:
+    # Same rounding as get_pixmap(clip=...): the clip rect is scaled and rounded outwards
+    x0, y0, x1, y1 = box
+    px0 = max(0, math.floor(x0 * page_w * zoom)); py0 = max(0, math.floor(y0 * page_h * zoom))
+    px1 = min(width, math.ceil(x1 * page_w * zoom)); py1 = min(height, math.ceil(y1 * page_h * zoom))
+    return px0, py0, px1, py1
+
+
+def _encode_and_save(pix: Any, crop: np.ndarray, out_path: str) -> Dict[str, Any]:
+    # `pix` is unused but keeps the raster (and therefore the crop view) alive until encoded
+    fmt = "WEBP" if Path(out_path).suffix.lower() == ".webp" else "PNG"
+    img = Image.fromarray(crop[:, :, 0] if crop.shape[2] == 1 else crop)
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **({"lossless": True} if fmt == "WEBP" else {}))
+    data = buf.getvalue()
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "wb") as f:
+        f.write(data)
+    return {
+        "path": Path(out_path).as_posix(),
+        "hash": hashlib.sha1(data).hexdigest()[:16],
+        "width": img.width,
+        "height": img.height,
+        "bytes": len(data),
+    }
+
+
+def crop_regions(
+    pdf: PdfSource,
+    jobs: Sequence[Dict[str, Any]],
+    dpi: int = 200,
+    workers: int = ROI_ENCODE_WORKERS,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Crop many regions with one render per page.
+
+    jobs: [{"page": 1-based page, "box": NormBox, "out_path": str}]
+    Returns one result per job ({"path", "hash", "width", "height", "bytes"}), or None
+    when that crop failed (a warning is printed; other crops still proceed).
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(jobs)
+    by_page: Dict[int, List[int]] = defaultdict(list)
+    for idx, job in enumerate(jobs):
+        by_page[int(job["page"])].append(idx)
+
+    zoom = dpi / 72.0
+    futures: List[Tuple[int, Future]] = []
+    with exam_document(pdf) as doc, ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="roi-encode") as pool:
+        for page_no in sorted(by_page):
+            try:
+                page_w, page_h = doc.page_size(page_no)
+                pix = doc.raster(page_no, zoom=zoom)
+            except Exception as err:
+                print(f"[warn] Failed to render page {page_no} for {len(by_page[page_no])} crops: {err}")
+                continue
+            # Zero-copy (H, W, C) view over the pixmap samples
+            raster = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+            raster = raster[:, : pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+            for idx in by_page[page_no]:
+                job = jobs[idx]
+                px0, py0, px1, py1 = _pixel_box(job["box"], page_w, page_h, zoom, pix.width, pix.height)
+                if px1 <= px0 or py1 <= py0:
+                    print(f"[warn] Empty crop on page {page_no}: {job['box']}")
+                    continue
+                futures.append((idx, pool.submit(_encode_and_save, pix, raster[py0:py1, px0:px1], job["out_path"])))
+        for idx, future in futures:
+            try:
+                results[idx] = future.result()
+            except Exception as err:
+                print(f"[warn] Failed to write crop {jobs[idx]['out_path']}: {err}")
+    return results
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpointed stage runner for the exam parse pipeline.
+
+Each stage declares its upstream stages (deps), its own inputs (file digests, flags) and
+returns JSON-serialisable outputs. A stage's key is the sha256 of its name, inputs and the
+*content* digest of every upstream output, so a stage is skipped only when nothing it
+reads has changed (a re-run VLM parse that yields identical output does not invalidate
+ROI export or uploads). Checkpoints live under output/<exam_id>/.stages/<stage>-<key>.json.
+
+--from-stage S re-runs S and everything after it; --only-stage S re-runs S alone on top of
+the latest upstream checkpoints.
+"""
+from __future__ import annotations
+import copy
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+STAGE_CHECKPOINTS_KEPT = 5  # per stage
+
+
+def file_digest(path: Optional[str]) -> Optional[str]:
+    if not path or not Path(path).exists():
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def json_digest(obj: Any) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[Any, Dict[str, Any]], Dict[str, Any]]          # (ctx, upstream outputs) -> outputs
+    deps: Tuple[str, ...] = ()
+    inputs: Callable[[Any], Dict[str, Any]] = lambda ctx: {}       # declared non-stage inputs
+    files: Callable[[Dict[str, Any]], Iterable[str]] = lambda out: []  # output files required for a cache hit
+    complete: Callable[[Dict[str, Any]], bool] = lambda out: True  # False -> result is used but not checkpointed
+    event: Optional[str] = None                                    # progress event emitted when skipped
+
+
+class MissingCheckpoint(RuntimeError):
+    pass
+
+
+@dataclass
+class StageRunner:
+    stages: Sequence[Stage]
+    checkpoint_dir: Path
+    from_stage: Optional[str] = None
+    only_stage: Optional[str] = None
+    force: Sequence[str] = ()
+    on_skip: Optional[Callable[[Stage], None]] = None
+    executed: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        names = [s.name for s in self.stages]
+        for flag in (self.from_stage, self.only_stage):
+            if flag and flag not in names:
+                raise ValueError(f"unknown stage {flag!r} (stages: {', '.join(names)})")
+        self.checkpoint_dir = Path(self.checkpoint_dir)
+
+    # -------------------- checkpoints --------------------
+    def _path(self, name: str, key: str) -> Path:
+        return self.checkpoint_dir / f"{name}-{key[:16]}.json"
+
+    def _load(self, name: str, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(name, key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return data["outputs"] if data.get("key") == key else None
+
+    def _load_latest(self, name: str) -> Optional[Dict[str, Any]]:
+        candidates = sorted(self.checkpoint_dir.glob(f"{name}-*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in candidates:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)["outputs"]
+            except (json.JSONDecodeError, KeyError):
+                continue
+        return None
+
+    def _save(self, name: str, key: str, inputs: Dict[str, Any], outputs: Dict[str, Any]) -> None:
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(name, key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"stage": name, "key": key, "inputs": inputs, "saved_at": time.time(), "outputs": outputs},
+                      f, ensure_ascii=False)
+        os.replace(tmp, path)
+        old = sorted(self.checkpoint_dir.glob(f"{name}-*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for stale in old[STAGE_CHECKPOINTS_KEPT:]:
+            stale.unlink(missing_ok=True)
+
+    # -------------------- execution --------------------
+    def run(self, ctx: Any) -> Dict[str, Dict[str, Any]]:
+        names = [s.name for s in self.stages]
+        from_idx = names.index(self.from_stage) if self.from_stage else None
+        only_idx = names.index(self.only_stage) if self.only_stage else None
+        outputs: Dict[str, Dict[str, Any]] = {}
+
+        for idx, stage in enumerate(self.stages):
+            if only_idx is not None and idx > only_idx:
+                break
+            inputs = stage.inputs(ctx)
+            dep_digests = {d: json_digest(outputs[d]) for d in stage.deps}
+            key = json_digest({"stage": stage.name, "inputs": inputs, "deps": dep_digests})
+
+            forced = (
+                stage.name in self.force
+                or (from_idx is not None and idx >= from_idx)
+                or idx == only_idx
+            )
+            if not forced:
+                cached = self._load(stage.name, key)
+                if cached is not None and all(Path(p).exists() for p in stage.files(cached)):
+                    outputs[stage.name] = cached
+                    self.skipped.append(stage.name)
+                    print(f"[stage] {stage.name}: up to date ({key[:12]})")
+                    if self.on_skip:
+                        self.on_skip(stage)
+                    continue
+                if only_idx is not None:
+                    # Upstream of --only-stage: fall back to the latest checkpoint even if stale
+                    latest = self._load_latest(stage.name)
+                    if latest is None:
+                        raise MissingCheckpoint(f"--only-stage {self.only_stage}: no checkpoint for {stage.name}")
+                    print(f"[stage] {stage.name}: using latest checkpoint (inputs changed)")
+                    outputs[stage.name] = latest
+                    self.skipped.append(stage.name)
+                    continue
+
+            started = time.monotonic()
+            upstream = {d: copy.deepcopy(outputs[d]) for d in stage.deps}
+            # JSON round trip so downstream stages see exactly what a checkpoint load would give
+            result = json.loads(json.dumps(stage.run(ctx, upstream), ensure_ascii=False))
+            outputs[stage.name] = result
+            self.executed.append(stage.name)
+            if stage.complete(result):
+                self._save(stage.name, key, inputs, result)
+                print(f"[stage] {stage.name}: done in {time.monotonic() - started:.1f}s ({key[:12]})")
+            else:
+                print(f"[stage] {stage.name}: incomplete after {time.monotonic() - started:.1f}s, not checkpointed")
+        return outputs
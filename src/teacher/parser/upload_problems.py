@@ -6,7 +6,7 @@ Uses Qwen3-Embedding-0.6B for text embeddings
 from __future__ import annotations
 import os, sys, json, argparse
 from pathlib import Path
-from typing import Iterator, Dict, Any, List, Union, Tuple, Optional
+from typing import Callable, Iterator, Dict, Any, List, Union, Tuple, Optional
 
 # Add src to path
 SRC = Path(__file__).resolve().parents[2]  # src/teacher/parser/upload_problems.py -> src/
@@ -258,25 +258,52 @@ def params_from_fig(obj: Dict[str, Any]) -> Dict[str, Any]:
 
 # ---------- Upserts with embeddings ----------
 
-def upsert_problem_with_embedding(sess, obj: Dict[str, Any], skip_embedding: bool = False):
-    """Upload problem with embeddings"""
-    embeddings = None
+def batch_problem_embeddings(problems: List[Dict[str, Any]], batch_size: int = 16) -> List[Dict[str, Optional[List[float]]]]:
+    """
+    search/stem/rationale embeddings for many problems with a few embed_batch calls
+    (same texts as create_searchable_embedding / embed_problem, one warm model)
+    """
+    out: List[Dict[str, Optional[List[float]]]] = [
+        {"search_embedding": None, "stem_embedding": None, "rationale_embedding": None} for _ in problems
+    ]
+    search_texts = []
+    for obj in problems:
+        options = obj.get("options", [])
+        options_text = " ".join(str(opt) for opt in options) if options else ""
+        search_texts.append(f"[{obj.get('area', '')}] [난이도 {obj.get('difficulty', '')}] {obj.get('stem', '')} {options_text}")
+    for idx, emb in enumerate(embed_batch(search_texts, max_length=512, batch_size=batch_size)):
+        out[idx]["search_embedding"] = emb
+
+    for field_name, key, max_length in (("stem", "stem_embedding", 512), ("rationale", "rationale_embedding", 1024)):
+        idxs = [i for i, obj in enumerate(problems) if obj.get(field_name)]
+        embs = embed_batch([problems[i][field_name] for i in idxs], max_length=max_length, batch_size=batch_size)
+        for i, emb in zip(idxs, embs):
+            out[i][key] = emb
+    return out
+
+def problem_embeddings(obj: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Search/stem/rationale embeddings for one problem (None if generation fails)"""
+    try:
+        print(f"  → Generating embeddings for problem {obj.get('item_id')}...", flush=True)
+        # Generate all embeddings
+        all_embeddings = embed_problem(obj)
+        # Create search embedding
+        search_emb = create_searchable_embedding(obj)
+
+        return {
+            "search_embedding": search_emb,
+            "stem_embedding": all_embeddings.get("stem_embedding"),
+            "rationale_embedding": all_embeddings.get("rationale_embedding"),
+        }
+    except Exception as e:
+        print(f"  ⚠ Embedding generation failed: {e}, continuing without embeddings", flush=True)
+        return None
 
-    if not skip_embedding:
-        try:
-            print(f"  → Generating embeddings for problem {obj.get('item_id')}...", flush=True)
-            # Generate all embeddings
-            all_embeddings = embed_problem(obj)
-            # Create search embedding
-            search_emb = create_searchable_embedding(obj)
-
-            embeddings = {
-                "search_embedding": search_emb,
-                "stem_embedding": all_embeddings.get("stem_embedding"),
-                "rationale_embedding": all_embeddings.get("rationale_embedding"),
-            }
-        except Exception as e:
-            print(f"  ⚠ Embedding generation failed: {e}, continuing without embeddings", flush=True)
+def upsert_problem_with_embedding(sess, obj: Dict[str, Any], skip_embedding: bool = False,
+                                  embeddings: Optional[Dict[str, Any]] = None):
+    """Upload problem with embeddings (precomputed `embeddings` are used as-is)"""
+    if embeddings is None and not skip_embedding:
+        embeddings = problem_embeddings(obj)
 
     res = sess.run(PROBLEM_UPSERT_WITH_EMBEDDING, **params_from_problem(obj, embeddings)).single()
 
@@ -310,7 +337,13 @@ def initialize_schema(sess):
 
 # ---------- Ingest with embeddings ----------
 
-def ingest(path: Union[str, Path], only: str = None, skip_embedding: bool = False, init_schema: bool = False):
+def ingest(
+    path: Union[str, Path],
+    only: str = None,
+    skip_embedding: bool = False,
+    init_schema: bool = False,
+    progress: Optional[Callable[[str, int, int, str], None]] = None,
+) -> Dict[str, int]:
     """
     Main ingestion function with embedding support
 
@@ -319,6 +352,10 @@ def ingest(path: Union[str, Path], only: str = None, skip_embedding: bool = Fals
         only: Force type detection (problem/tbl/fig)
         skip_embedding: Skip embedding generation (faster for testing)
         init_schema: Initialize vector indexes
+        progress: Optional callback(stage, done, total, message) for "embeddings"/"neo4j" progress
+
+    Returns:
+        Counts per record type plus "errors"
     """
     path = Path(path)
     cnt = {"problem": 0, "tbl": 0, "fig": 0}
@@ -331,32 +368,134 @@ def ingest(path: Union[str, Path], only: str = None, skip_embedding: bool = Fals
         for file_path in _iter_json_paths(path):
             print(f"\n[file] Processing {file_path.name}...", flush=True)
             try:
-                for src, obj in _records_from_file(file_path):
-                    try:
-                        kind = only or _detect(obj)
-                        if kind == "problem":
-                            upsert_problem_with_embedding(sess, obj, skip_embedding)
-                            cnt["problem"] += 1
-                        elif kind == "tbl":
-                            upsert_tbl(sess, obj)
-                            cnt["tbl"] += 1
-                        elif kind == "fig":
-                            upsert_fig(sess, obj)
-                            cnt["fig"] += 1
-                        else:
-                            raise ValueError(f"unknown record type: {kind}")
-                    except Exception as e:
-                        err += 1
-                        print(f"[ERR] {src}: {e.__class__.__name__}: {e}", file=sys.stderr, flush=True)
+                records = [(src, obj, only or _detect(obj)) for src, obj in _records_from_file(file_path)]
             except Exception as e:
                 err += 1
                 print(f"[ERR] {file_path}: {e.__class__.__name__}: {e}", file=sys.stderr, flush=True)
+                continue
+            # progress() may raise to cancel the job, so it is never called inside a try block here.
+            # Embed every problem first, then write, so "embeddings" and "neo4j" progress are sequential
+            embeddings: Dict[str, Optional[Dict[str, Any]]] = {}
+            if not skip_embedding:
+                problems = [(src, obj) for src, obj, kind in records if kind == "problem"]
+                for done, (src, obj) in enumerate(problems):
+                    if progress:
+                        progress("embeddings", done, len(problems), f"{file_path.name}: {obj.get('item_id')}")
+                    embeddings[src] = problem_embeddings(obj)
+                if progress and problems:
+                    progress("embeddings", len(problems), len(problems), file_path.name)
+            total = len(records)
+            for done, (src, obj, kind) in enumerate(records):
+                try:
+                    if kind == "problem":
+                        upsert_problem_with_embedding(sess, obj, skip_embedding=True, embeddings=embeddings.get(src))
+                        cnt["problem"] += 1
+                    elif kind == "tbl":
+                        upsert_tbl(sess, obj)
+                        cnt["tbl"] += 1
+                    elif kind == "fig":
+                        upsert_fig(sess, obj)
+                        cnt["fig"] += 1
+                    else:
+                        raise ValueError(f"unknown record type: {kind}")
+                except Exception as e:
+                    err += 1
+                    print(f"[ERR] {src}: {e.__class__.__name__}: {e}", file=sys.stderr, flush=True)
+                if progress:
+                    progress("neo4j", done + 1, total, file_path.name)
 
     print(f"\n=== Summary ===")
     print(f"Problems: {cnt['problem']}")
     print(f"Tables: {cnt['tbl']}")
     print(f"Figures: {cnt['fig']}")
     print(f"Errors: {err}")
+    return {**cnt, "errors": err}
+
+def ingest_batch(
+    paths: List[Union[str, Path]],
+    skip_embedding: bool = False,
+    init_schema: bool = False,
+    progress: Optional[Callable[[str, int, int, str], None]] = None,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Ingest many exams' JSON files in one pass (multi-exam batch ingestion)
+
+    All problems across files are embedded together with embed_batch (model loaded once),
+    then each file is written in a single transaction on one session. If a file's
+    transaction fails, that file is retried record by record so one bad record only
+    costs itself.
+
+    Returns:
+        file path -> counts per record type plus "errors"
+    """
+    files = [fp for p in paths for fp in _iter_json_paths(Path(p))]
+    records: Dict[str, List[Tuple[str, str, Dict[str, Any]]]] = {}
+    results: Dict[str, Dict[str, int]] = {}
+    for fp in files:
+        results[str(fp)] = {"problem": 0, "tbl": 0, "fig": 0, "errors": 0}
+        try:
+            records[str(fp)] = [(src, _detect(obj), obj) for src, obj in _records_from_file(fp)]
+        except Exception as e:
+            results[str(fp)]["errors"] += 1
+            print(f"[ERR] {fp}: {e.__class__.__name__}: {e}", file=sys.stderr, flush=True)
+
+    embeddings: Dict[str, Dict[str, Any]] = {}
+    if not skip_embedding:
+        problems = [(src, obj) for recs in records.values() for src, kind, obj in recs if kind == "problem"]
+        print(f"[batch] Embedding {len(problems)} problems from {len(records)} files...", flush=True)
+        if progress:
+            progress("embeddings", 0, len(problems), f"{len(problems)} problems")
+        try:
+            embs = batch_problem_embeddings([obj for _, obj in problems])
+            embeddings = {src: emb for (src, _), emb in zip(problems, embs)}
+        except Exception as e:
+            print(f"  ⚠ Batch embedding failed: {e}, continuing without embeddings", flush=True)
+        if progress:
+            progress("embeddings", len(problems), len(problems), f"{len(problems)} problems")
+
+    def _write(runner, src: str, kind: str, obj: Dict[str, Any]) -> None:
+        if kind == "problem":
+            upsert_problem_with_embedding(runner, obj, skip_embedding=True, embeddings=embeddings.get(src))
+        elif kind == "tbl":
+            upsert_tbl(runner, obj)
+        elif kind == "fig":
+            upsert_fig(runner, obj)
+        else:
+            raise ValueError(f"unknown record type: {kind}")
+
+    with driver.session(database=DB) as sess:
+        if init_schema:
+            initialize_schema(sess)
+
+        for done, (fp, recs) in enumerate(records.items(), 1):
+            cnt = results[fp]
+            print(f"\n[file] Processing {Path(fp).name} ({len(recs)} records)...", flush=True)
+            try:
+                with sess.begin_transaction() as tx:
+                    for src, kind, obj in recs:
+                        _write(tx, src, kind, obj)
+                    tx.commit()
+                for _, kind, _ in recs:
+                    cnt[kind] += 1
+            except Exception as e:
+                print(f"  ⚠ Transaction for {Path(fp).name} failed ({e}); retrying per record", flush=True)
+                for src, kind, obj in recs:
+                    try:
+                        _write(sess, src, kind, obj)
+                        cnt[kind] += 1
+                    except Exception as e:
+                        cnt["errors"] += 1
+                        print(f"[ERR] {src}: {e.__class__.__name__}: {e}", file=sys.stderr, flush=True)
+            if progress:
+                progress("neo4j", done, len(records), Path(fp).name)
+
+    total = {k: sum(c[k] for c in results.values()) for k in ("problem", "tbl", "fig", "errors")}
+    print(f"\n=== Batch Summary ({len(results)} files) ===")
+    print(f"Problems: {total['problem']}")
+    print(f"Tables: {total['tbl']}")
+    print(f"Figures: {total['fig']}")
+    print(f"Errors: {total['errors']}")
+    return results
 
 # ---------- Verification functions ----------
 
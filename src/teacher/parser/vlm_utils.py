@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import base64, json, re
-from typing import Any, Dict, List, Optional, Tuple
+import base64, hashlib, io, json, os, re, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 from pathlib import Path
 
-import fitz  # type: ignore
-from openai import OpenAI
+import numpy as np
+from PIL import Image
+from shared.services.llm_client import get_llm_client, LANE_BATCH
+from teacher.parser.exam_document import PdfSource, exam_document, source_path
 
 CHOICE_TOKEN = r"(?:10|[1-9]|[A-Ea-e]|①|②|③|④|⑤)"
 CHOICE_LINE_RE = re.compile(rf"^\s*\(?({CHOICE_TOKEN})\)?[.)]?\s*")
@@ -50,30 +53,100 @@ def _extract_response_text(resp: Any) -> str:
     return ""
 
 
-def render_pdf_pages(pdf_path: str, dpi: int = 180) -> List[Dict[str, Any]]:
-    doc = fitz.open(pdf_path)
-    pages: List[Dict[str, Any]] = []
-    try:
-        for page_no, page in enumerate(doc, start=1):  # type: ignore
-            pix = page.get_pixmap(dpi=dpi)
-            pages.append({
+# Page image encoding for the VLM. Candidates are tried and the smallest one whose
+# round-trip PSNR (vs. the uncompressed raster) stays above VLM_IMAGE_MIN_PSNR wins;
+# PNG is lossless and always passes, so it is the fallback.
+VLM_IMAGE_FORMATS = tuple(f.strip().lower() for f in os.getenv("VLM_IMAGE_FORMATS", "webp,jpeg,png").split(",") if f.strip())
+VLM_IMAGE_QUALITIES = tuple(int(q) for q in os.getenv("VLM_IMAGE_QUALITIES", "60,75,90").split(",") if q.strip())
+VLM_IMAGE_GRAYSCALE = os.getenv("VLM_IMAGE_GRAYSCALE", "false").lower() == "true"
+VLM_IMAGE_MAX_EDGE = int(os.getenv("VLM_IMAGE_MAX_EDGE", "2048"))
+VLM_IMAGE_MIN_PSNR = float(os.getenv("VLM_IMAGE_MIN_PSNR", "32"))
+
+_IMAGE_MIME = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+def _psnr(reference: np.ndarray, candidate: np.ndarray) -> float:
+    mse = float(np.mean((reference.astype(np.float32) - candidate.astype(np.float32)) ** 2))
+    if mse == 0:
+        return float("inf")
+    return 10.0 * float(np.log10(255.0 ** 2 / mse))
+
+
+def encode_page_image(
+    img: Image.Image,
+    formats: Sequence[str] = VLM_IMAGE_FORMATS,
+    qualities: Sequence[int] = VLM_IMAGE_QUALITIES,
+    min_psnr: float = VLM_IMAGE_MIN_PSNR,
+) -> Tuple[bytes, str]:
+    """Return (bytes, mime) of the smallest candidate encoding that passes the readability threshold."""
+    reference = np.asarray(img.convert("L"))
+    candidates: List[Tuple[bytes, str]] = []
+    for fmt in formats:
+        if fmt == "png":
+            buf = io.BytesIO()
+            img.save(buf, format="PNG", optimize=True)
+            candidates.append((buf.getvalue(), fmt))
+            continue
+        if fmt not in _IMAGE_MIME:
+            continue
+        for quality in qualities:
+            buf = io.BytesIO()
+            try:
+                img.save(buf, format=fmt.upper(), quality=quality)
+            except (KeyError, OSError):
+                break  # encoder not available in this Pillow build
+            candidates.append((buf.getvalue(), fmt))
+
+    candidates.sort(key=lambda c: len(c[0]))
+    for data, fmt in candidates:
+        if fmt == "png":
+            return data, _IMAGE_MIME[fmt]
+        decoded = np.asarray(Image.open(io.BytesIO(data)).convert("L"))
+        if _psnr(reference, decoded) >= min_psnr:
+            return data, _IMAGE_MIME[fmt]
+
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue(), _IMAGE_MIME["png"]
+
+
+def render_pdf_pages(
+    pdf_path: PdfSource,
+    dpi: int = 180,
+    grayscale: bool = VLM_IMAGE_GRAYSCALE,
+    max_long_edge: Optional[int] = VLM_IMAGE_MAX_EDGE,
+    formats: Sequence[str] = VLM_IMAGE_FORMATS,
+    qualities: Sequence[int] = VLM_IMAGE_QUALITIES,
+    min_psnr: float = VLM_IMAGE_MIN_PSNR,
+    max_pages: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    # Yields one page at a time so only the pages currently being sent are held in memory.
+    with exam_document(pdf_path) as doc:
+        for page_no in doc.page_numbers():
+            if max_pages is not None and page_no > max_pages:
+                break
+            zoom = dpi / 72.0
+            if max_long_edge:
+                zoom = min(zoom, max_long_edge / max(doc.page_size(page_no)))
+            pix = doc.raster(page_no, zoom=zoom, grayscale=grayscale)
+            mode = "L" if grayscale else "RGB"
+            img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+            data, mime = encode_page_image(img, formats, qualities, min_psnr)
+            yield {
                 "page": page_no,
-                "image": pix.tobytes("png"),
-                "width": pix.width,
-                "height": pix.height,
-                "text": page.get_text("text") or "",
-            })
-    finally:
-        doc.close()
-    return pages
-
-
-def parse_questions_text_only(pdf_path: str) -> List[Dict[str, Any]]:
-    doc = fitz.open(pdf_path)
+                "image": data,
+                "mime": mime,
+                "width": img.width,
+                "height": img.height,
+                "text": doc.text(page_no),
+            }
+
+
+def parse_questions_text_only(pdf_path: PdfSource) -> List[Dict[str, Any]]:
     items: List[Dict[str, Any]] = []
-    try:
-        for page_no, page in enumerate(doc, start=1):  # type: ignore
-            text = page.get_text("text") or ""
+    with exam_document(pdf_path) as doc:
+        for page_no in doc.page_numbers():
+            text = doc.text(page_no)
             if not text.strip():
                 continue
             lines = text.splitlines()
@@ -123,8 +196,6 @@ def parse_questions_text_only(pdf_path: str) -> List[Dict[str, Any]]:
                     continue
                 buffer.append(line)
             flush()
-    finally:
-        doc.close()
     deduped: Dict[int, Dict[str, Any]] = {}
     for it in items:
         if it["no"] not in deduped or not deduped[it["no"]]["options"]:
@@ -254,12 +325,9 @@ def _sanitize_answer(ans: Any, options: List[str]) -> Optional[str]:
     return None  # Could not extract valid answer
 
 
-def parse_solutions_text(path: str) -> Tuple[Dict[int, str], Dict[int, str]]:
-    doc = fitz.open(path)
-    try:
-        text = "\n".join(page.get_text("text") for page in doc)  # type: ignore
-    finally:
-        doc.close()
+def parse_solutions_text(path: PdfSource) -> Tuple[Dict[int, str], Dict[int, str]]:
+    with exam_document(path) as doc:
+        text = doc.full_text()
 
     answers: Dict[int, str] = {}
     rationales: Dict[int, str] = {}
@@ -299,46 +367,312 @@ def parse_solutions_text(path: str) -> Tuple[Dict[int, str], Dict[int, str]]:
     return answers, rationales
 
 
+VLM_SYSTEM_PROMPT = (
+    "You are an expert assessment parser. Your task is to read page images of mock CSAT English exams and "
+    "return a JSON object with keys 'items', 'tables', and 'figures'.\n"
+    "- Include every question number visible on the page.\n"
+    "- Each item must include no, stem, options (2-5), answer (ONLY the choice number/letter: ①②③④⑤ or 1-5 or A-E), rationale (if available), "
+    "difficulty (1-5), area/mid_code/grade_band (use provided lists; fall back to AREA_UNKNOWN/MID_UNKNOWN/GB_UNKNOWN), "
+    "cefr (analyze reading difficulty: A2/B1/B2/C1/C2 based on vocabulary, grammar complexity, and text length), type (MCQ when options>=4 else SA), and any references.\n"
+    "- ANSWER FORMAT: Return ONLY the choice indicator (①, ②, ③, ④, ⑤ or 1, 2, 3, 4, 5 or A, B, C, D, E). DO NOT include any explanation or text.\n"
+    "- Tables should include id, title, columns, rows (list of dicts), labels, problem_nos, and bbox_norm as an array of 4 corner points [[x1,y1],[x2,y1],[x2,y2],[x1,y2]] where x,y are 0-1 (relative to page dimensions).\n"
+    "- Figures should include id, caption, problem_nos, labels, and bbox_norm as an array of 4 corner points [[x1,y1],[x2,y1],[x2,y2],[x1,y2]] where x,y are 0-1.\n"
+    "- IMPORTANT: bbox_norm coordinates MUST be exactly 4 points forming a rectangle. Example: [[0.1,0.2],[0.9,0.2],[0.9,0.8],[0.1,0.8]] for a box from (0.1,0.2) to (0.9,0.8).\n"
+    "- Respond with valid JSON only."
+)
+
+# Bump when the user prompt template or payload handling changes in a way that invalidates cached pages
+VLM_PROMPT_VERSION = 1
+
+# Page-level concurrency for vlm_parse_exam
+VLM_CONCURRENCY = int(os.getenv("VLM_CONCURRENCY", "4"))
+VLM_PAGE_TIMEOUT_S = float(os.getenv("VLM_PAGE_TIMEOUT_S", "300"))    # one request attempt
+VLM_PAGE_DEADLINE_S = float(os.getenv("VLM_PAGE_DEADLINE_S", "600"))  # whole page, retries and fallbacks included
+# Transport errors are retried (and fall back to other models) by llm_client; this only re-asks on malformed JSON
+VLM_JSON_RETRIES = int(os.getenv("VLM_JSON_RETRIES", "1"))
+
+# Durable per-page result cache (re-running the pipeline on unchanged pages skips the API)
+VLM_CACHE_DIR = os.getenv("VLM_CACHE_DIR", "output/vlm_cache")
+
+
+def _sha256(data: Any) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def vlm_page_cache_key(image: bytes, page_text: str, model: str, taxonomy_hint: str) -> str:
+    # Answer hints are intentionally excluded: answers are overwritten from the answer key
+    # after parsing, so fixing the key must not invalidate parsed pages.
+    prompt_version = f"{VLM_PROMPT_VERSION}:{_sha256(VLM_SYSTEM_PROMPT)[:16]}"
+    parts = [_sha256(image), _sha256(page_text), model, prompt_version, _sha256(taxonomy_hint)]
+    return _sha256("|".join(parts))
+
+
+def _vlm_cache_path(cache_dir: str, key: str) -> Path:
+    return Path(cache_dir) / key[:2] / f"{key}.json"
+
+
+def _vlm_cache_get(cache_dir: Optional[str], key: str) -> Optional[Dict[str, Any]]:
+    if not cache_dir:
+        return None
+    try:
+        with open(_vlm_cache_path(cache_dir, key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _vlm_cache_put(cache_dir: Optional[str], key: str, payload: Dict[str, Any]) -> None:
+    if not cache_dir:
+        return
+    path = _vlm_cache_path(cache_dir, key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as err:
+        print(f"[vlm] cache write failed: {err}")
+
+
+def _build_user_prompt(
+    exam_id: str,
+    page: Dict[str, Any],
+    answer_hint: str,
+    taxonomy_hint: str,
+    annotated_text: Optional[str],
+) -> str:
+    # Use annotated text if available, otherwise fall back to OCR
+    if annotated_text is not None:
+        ocr_excerpt = annotated_text
+        text_source = "Cleaned OCR text from annotated PDF"
+    else:
+        ocr_excerpt = page.get("text") or ""
+        text_source = "Raw OCR text (may contain noise)"
+
+    if len(ocr_excerpt) > 8000:
+        ocr_excerpt = ocr_excerpt[:8000] + "...(truncated)"
+
+    return (
+        f"Exam ID: {exam_id}\n"
+        f"Page Number: {page['page']}\n"
+        f"Page Dimensions: {page['width']}x{page['height']} pixels\n"
+        "Hints:\n"
+        f"- Answer hints: {answer_hint}\n"
+        f"- Taxonomy: {taxonomy_hint}\n"
+        f"- {text_source}: {ocr_excerpt}\n\n"
+        "IMPORTANT Instructions:\n"
+        "1. Use the OCR text for accurate option extraction.\n"
+        "2. For questions with image-based options (like '그림에서'), describe what you see.\n"
+        "3. For EVERY table and figure, provide bbox_norm as 4 corner points [[x1,y1],[x2,y1],[x2,y2],[x1,y2]] where:\n"
+        "   - Each point [x, y] is normalized 0-1 relative to page dimensions\n"
+        "   - Points form a rectangle: top-left, top-right, bottom-right, bottom-left\n"
+        "   - Example: A table in the top-left quarter would be [[0.0,0.0],[0.5,0.0],[0.5,0.5],[0.0,0.5]]\n"
+        "4. Include problem_nos array indicating which problem numbers use this visual element.\n\n"
+        "Return JSON with keys 'items', 'tables', 'figures'."
+    )
+
+
+def _load_payload(raw: str) -> Dict[str, Any]:
+    # Strip markdown code blocks if present
+    if raw.startswith("```json"):
+        raw = raw[7:]  # Remove ```json
+    elif raw.startswith("```"):
+        raw = raw[3:]  # Remove ```
+    if raw.endswith("```"):
+        raw = raw[:-3]  # Remove closing ```
+    raw = raw.strip()
+    payload = json.loads(raw or "{}")
+    if not isinstance(payload, dict):
+        raise json.JSONDecodeError("top-level JSON is not an object", raw, 0)
+    return payload
+
+
+def _parse_page(
+    client: Any,
+    model: str,
+    page_no: int,
+    user_prompt: str,
+    data_uri: str,
+    max_output_tokens: int,
+    deadline_s: float = VLM_PAGE_DEADLINE_S,
+    json_retries: int = VLM_JSON_RETRIES,
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    # The client owns retries/backoff/fallbacks for request errors; the deadline bounds all of it,
+    # including re-asks for malformed JSON, so one stuck page can't hold a worker for long.
+    # Returns (payload, model that answered); the model differs from `model` when the client fell back.
+    client = client.with_options(deadline=time.monotonic() + deadline_s)
+    for attempt in range(json_retries + 1):
+        try:
+            resp = client.responses.create(
+                model=model,
+                input=[  # pyright: ignore[reportArgumentType]
+                    {"role": "system", "content": [{"type": "input_text", "text": VLM_SYSTEM_PROMPT}]},
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "input_text", "text": user_prompt},
+                            {"type": "input_image", "image_url": data_uri},
+                        ],
+                    },
+                ],
+                max_output_tokens=max_output_tokens,
+            )
+            raw = _extract_response_text(resp)
+            try:
+                return _load_payload(raw), client.last_model
+            except json.JSONDecodeError as err:
+                print(f"[vlm] page {page_no} JSON decode failed: {err} :: {raw[:120]!r}")
+        except Exception as err:
+            print(f"[vlm] page {page_no} request failed: {err}")
+            return None, None
+        if attempt < json_retries:
+            print(f"[vlm] page {page_no} re-asking for valid JSON ({attempt + 1}/{json_retries})")
+    return None, None
+
+
+def _collect_page(
+    payload: Dict[str, Any],
+    page_no: int,
+    pdf_path: PdfSource,
+    items: List[Dict[str, Any]],
+    tables: List[Dict[str, Any]],
+    figures: List[Dict[str, Any]],
+) -> None:
+    for itm in payload.get("items", []) or []:
+        try:
+            no = int(itm.get("no"))
+        except Exception:
+            continue
+        # Ensure options is a list
+        raw_options = itm.get("options", [])
+        if not isinstance(raw_options, list):
+            raw_options = []
+        options = [_squeeze(str(opt)) for opt in raw_options if opt and _squeeze(str(opt))]
+        items.append({
+            "no": no,
+            "page": itm.get("page") or page_no,
+            "stem": _squeeze(itm.get("stem") or ""),
+            "options": options[:5],
+            "answer": itm.get("answer"),
+            "rationale": _squeeze(itm.get("rationale") or ""),
+            "area": itm.get("area"),
+            "mid_code": itm.get("mid_code"),
+            "grade_band": itm.get("grade_band"),
+            "cefr": itm.get("cefr"),
+            "difficulty": _normalize_difficulty(itm.get("difficulty")),
+            "type": itm.get("type"),
+            "references": itm.get("references") or {},
+            "audio_transcript": itm.get("audio_transcript"),
+        })
+
+    for tbl in payload.get("tables", []) or []:
+        table_id = tbl.get("id") or tbl.get("table_id")
+        tables.append({
+            "table_id": table_id,
+            "problem_id": None,
+            "title": tbl.get("title"),
+            "columns": tbl.get("columns") or [],
+            "types": tbl.get("types") or {},
+            "rows": tbl.get("rows") or [],
+            "labels": tbl.get("labels") or [],
+            "option_row_map": tbl.get("option_row_map") or {},
+            "problem_nos": tbl.get("problem_nos") or [],
+            "source": {
+                "file": str(Path(source_path(pdf_path)).resolve()),
+                "page": tbl.get("page") or page_no,
+                "bbox_norm": tbl.get("bbox_norm"),
+            },
+            "storage_key": None,
+            "public_url": None,
+            "local_path": None,
+        })
+
+    for fig in payload.get("figures", []) or []:
+        asset_id = fig.get("id") or fig.get("asset_id")
+        figures.append({
+            "asset_id": asset_id,
+            "problem_id": None,
+            "asset_type": "figure",
+            "storage_key": None,
+            "public_url": None,
+            "mime": "image/png",
+            "page": fig.get("page") or page_no,
+            "bbox_norm": fig.get("bbox_norm"),
+            "overlay_text": [],
+            "hash": None,
+            "labels": fig.get("labels") or [],
+            "caption": fig.get("caption"),
+            "problem_nos": fig.get("problem_nos") or [],
+            "local_path": None,
+        })
+
+
+def _dedupe_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # A question spanning a page break is returned by both pages. Keep the earliest page's
+    # entry and fill empty fields / longer option lists from later pages.
+    merged: Dict[int, Dict[str, Any]] = {}
+    for itm in items:
+        no = itm["no"]
+        if no not in merged:
+            merged[no] = itm
+            continue
+        kept = merged[no]
+        for key, value in itm.items():
+            if key == "options":
+                if len(value) > len(kept["options"]):
+                    kept["options"] = value
+            elif key == "stem":
+                if len(value) > len(kept["stem"]) and kept["stem"] in value:
+                    kept["stem"] = value
+                elif value and value not in kept["stem"]:
+                    kept["stem"] = _squeeze(f"{kept['stem']} {value}")
+            elif not kept.get(key) and value:
+                kept[key] = value
+    return list(merged.values())
+
+
 def vlm_parse_exam(
     exam_id: str,
-    pdf_path: str,
+    pdf_path: PdfSource,
     answers_map: Dict[int, str],
     taxonomy: VlmTaxonomy,
     api_key: str,
     model: str,
     max_pages: Optional[int] = None,
     max_output_tokens: int = 2000,
-    annotated_pdf_path: Optional[str] = None,
+    annotated_pdf_path: Optional[PdfSource] = None,
+    concurrency: int = VLM_CONCURRENCY,
+    page_timeout_s: float = VLM_PAGE_TIMEOUT_S,
+    cache_dir: Optional[str] = VLM_CACHE_DIR,
+    refresh: bool = False,
+    on_page: Optional[Callable[[int, int], None]] = None,
+    on_render: Optional[Callable[[int, int], None]] = None,
+    failed_pages: Optional[List[int]] = None,
 ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
-    client = OpenAI(api_key=api_key)
-    pages = render_pdf_pages(pdf_path)
-    if max_pages is not None:
-        pages = pages[:max_pages]
+    # Pages are sent concurrently (up to `concurrency` in flight), so wall-clock time is bounded
+    # by the slowest page rather than the sum. Results are merged in page order regardless of
+    # completion order, then deduped by question number.
+    # Pages whose (image, text, model, prompt version, taxonomy) are unchanged are served from
+    # cache_dir unless refresh=True; refreshed results overwrite the cache.
+    # on_page(pages_done, page_total) is called as each page finishes (cached or parsed); page_total is
+    # the document's page count capped at max_pages, so the ratio is meaningful from the first page.
+    # on_render(pages_rendered, page_total) is called as each page image is ready to send.
+    # Pages that still failed after retries are left out of the result and appended to failed_pages.
+    client = get_llm_client(lane=LANE_BATCH, api_key=api_key).with_options(timeout=page_timeout_s)
 
     # Load annotated PDF text if available
     annotated_pages: Dict[int, str] = {}
-    if annotated_pdf_path and Path(annotated_pdf_path).exists():
+    if annotated_pdf_path and Path(source_path(annotated_pdf_path)).exists():
         try:
-            ann_doc = fitz.open(annotated_pdf_path)
-            for page_no, page in enumerate(ann_doc, start=1):  # type: ignore
-                annotated_pages[page_no] = page.get_text("text") or ""
-            ann_doc.close()
+            with exam_document(annotated_pdf_path) as ann_doc:
+                for page_no in ann_doc.page_numbers():
+                    annotated_pages[page_no] = ann_doc.text(page_no)
         except Exception as err:
             print(f"[vlm] Failed to load annotated PDF: {err}")
 
-    sys_prompt = (
-        "You are an expert assessment parser. Your task is to read page images of mock CSAT English exams and "
-        "return a JSON object with keys 'items', 'tables', and 'figures'.\n"
-        "- Include every question number visible on the page.\n"
-        "- Each item must include no, stem, options (2-5), answer (ONLY the choice number/letter: ①②③④⑤ or 1-5 or A-E), rationale (if available), "
-        "difficulty (1-5), area/mid_code/grade_band (use provided lists; fall back to AREA_UNKNOWN/MID_UNKNOWN/GB_UNKNOWN), "
-        "cefr (analyze reading difficulty: A2/B1/B2/C1/C2 based on vocabulary, grammar complexity, and text length), type (MCQ when options>=4 else SA), and any references.\n"
-        "- ANSWER FORMAT: Return ONLY the choice indicator (①, ②, ③, ④, ⑤ or 1, 2, 3, 4, 5 or A, B, C, D, E). DO NOT include any explanation or text.\n"
-        "- Tables should include id, title, columns, rows (list of dicts), labels, problem_nos, and bbox_norm as an array of 4 corner points [[x1,y1],[x2,y1],[x2,y2],[x1,y2]] where x,y are 0-1 (relative to page dimensions).\n"
-        "- Figures should include id, caption, problem_nos, labels, and bbox_norm as an array of 4 corner points [[x1,y1],[x2,y1],[x2,y2],[x1,y2]] where x,y are 0-1.\n"
-        "- IMPORTANT: bbox_norm coordinates MUST be exactly 4 points forming a rectangle. Example: [[0.1,0.2],[0.9,0.2],[0.9,0.8],[0.1,0.8]] for a box from (0.1,0.2) to (0.9,0.8).\n"
-        "- Respond with valid JSON only."
-    )
     answer_hint = json.dumps(answers_map, ensure_ascii=False)
     taxonomy_hint = json.dumps(
         {
@@ -349,146 +683,93 @@ def vlm_parse_exam(
         ensure_ascii=False,
     )
 
-    items: List[Dict[str, Any]] = []
-    tables: List[Dict[str, Any]] = []
-    figures: List[Dict[str, Any]] = []
-
-    for page in pages:
-        page_no = page["page"]
-        img_base64 = _encode_image(page["image"])
-        data_uri = f"data:image/png;base64,{img_base64}"
-
-        # Use annotated text if available, otherwise fall back to OCR
-        if page_no in annotated_pages:
-            ocr_excerpt = annotated_pages[page_no]
-            text_source = "Cleaned OCR text from annotated PDF"
-        else:
-            ocr_excerpt = page.get("text") or ""
-            text_source = "Raw OCR text (may contain noise)"
-
-        if len(ocr_excerpt) > 8000:
-            ocr_excerpt = ocr_excerpt[:8000] + "...(truncated)"
-
-        user_prompt = (
-            f"Exam ID: {exam_id}\n"
-            f"Page Number: {page_no}\n"
-            f"Page Dimensions: {page['width']}x{page['height']} pixels\n"
-            "Hints:\n"
-            f"- Answer hints: {answer_hint}\n"
-            f"- Taxonomy: {taxonomy_hint}\n"
-            f"- {text_source}: {ocr_excerpt}\n\n"
-            "IMPORTANT Instructions:\n"
-            "1. Use the OCR text for accurate option extraction.\n"
-            "2. For questions with image-based options (like '그림에서'), describe what you see.\n"
-            "3. For EVERY table and figure, provide bbox_norm as 4 corner points [[x1,y1],[x2,y1],[x2,y2],[x1,y2]] where:\n"
-            "   - Each point [x, y] is normalized 0-1 relative to page dimensions\n"
-            "   - Points form a rectangle: top-left, top-right, bottom-right, bottom-left\n"
-            "   - Example: A table in the top-left quarter would be [[0.0,0.0],[0.5,0.0],[0.5,0.5],[0.0,0.5]]\n"
-            "4. Include problem_nos array indicating which problem numbers use this visual element.\n\n"
-            "Return JSON with keys 'items', 'tables', 'figures'."
-        )
-        try:
-            resp = client.responses.create(
-                model=model,
-                input=[  # pyright: ignore[reportArgumentType]
-                    {"role": "system", "content": [{"type": "input_text", "text": sys_prompt}]},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "input_text", "text": user_prompt},
-                            {"type": "input_image", "image_url": data_uri},
-                        ],
-                    },
-                ],
-                max_output_tokens=max_output_tokens,
+    with exam_document(pdf_path) as doc:
+        page_total = doc.page_count
+    if max_pages is not None:
+        page_total = min(page_total, max_pages)
+
+    started = time.monotonic()
+    payloads: Dict[int, Dict[str, Any]] = {}
+    sent_bytes = 0
+    page_count = 0
+    cache_hits = 0
+    pages_done = 0
+
+    def _page_finished() -> None:
+        nonlocal pages_done
+        pages_done += 1
+        if on_page:
+            on_page(pages_done, page_total)
+
+    def _drain(pending: Dict[Any, Tuple[int, str]], block_until: int) -> None:
+        # Collect finished pages until at most `block_until` requests are still in flight
+        while len(pending) > block_until:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                page_no, cache_key = pending.pop(future)
+                payload, answered_by = future.result()
+                if payload is None:
+                    print(f"[vlm] page {page_no} skipped (request failed or invalid JSON)")
+                    if failed_pages is not None:
+                        failed_pages.append(page_no)
+                else:
+                    payloads[page_no] = payload
+                    # The key names the requested model; a fallback model's answer is used but not cached
+                    if answered_by == model:
+                        _vlm_cache_put(cache_dir, cache_key, payload)
+                    else:
+                        print(f"[vlm] page {page_no} answered by fallback {answered_by}; not cached")
+                    print(f"[vlm] page {page_no} parsed ({len(payloads)}/{page_total}, "
+                          f"{time.monotonic() - started:.1f}s)")
+                _page_finished()
+
+    workers = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vlm-page") as pool:
+        pending: Dict[Any, Tuple[int, str]] = {}
+        # Pages are rendered lazily; at most `workers` encoded pages wait in the queue
+        for page in render_pdf_pages(pdf_path, max_pages=max_pages):
+            page_no = page["page"]
+            page_count += 1
+            if on_render:
+                on_render(page_count, page_total)
+            annotated_text = annotated_pages.get(page_no)
+            cache_key = vlm_page_cache_key(
+                page["image"],
+                annotated_text if annotated_text is not None else page.get("text") or "",
+                model,
+                taxonomy_hint,
             )
-        except Exception as err:
-            print(f"[vlm] page {page_no} request failed: {err}")
-            continue
-
-        raw = _extract_response_text(resp)
+            if not refresh:
+                cached = _vlm_cache_get(cache_dir, cache_key)
+                if cached is not None:
+                    payloads[page_no] = cached
+                    cache_hits += 1
+                    print(f"[vlm] page {page_no} cache hit")
+                    _page_finished()
+                    continue
+            sent_bytes += len(page["image"])
+            data_uri = f"data:{page['mime']};base64,{_encode_image(page.pop('image'))}"
+            user_prompt = _build_user_prompt(
+                exam_id, page, answer_hint, taxonomy_hint, annotated_text
+            )
+            future = pool.submit(
+                _parse_page, client, model, page_no, user_prompt, data_uri, max_output_tokens
+            )
+            pending[future] = (page_no, cache_key)
+            del data_uri
+            _drain(pending, block_until=workers * 2 - 1)
+        _drain(pending, block_until=0)
 
-        # Strip markdown code blocks if present
-        if raw.startswith("```json"):
-            raw = raw[7:]  # Remove ```json
-        elif raw.startswith("```"):
-            raw = raw[3:]  # Remove ```
-        if raw.endswith("```"):
-            raw = raw[:-3]  # Remove closing ```
-        raw = raw.strip()
+    sent_pages = page_count - cache_hits
+    if page_count:
+        print(f"[vlm] {page_count} pages ({cache_hits} cached), {sent_bytes / 1024:.0f}KB images sent "
+              f"({sent_bytes / max(1, sent_pages) / 1024:.0f}KB/page), {time.monotonic() - started:.1f}s")
 
-        try:
-            payload = json.loads(raw or "{}")
-        except json.JSONDecodeError as err:
-            print(f"[vlm] page {page_no} JSON decode failed: {err} :: {raw[:120]!r}")
-            continue
+    items: List[Dict[str, Any]] = []
+    tables: List[Dict[str, Any]] = []
+    figures: List[Dict[str, Any]] = []
+    # Merge in page order so the output is deterministic
+    for page_no in sorted(payloads):
+        _collect_page(payloads[page_no], page_no, pdf_path, items, tables, figures)
 
-        for itm in payload.get("items", []) or []:
-            try:
-                no = int(itm.get("no"))
-            except Exception:
-                continue
-            # Ensure options is a list
-            raw_options = itm.get("options", [])
-            if not isinstance(raw_options, list):
-                raw_options = []
-            options = [_squeeze(str(opt)) for opt in raw_options if opt and _squeeze(str(opt))]
-            items.append({
-                "no": no,
-                "page": itm.get("page") or page_no,
-                "stem": _squeeze(itm.get("stem") or ""),
-                "options": options[:5],
-                "answer": itm.get("answer"),
-                "rationale": _squeeze(itm.get("rationale") or ""),
-                "area": itm.get("area"),
-                "mid_code": itm.get("mid_code"),
-                "grade_band": itm.get("grade_band"),
-                "cefr": itm.get("cefr"),
-                "difficulty": _normalize_difficulty(itm.get("difficulty")),
-                "type": itm.get("type"),
-                "references": itm.get("references") or {},
-                "audio_transcript": itm.get("audio_transcript"),
-            })
-
-        for tbl in payload.get("tables", []) or []:
-            table_id = tbl.get("id") or tbl.get("table_id")
-            tables.append({
-                "table_id": table_id,
-                "problem_id": None,
-                "title": tbl.get("title"),
-                "columns": tbl.get("columns") or [],
-                "types": tbl.get("types") or {},
-                "rows": tbl.get("rows") or [],
-                "labels": tbl.get("labels") or [],
-                "option_row_map": tbl.get("option_row_map") or {},
-                "problem_nos": tbl.get("problem_nos") or [],
-                "source": {
-                    "file": str(Path(pdf_path).resolve()),
-                    "page": tbl.get("page") or page_no,
-                    "bbox_norm": tbl.get("bbox_norm"),
-                },
-                "storage_key": None,
-                "public_url": None,
-                "local_path": None,
-            })
-
-        for fig in payload.get("figures", []) or []:
-            asset_id = fig.get("id") or fig.get("asset_id")
-            figures.append({
-                "asset_id": asset_id,
-                "problem_id": None,
-                "asset_type": "figure",
-                "storage_key": None,
-                "public_url": None,
-                "mime": "image/png",
-                "page": fig.get("page") or page_no,
-                "bbox_norm": fig.get("bbox_norm"),
-                "overlay_text": [],
-                "hash": None,
-                "labels": fig.get("labels") or [],
-                "caption": fig.get("caption"),
-                "problem_nos": fig.get("problem_nos") or [],
-                "local_path": None,
-            })
-
-    return items, tables, figures
+    return _dedupe_items(items), tables, figures
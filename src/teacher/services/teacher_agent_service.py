@@ -7,7 +7,6 @@ from __future__ import annotations
 import os
 import json
 from typing import List, Dict, Any, Optional
-from openai import OpenAI
 from shared.services import (
     get_graph_rag_service,
     get_dictionary_service,
@@ -16,6 +15,8 @@ from shared.services import (
     get_grammar_check_service
 )
 from shared.prompts import PromptManager
+from shared.services.llm_client import get_llm_client
+from shared.services.model_escalation import ModelEscalator
 
 
 # ANSI 색상 코드
@@ -72,7 +73,8 @@ class TeacherAgentService:
     def __init__(self):
         """초기화"""
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=self.openai_api_key)
+        self.client = get_llm_client(api_key=self.openai_api_key)
+        self.escalator = ModelEscalator(self.client)
         self.graph_rag_service = get_graph_rag_service()
 
         # Function definitions
@@ -447,6 +449,37 @@ Respond with ONLY "intelligence" or "reasoning".'''
                     }
                 }
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "get_score_trend",
+                    "description": "학생 또는 반의 영역별 점수 추이를 조회합니다 (예: '최근 한 달 독해 추이', 'C-01반 문법 점수 변화'). 학생은 변화량/주당 기울기/반 내 백분위, 반은 중앙값·백분위 밴드와 많이 오르거나 떨어진 학생",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "student_id": {
+                                "type": "string",
+                                "description": "학생 ID (학생 추이 조회 시)"
+                            },
+                            "class_id": {
+                                "type": "string",
+                                "description": "반 ID (반 추이 조회 시)"
+                            },
+                            "area": {
+                                "type": "string",
+                                "description": "영역 (생략 시 전체)",
+                                "enum": ["독해", "문법", "어휘", "듣기", "쓰기"]
+                            },
+                            "weeks": {
+                                "type": "integer",
+                                "description": "조회 기간 (주, 기본 4주 = 최근 한 달)",
+                                "default": 4
+                            }
+                        },
+                        "required": []
+                    }
+                }
+            },
             {
                 "type": "function",
                 "function": {
@@ -529,21 +562,12 @@ Respond with ONLY "intelligence" or "reasoning".'''
     def _get_my_class_students(self, teacher_id: str, include_details: bool = False) -> str:
         """자기반 학생 조회"""
         try:
-            # Neo4j에서 선생님의 반 정보 조회
-            from pathlib import Path
-
-            # 1. teachers.json에서 담당 반 조회
-            teachers_file = Path("/home/sh/projects/ClassMate/data/json/teachers.json")
-            with open(teachers_file, "r", encoding="utf-8") as f:
-                teachers_data = json.load(f)
-
-            assigned_classes = []
-            teacher_name = None
-            for teacher in teachers_data:
-                if teacher["teacher_id"] == teacher_id:
-                    assigned_classes = teacher["assigned_classes"]
-                    teacher_name = teacher["name"]
-                    break
+            # 1. teachers.json에서 담당 반 조회 (teacher_id 인덱스)
+            from shared.services.roster_store import get_roster_store
+
+            teacher = get_roster_store().get_teacher(teacher_id) or {}
+            assigned_classes = teacher.get("assigned_classes") or []
+            teacher_name = teacher.get("name")
 
             if not assigned_classes:
                 return f"선생님 {teacher_id}의 담당 반 정보를 찾을 수 없습니다."
@@ -717,6 +741,51 @@ Respond with ONLY "intelligence" or "reasoning".'''
         except Exception as e:
             return f"학생 정보 조회 실패: {str(e)}"
 
+    def _get_score_trend(
+        self,
+        student_id: Optional[str] = None,
+        class_id: Optional[str] = None,
+        area: Optional[str] = None,
+        weeks: int = 4
+    ) -> str:
+        """점수 추이 조회 (score_history 저장소, 명단 전체를 읽지 않음)"""
+        try:
+            from shared.services.score_history_store import get_score_history_store, AREA_LABELS
+
+            store = get_score_history_store()
+            if student_id:
+                return store.describe_trend(student_id, area=area, days=weeks * 7)
+            if not class_id:
+                return "학생 ID 또는 반 ID를 지정해주세요."
+
+            bands = store.class_bands(class_id, area=area, days=weeks * 7, step_days=max(1, weeks * 7))
+            if not bands["students"]:
+                return f"반 {class_id}의 점수 기록이 없습니다."
+            deltas = store.deltas(weeks=weeks, area=area, class_id=class_id)
+
+            response = f"**{class_id}반 최근 {weeks}주 점수 추이** ({bands['dates'][0]} ~ {bands['dates'][-1]}, 학생 {bands['students']}명)\n\n"
+            for a, band in bands["areas"].items():
+                if band["p50"][-1] is None:
+                    continue
+                then, now = band["p50"][0], band["p50"][-1]
+                change = f" ({now - then:+.1f})" if then is not None else ""
+                response += (f"- **{AREA_LABELS[a]}** 중앙값 {then if then is not None else 'N/A'} → {now}{change}, "
+                             f"현재 하위 25% {band['p25'][-1]} / 상위 25% {band['p75'][-1]}\n")
+
+                changed = [d for d in deltas if d[a]["delta"] is not None]
+                changed.sort(key=lambda d: d[a]["delta"])
+                if changed:
+                    down = ", ".join(f"{d['student_id']}({d[a]['delta']:+.1f})" for d in changed[:3] if d[a]["delta"] < 0)
+                    up = ", ".join(f"{d['student_id']}({d[a]['delta']:+.1f})" for d in reversed(changed[-3:]) if d[a]["delta"] > 0)
+                    if up:
+                        response += f"   - 상승: {up}\n"
+                    if down:
+                        response += f"   - 하락: {down}\n"
+            return response
+
+        except Exception as e:
+            return f"점수 추이 조회 실패: {str(e)}"
+
     def _lookup_word(self, word: str) -> str:
         """영어 단어 검색 (Free Dictionary API)"""
         try:
@@ -871,7 +940,7 @@ Respond with ONLY "intelligence" or "reasoning".'''
         """Function 실행"""
 
         # 함수 타입 분류
-        db_functions = ["get_my_class_students", "search_students_by_score", "search_students_by_behavior", "get_student_details"]
+        db_functions = ["get_my_class_students", "search_students_by_score", "search_students_by_behavior", "get_student_details", "get_score_trend"]
         ui_trigger_functions = ["trigger_exam_upload_ui", "trigger_daily_input_ui"]
         external_api_functions = ["lookup_word", "fetch_news", "analyze_text_difficulty", "check_grammar"]
 
@@ -908,6 +977,8 @@ Respond with ONLY "intelligence" or "reasoning".'''
             result = self._trigger_daily_input_ui(**arguments)
         elif function_name == "get_student_details":
             result = self._get_student_details(**arguments)
+        elif function_name == "get_score_trend":
+            result = self._get_score_trend(**arguments)
         elif function_name == "lookup_word":
             result = self._lookup_word(**arguments)
         elif function_name == "fetch_news":
@@ -1065,37 +1136,21 @@ Respond with ONLY "intelligence" or "reasoning".'''
                 # 최종 응답 생성
                 # Use the same model as primary for consistency
                 if primary_model == "o4-mini":
-                    final_response = self.client.chat.completions.create(
-                        model="o4-mini",
-                        messages=messages,
-                        max_completion_tokens=10000
+                    # Step 4: o4-mini + 품질 검사, 지연 예산 안에서 o3 hedge / gpt-4.1-mini 강등
+                    response_content, primary_model, escalation_models = self.escalator.complete(
+                        messages,
+                        primary_model="o4-mini",
+                        accept=self._check_response_quality,
+                        deadline=self.escalator.deadline()  # 예산은 라우팅/도구 실행이 끝난 뒤부터
                     )
+                    used_models.extend(escalation_models)
                 else:
                     final_response = self.client.chat.completions.create(
                         model="gpt-4.1-mini",
                         messages=messages,
                         temperature=0.7
                     )
-
-                response_content = final_response.choices[0].message.content
-
-                # Step 4: Quality check for o4-mini responses
-                if primary_model == "o4-mini" and not self._check_response_quality(response_content):
-                    print(f"⚠️  o4-mini response quality low, falling back to o3...")
-                    used_models.append("o3")
-
-                    # Retry with o3 (advanced reasoning)
-                    try:
-                        final_response_o3 = self.client.chat.completions.create(
-                            model="o3",
-                            messages=messages,
-                            max_completion_tokens=10000
-                        )
-                        response_content = final_response_o3.choices[0].message.content
-                        primary_model = "o3"  # Update primary model
-                        print(f"✅ o3 response generated successfully")
-                    except Exception as e:
-                        print(f"⚠️  o3 fallback failed: {e}, using o4-mini response anyway")
+                    response_content = final_response.choices[0].message.content
 
                 return {
                     "message": response_content,
@@ -1110,21 +1165,15 @@ Respond with ONLY "intelligence" or "reasoning".'''
 
                 # Step 4: Quality check for o4-mini responses (no function calls)
                 if primary_model == "o4-mini" and not self._check_response_quality(response_content):
-                    print(f"⚠️  o4-mini response quality low, falling back to o3...")
-                    used_models.append("o3")
-
-                    # Retry with o3 (advanced reasoning)
-                    try:
-                        final_response_o3 = self.client.chat.completions.create(
-                            model="o3",
-                            messages=messages,
-                            max_completion_tokens=10000
-                        )
-                        response_content = final_response_o3.choices[0].message.content
-                        primary_model = "o3"  # Update primary model
-                        print(f"✅ o3 response generated successfully")
-                    except Exception as e:
-                        print(f"⚠️  o3 fallback failed: {e}, using o4-mini response anyway")
+                    print(f"⚠️  o4-mini response quality low, escalating to o3...")
+                    response_content, primary_model, escalation_models = self.escalator.escalate(
+                        messages,
+                        rejected_content=response_content,
+                        rejected_model="o4-mini",
+                        accept=self._check_response_quality,
+                        deadline=self.escalator.deadline()  # 예산은 라우팅/도구 실행이 끝난 뒤부터
+                    )
+                    used_models.extend(escalation_models)
 
                 return {
                     "message": response_content,
@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
+import hashlib, json, os, shutil, threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Dict, Iterable, Optional, Tuple
 from urllib.parse import quote
-from google.cloud import storage
+
+# GCS_BACKEND=gcs (default; honours STORAGE_EMULATOR_HOST) | local (copy under GCS_LOCAL_ROOT, for offline runs)
+GCS_BACKEND = os.getenv("GCS_BACKEND", "gcs").lower()
+GCS_LOCAL_ROOT = os.getenv("GCS_LOCAL_ROOT", "output/gcs_local")
+GCS_MANIFEST = os.getenv("GCS_MANIFEST", "output/.gcs_manifest.json")
+GCS_UPLOAD_CONCURRENCY = int(os.getenv("GCS_UPLOAD_CONCURRENCY", "8"))
 
 def _clean_bucket(b: Optional[str]) -> Optional[str]:
     if not b: return None
@@ -17,23 +24,172 @@ def _mime(path: str) -> str:
     }.get(s, "application/octet-stream")
 
 def _public_url(bucket: str, blob_path: str) -> str:
-    return f"https://storage.googleapis.com/{bucket}/{quote(blob_path, safe='/')}"
+    emulator = os.getenv("STORAGE_EMULATOR_HOST")
+    base = emulator.rstrip("/") if emulator else "https://storage.googleapis.com"
+    return f"{base}/{bucket}/{quote(blob_path, safe='/')}"
 
-def upload_public(local: str, bucket: Optional[str], dest_blob: str) -> Tuple[str, str]:
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def _storage_client():
+    """One authenticated client per process (token refresh + connection pool are shared)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from google.cloud import storage
+            if os.getenv("STORAGE_EMULATOR_HOST"):
+                from google.auth.credentials import AnonymousCredentials
+                _client = storage.Client(project=os.getenv("GCP_PROJECT") or "local",
+                                         credentials=AnonymousCredentials())
+            else:
+                _client = storage.Client()
+        return _client
+
+
+class UploadManifest:
     """
-    UBLA 공개 버킷(정책으로 allUsers:Object Viewer) 전제.
-    객체 ACL은 건드리지 않음. 권한 없으면 403을 그대로 던짐.
+    Local record of uploaded objects: "backend target|bucket/dest" -> sha256 of the uploaded file
+    (the target keeps local copies and emulator uploads from vouching for real GCS objects).
+    Replaces the per-blob exists() round trip; saved atomically and merged with
+    concurrent writers (other job workers) on save.
+    """
+
+    def __init__(self, path: str = GCS_MANIFEST):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, str] = self._read()
+        self._dirty: Dict[str, str] = {}
+
+    def _read(self) -> Dict[str, str]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: str, digest: str) -> None:
+        with self._lock:
+            self._entries[key] = digest
+            self._dirty[key] = digest
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            merged = self._read()
+            merged.update(self._dirty)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(merged, f, ensure_ascii=False, indent=0)
+            os.replace(tmp, self.path)
+            self._entries = merged
+            self._dirty = {}
+
+
+class AssetUploader:
+    """
+    Bounded-concurrency uploader for one bucket.
+    Objects are create-only (if_generation_match=0): an existing object is kept and its
+    URL returned, matching the previous exists()-then-skip behaviour without delete permission.
     """
+
+    def __init__(self, bucket: str, backend: str = GCS_BACKEND, manifest: Optional[UploadManifest] = None,
+                 max_workers: int = GCS_UPLOAD_CONCURRENCY):
+        self.bucket = bucket
+        self.backend = backend
+        self.manifest = manifest or UploadManifest()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="gcs-upload")
+
+    def _target(self) -> str:
+        """Where objects actually land: backend plus local root / emulator host."""
+        if self.backend == "local":
+            return f"local:{Path(GCS_LOCAL_ROOT).resolve()}"
+        emulator = os.getenv("STORAGE_EMULATOR_HOST")
+        return f"gcs:{emulator.rstrip('/')}" if emulator else "gcs"
+
+    def _urls(self, dest: str) -> Tuple[str, str]:
+        if self.backend == "local":
+            target = Path(GCS_LOCAL_ROOT) / self.bucket / dest
+            return target.resolve().as_uri(), f"gs://{self.bucket}/{dest}"
+        return _public_url(self.bucket, dest), f"gs://{self.bucket}/{dest}"
+
+    def _put_local(self, local: str, dest: str) -> None:
+        target = Path(GCS_LOCAL_ROOT) / self.bucket / dest
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(local, target)
+
+    def _put_gcs(self, local: str, dest: str) -> None:
+        from google.api_core.exceptions import PreconditionFailed
+        blob = _storage_client().bucket(self.bucket).blob(dest)
+        try:
+            blob.upload_from_filename(local, content_type=_mime(local), if_generation_match=0)
+        except PreconditionFailed:
+            pass  # already uploaded (possibly by an earlier run without the manifest)
+
+    def upload(self, local: str, dest: str) -> Tuple[str, str]:
+        """Upload one file (skipped when the manifest already has the same content)."""
+        key = f"{self._target()}|{self.bucket}/{dest}"
+        digest = _file_sha256(local)
+        known = self.manifest.get(key)
+        if known != digest:
+            if known is not None:
+                print(f"[warn] {dest} changed locally; existing object is kept (create-only)")
+            if self.backend == "local":
+                self._put_local(local, dest)
+            else:
+                self._put_gcs(local, dest)
+            self.manifest.put(key, digest)
+        return self._urls(dest)
+
+    def submit(self, local: str, dest: str) -> Future:
+        return self._pool.submit(self.upload, local, dest)
+
+    def upload_many(self, pairs: Iterable[Tuple[str, str]]) -> Dict[str, Optional[str]]:
+        """Upload (local, dest) pairs concurrently. Returns dest -> public URL (None on failure)."""
+        futures = {dest: self.submit(local, dest) for local, dest in pairs}
+        out: Dict[str, Optional[str]] = {}
+        for dest, fut in futures.items():
+            try:
+                out[dest] = fut.result()[0]
+            except Exception as err:
+                print(f"[warn] GCS upload skipped ({dest}): {err}")
+                out[dest] = None
+        self.manifest.save()
+        return out
+
+
+_uploaders: Dict[str, AssetUploader] = {}
+_uploaders_lock = threading.Lock()
+
+def get_uploader(bucket: Optional[str]) -> AssetUploader:
     bname = _clean_bucket(bucket) or ""
     if not bname: raise RuntimeError("GCS_BUCKET 미설정")
-    cli = storage.Client()
-    blob = cli.bucket(bname).blob(dest_blob)
+    with _uploaders_lock:
+        if bname not in _uploaders:
+            _uploaders[bname] = AssetUploader(bname)
+        return _uploaders[bname]
 
-    # Check if blob already exists to avoid delete permission issue
-    if blob.exists():
-        # Return existing URL without re-uploading
-        return _public_url(bname, dest_blob), f"gs://{bname}/{dest_blob}"
-
-    blob.content_type = _mime(local)
-    blob.upload_from_filename(local, content_type=blob.content_type)  # resumable 내부 사용
-    return _public_url(bname, dest_blob), f"gs://{bname}/{dest_blob}"
+def upload_public(local: str, bucket: Optional[str], dest_blob: str) -> Tuple[str, str]:
+    """
+    UBLA 공개 버킷(정책으로 allUsers:Object Viewer) 전제.
+    객체 ACL은 건드리지 않음. 권한 없으면 403을 그대로 던짐.
+    """
+    uploader = get_uploader(bucket)
+    urls = uploader.upload(local, dest_blob)
+    uploader.manifest.save()
+    return urls